@@ -8,5 +8,10 @@ from mismo import datasets as datasets
 from mismo import fs as fs
 from mismo import lib as lib
 from mismo import metrics as metrics
+from mismo import stream as stream
 from mismo import text as text
 from mismo import vector as vector
+from mismo._compact_ids import CompactIds as CompactIds
+from mismo._materialize import Materializer as Materializer
+from mismo._profile import Profiler as Profiler
+from mismo._profile import Span as Span
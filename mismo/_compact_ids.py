@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import ibis
+from ibis.expr import datatypes as dt
+from ibis.expr import types as ir
+
+from mismo import _materialize
+from mismo._factorizer import Factorizer
+
+_ID_COLUMNS = ("record_id", "record_id_l", "record_id_r")
+
+
+class CompactIds:
+    """Replace wide record ids with compact integer codes, and restore them later.
+
+    Blocking, comparing, and clustering carry `record_id` through every pair
+    table and join on it over and over. If the ids are long strings or structs,
+    hashing and storing them is a big part of the cost. With this class you
+    assign every record a small integer id once, run the whole pipeline on
+    those, and only restore the original ids on the output.
+
+    The codes follow the order of the original ids, so `record_id_l < record_id_r`
+    selects the same pairs as with the original ids, and deduplication
+    gives the same pairs.
+    Ids that are already integers are left as they are.
+
+    Examples
+    --------
+    >>> import ibis
+    >>> from mismo import CompactIds
+    >>> from mismo.block import block_one
+    >>> t = ibis.memtable(
+    ...     {
+    ...         "record_id": ["rec-b-0123", "rec-a-0456", "rec-c-0789"],
+    ...         "letter": ["x", "x", "y"],
+    ...     }
+    ... )
+    >>> ids = CompactIds(t, dtype="uint32")
+    >>> compact = ids.encode(t)
+    >>> compact.record_id.type()
+    UInt32(nullable=True)
+    >>> pairs = block_one(compact, compact, "letter")
+    >>> ids.decode(pairs)["record_id_l", "record_id_r"].to_pandas()
+      record_id_l record_id_r
+    0  rec-a-0456  rec-b-0123
+    """
+
+    def __init__(self, *tables: ir.Table, dtype: str | dt.DataType = "uint64") -> None:
+        """Assign a code to every record id in `tables`.
+
+        The mapping from ids to codes is computed and persisted with the active
+        [Materializer][mismo.Materializer] right away, so it is only computed once.
+        With no Materializer active, it is cached like `Table.cache()`.
+
+        Parameters
+        ----------
+        tables
+            The tables whose `record_id`s to encode, eg the left and right
+            tables of a linkage task.
+        dtype
+            The integer type of the codes. "uint32" halves the size of the ids
+            again, but it fails at execution time if there are 2**32 or more
+            distinct ids.
+        """
+        if not tables:
+            raise ValueError("At least one table is required")
+        self._dtype = dt.dtype(dtype)
+        if not self._dtype.is_integer():
+            raise ValueError(f"dtype must be an integer type, got {self._dtype}")
+        ids = ibis.union(*(t.select("record_id") for t in tables))
+        self._noop = ids.record_id.type().is_integer()
+        if self._noop:
+            self._factorizer = Factorizer(ids, "record_id")
+        else:
+            mapping = Factorizer(ids, "record_id").mapping
+            mapping = _materialize.materialize(mapping)
+            self._factorizer = Factorizer.from_mapping(mapping)
+
+    @property
+    def mapping(self) -> ir.Table:
+        """The code of every record id, with the columns `original` and `code`.
+
+        Persist this to decode the results of the pipeline in another session.
+        """
+        return self._factorizer.mapping
+
+    def encode(self, t: ir.Table) -> ir.Table:
+        """Replace the `record_id`, `record_id_l`, and `record_id_r` columns of `t`.
+
+        `t` must have at least one of them.
+        """
+        columns = self._id_columns(t)
+        if self._noop:
+            return t
+        for column in columns:
+            t = self._factorizer.encode(t, column, verify=False)
+        return t.cast({c: self._dtype for c in columns})
+
+    def decode(self, t: ir.Table) -> ir.Table:
+        """Restore the original ids in the `record_id`, `record_id_l`, and
+        `record_id_r` columns of `t`.
+
+        `t` must have at least one of them.
+        """
+        columns = self._id_columns(t)
+        if self._noop:
+            return t
+        for column in columns:
+            t = self._factorizer.decode(t, column, verify=False)
+        return t
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(dtype={self._dtype})"
+
+    @staticmethod
+    def _id_columns(t: ir.Table) -> list[str]:
+        columns = [c for c in _ID_COLUMNS if c in t.columns]
+        if not columns:
+            raise ValueError(
+                f"Table must have one of the columns {_ID_COLUMNS}, but it has"
+                f" {t.columns}"
+            )
+        return columns
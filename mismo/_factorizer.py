@@ -1,12 +1,10 @@
 from __future__ import annotations
 
-from functools import cached_property
-
 import ibis
 from ibis import _
 from ibis.expr import types as ir
 
-from mismo import _util
+from mismo import _profile, _util
 
 
 class Factorizer:
@@ -14,6 +12,29 @@ class Factorizer:
 
     Use this class if you have some non-integer column, but you want to use
     integer codes to do some operation, and then restore the original column.
+
+    The codes are stored in [mapping][mismo._factorizer.Factorizer.mapping].
+    Persist it, and create a Factorizer from it with
+    [from_mapping()][mismo._factorizer.Factorizer.from_mapping], to use the same
+    codes across several runs:
+
+    >>> import ibis
+    >>> from mismo._factorizer import Factorizer
+    >>> con = ibis.duckdb.connect()
+    >>> t = ibis.memtable({"name": ["b", "a", "b", None]})
+    >>> f = Factorizer(t, "name")
+    >>> f.mapping.order_by("code").to_pandas()
+      original  code
+    0        a     0
+    1        b     1
+    >>> saved = con.create_table("name_codes", f.mapping)
+    >>> f2 = Factorizer.from_mapping(con.table("name_codes"))
+    >>> f2.encode(t, "name", dst="code").order_by("code").to_pandas()
+       name  code
+    0     a   0.0
+    1     b   1.0
+    2     b   1.0
+    3  None   NaN
     """
 
     def __init__(self, t: ir.Table, column: str) -> None:
@@ -30,10 +51,71 @@ class Factorizer:
         """
         self.t = t
         self.column = column
-        self._int_column = _util.unique_column_name(t)
         # The input column is already an integer, so the mapping
         # is simply the identity function. This is an optimization.
         self._noop = t[column].type().is_integer()
+        self._mapping: ir.Table | None = None
+
+    @classmethod
+    def from_mapping(cls, mapping: ir.Table) -> Factorizer:
+        """Create a Factorizer from a mapping table, eg one saved by an earlier run.
+
+        Parameters
+        ----------
+        mapping : Table
+            A table with the columns `original` and `code`, as in
+            [mapping][mismo._factorizer.Factorizer.mapping].
+
+        The Factorizer has no table of its own to encode,
+        so pass the table and column to encode() explicitly.
+        """
+        if set(mapping.columns) != {"original", "code"}:
+            raise ValueError(
+                "mapping must have exactly the columns 'original' and 'code',"
+                f" but it has {mapping.columns}"
+            )
+        f = cls(mapping, "original")
+        f._noop = False
+        f._mapping = mapping
+        return f
+
+    @property
+    def mapping(self) -> ir.Table:
+        """The code of every value, as a table with the columns `original` and `code`.
+
+        There is one row per distinct, non-NULL value.
+        The codes are 0 to "number of values - 1", in the order of the values,
+        unless the Factorizer was [extended][mismo._factorizer.Factorizer.extend].
+        """
+        if self._mapping is None:
+            values = self.t.select(original=_[self.column])
+            values = values.filter(_.original.notnull()).distinct()
+            if self._noop:
+                self._mapping = values.mutate(code=_.original)
+            else:
+                self._mapping = values.mutate(code=_util.group_id("original"))
+        return self._mapping
+
+    def extend(self, t: ir.Table, column: str) -> Factorizer:
+        """A Factorizer that also has codes for the values of `t[column]`.
+
+        The values that already have a code keep it, and new values get codes
+        after the biggest existing code. This lets a later run encode new
+        records without changing the codes of the old ones.
+        By default, the new Factorizer encodes `t[column]`.
+        """
+        if self._noop:
+            return self
+        mapping = self.mapping
+        new = t.select(original=t[column].cast(mapping.original.type()))
+        new = new.filter(_.original.notnull()).distinct()
+        new = new.anti_join(mapping, "original")
+        # A scalar subquery, so this stays lazy.
+        offset = ibis.coalesce(mapping.code.max().as_scalar() + 1, 0)
+        new = new.mutate(code=(_util.group_id("original") + offset).cast("uint64"))
+        f = Factorizer.from_mapping(mapping.union(new.cast(mapping.schema())))
+        f.t, f.column = t, column
+        return f
 
     def encode(
         self,
@@ -55,42 +137,21 @@ class Factorizer:
             The name of the column to create. If None, overwrite the `src` column.
         verify : bool, default True
             If True, raise an error if the column contains values that are not
-            in the original column.
+            in the original column. This runs a query right away. If False,
+            unknown values get NULL codes. To check them later without forcing
+            a query now, eg once the result is materialized, use
+            [unknown_values()][mismo._factorizer.Factorizer.unknown_values].
         """
-        if t is None:
-            t = self.t
-        if src is None:
-            src = self.column
-        if dst is None:
-            dst = src
-
+        t, src, dst = self._resolve(t, src, dst)
         if self._noop:
             return t.mutate(**{dst: _[src]})
-
-        if t[src] is self.t[self.column]:
-            return self._augmented.mutate(**{dst: _[self._int_column]}).drop(
-                self._int_column
+        # The mapping was made from this very column, so the check can't fail.
+        own_column = t is self.t and src == self.column
+        if verify and not own_column and self._any(self.unknown_values(t, src)):
+            raise ValueError(
+                f"Column {src} contains values that are not in the original column"
             )
-
-        if verify:
-            if (
-                self._mapping_count == 0
-                and t.count().execute() > 0
-                and t[src].notin(self._mapping.original).any().execute()
-            ):
-                raise ValueError(
-                    f"Column {src} contains values that are not in the original column"
-                )
-
-        assert self._int_column not in t.columns
-        joined = ibis.join(
-            t, self._mapping, t[src] == self._mapping.original, how="left"
-        )
-        if src == "original":
-            joined = joined.drop("original_right")
-        joined = joined.drop("original")
-        result = joined.mutate(**{dst: _[self._int_column]}).drop(self._int_column)
-        return result
+        return self._join(t, src, dst, on="original", to="code")
 
     def decode(
         self, t: ir.Table, src: str, dst: str | None = None, verify: bool = True
@@ -107,41 +168,59 @@ class Factorizer:
             The name of the column to create. If None, overwrite the `src` column.
         verify : bool, default True
             If True, raise an error if the column contains codes that are not
-            froms the original column.
+            from the original column. This runs a query right away. If False,
+            unknown codes decode to NULL. To check them later, use
+            [unknown_codes()][mismo._factorizer.Factorizer.unknown_codes].
         """
         if dst is None:
             dst = src
         if self._noop:
             return t.mutate(**{dst: _[src]})
+        if verify and self._any(self.unknown_codes(t, src)):
+            raise ValueError(
+                f"Column {src} contains codes that are not from the original column"
+            )
+        return self._join(t, src, dst, on="code", to="original")
+
+    def unknown_values(self, t: ir.Table, src: str | None = None) -> ir.Table:
+        """The distinct, non-NULL values of `t[src]` that have no code.
+
+        This is lazy, so it can be checked whenever it is convenient.
+        The result has one column, `original`.
+        """
+        if src is None:
+            src = self.column
+        return self._unknown(t[src], "original")
+
+    def unknown_codes(self, t: ir.Table, src: str) -> ir.Table:
+        """The distinct, non-NULL codes in `t[src]` that aren't in the mapping.
+
+        This is lazy, so it can be checked whenever it is convenient.
+        The result has one column, `code`.
+        """
+        return self._unknown(t[src], "code")
+
+    def _resolve(
+        self, t: ir.Table | None, src: str | None, dst: str | None
+    ) -> tuple[ir.Table, str, str]:
+        if t is None:
+            t = self.t
+        if src is None:
+            src = self.column
+        if dst is None:
+            dst = src
+        return t, src, dst
+
+    def _unknown(self, values: ir.Column, on: str) -> ir.Table:
+        values = values.name(on).as_table().filter(_[on].notnull()).distinct()
+        return values.anti_join(self.mapping, on)
+
+    def _any(self, t: ir.Table) -> bool:
+        return _profile.execute(t.limit(1).count(), name="verify") > 0
 
-        if verify:
-            if (
-                self._mapping_count == 0
-                and t.count().execute() > 0
-                and t[src].notin(self._mapping[self._int_column]).any().execute()
-            ):
-                raise ValueError(
-                    f"Column {src} contains codes that are not from the original column"
-                )
-
-        assert self._int_column not in t.columns
-        joined = ibis.join(
-            t, self._mapping, t[src] == self._mapping[self._int_column], how="left"
-        )
-        orig = "original" if src != "original" else "original_right"
-        result = joined.mutate(**{dst: _[orig]}).drop(orig, self._int_column)
-        return result
-
-    @cached_property
-    def _augmented(self) -> ir.Table:
-        return self.t.mutate(_util.group_id(self.column).name(self._int_column))
-
-    @cached_property
-    def _mapping(self) -> ir.Table:
-        return self._augmented.select(
-            self._int_column, original=_[self.column]
-        ).distinct()
-
-    @cached_property
-    def _mapping_count(self) -> int:
-        return self._mapping.count().execute()
+    def _join(self, t: ir.Table, src: str, dst: str, *, on: str, to: str) -> ir.Table:
+        key = _util.unique_column_name(t)
+        value = _util.unique_column_name(t.mutate(**{key: ibis.null()}))
+        mapping = self.mapping.select(**{key: on, value: to})
+        joined = ibis.join(t, mapping, t[src] == mapping[key], how="left")
+        return joined.mutate(**{dst: _[value]}).drop(key, value)
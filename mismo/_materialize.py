@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import contextvars
+import dataclasses
+from pathlib import Path
+import tempfile
+from typing import Literal
+import uuid
+
+import ibis
+from ibis.expr import operations as ops
+from ibis.expr import types as ir
+
+from mismo import _profile
+
+
+class Materializer:
+    """Persists intermediate tables, and releases them when they aren't needed.
+
+    Ibis expressions are lazy, so an intermediate table that is used by several
+    downstream queries is recomputed for each of them. Persisting it once
+    avoids that, but with `Table.cache()` the persisted table lives
+    until the connection is closed, so long sessions pile up temp tables.
+
+    A Materializer keeps track of every table it persists:
+
+    - Persisting the same expression twice reuses the first result,
+      and counts a reference. [release()][mismo.Materializer.release]
+      drops a reference, and frees the table when there are none left.
+    - Tables that are already physical, such as a table in the database
+      or an in-memory table, are returned as is, since persisting them
+      again would only cost I/O.
+    - Used as a context manager, everything persisted inside the block is freed
+      at the end. While the block is active, mismo's own functions,
+      such as [connected_components()][mismo.cluster.connected_components],
+      persist their intermediate tables with this Materializer.
+      Outside of a block, they free their intermediates themselves,
+      and persist their results like `Table.cache()`. Make sure to execute
+      or persist elsewhere any results you want to keep before the block ends.
+
+    Examples
+    --------
+    >>> import ibis
+    >>> from mismo import Materializer
+    >>> con = ibis.duckdb.connect()
+    >>> t = con.create_table("numbers", {"x": [1, 2, 3]})
+    >>> with Materializer() as m:
+    ...     doubled = m.materialize(t.mutate(y=t.x * 2))
+    ...     int(doubled.y.sum().execute())
+    12
+    """
+
+    def __init__(
+        self,
+        store: Literal["temp", "parquet"] = "temp",
+        *,
+        directory: str | Path | None = None,
+    ) -> None:
+        """Create a Materializer.
+
+        Parameters
+        ----------
+        store
+            Where to persist tables.
+
+            - "temp": a temporary table in the backend, as `Table.cache()` does.
+            - "parquet": a Parquet file, read back as a table. This keeps
+              the intermediate out of the backend's memory, which helps
+              when it is bigger than memory.
+        directory
+            The directory to write Parquet files to, if `store` is "parquet".
+            If None, a new temporary directory is used.
+        """
+        if store not in ("temp", "parquet"):
+            raise ValueError(f"store must be 'temp' or 'parquet', got {store!r}")
+        self._store = store
+        self._directory = Path(directory) if directory is not None else None
+        self._entries: dict[ops.Relation, _Entry] = {}
+        # Map the persisted table back to the expression it was made from.
+        self._sources: dict[ops.Relation, ops.Relation] = {}
+        self._tokens: list[contextvars.Token] = []
+
+    @property
+    def store(self) -> Literal["temp", "parquet"]:
+        """Where tables are persisted."""
+        return self._store
+
+    def materialize(self, t: ir.Table, *, uses: int | None = None) -> ir.Table:
+        """Persist `t`, so it is only computed once.
+
+        Parameters
+        ----------
+        t
+            The table to persist.
+        uses
+            How many times the result will be executed or referenced,
+            if you know. If less than 2, persisting only adds I/O,
+            so `t` is returned as is.
+
+        Returns
+        -------
+        A table with the same contents as `t`.
+        """
+        if uses is not None and uses < 2:
+            return t
+        if _is_physical(t):
+            return t
+        key = t.op()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._persist(t)
+            self._entries[key] = entry
+            self._sources[entry.table.op()] = key
+        entry.refs += 1
+        return entry.table
+
+    def release(self, t: ir.Table) -> None:
+        """Drop a reference to a table from `materialize()`, freeing it at zero.
+
+        Tables that `materialize()` returned as is are ignored.
+        """
+        if _is_physical(t) and t.op() not in self._sources:
+            return
+        try:
+            key = self._sources[t.op()]
+        except KeyError:
+            raise ValueError(
+                "This table was not persisted by this Materializer,"
+                " or it has already been released."
+            ) from None
+        entry = self._entries[key]
+        entry.refs -= 1
+        if entry.refs == 0:
+            del self._entries[key]
+            del self._sources[t.op()]
+            self._free(entry)
+
+    def release_all(self) -> None:
+        """Free every table this Materializer persisted."""
+        entries = list(self._entries.values())
+        self._entries.clear()
+        self._sources.clear()
+        for entry in entries:
+            self._free(entry)
+
+    def __len__(self) -> int:
+        """The number of tables that are currently persisted."""
+        return len(self._entries)
+
+    def __enter__(self) -> Materializer:
+        self._tokens.append(_ACTIVE.set(self))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _ACTIVE.reset(self._tokens.pop())
+        self.release_all()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(store={self._store!r}, n_tables={len(self)})"
+
+    def _persist(self, t: ir.Table) -> _Entry:
+        if self._store == "temp":
+            return _Entry(_profile.run("cache", t, t.cache, name="materialize"))
+        if self._directory is None:
+            self._directory = Path(tempfile.mkdtemp(prefix="mismo-"))
+        self._directory.mkdir(parents=True, exist_ok=True)
+        con = t._find_backend(use_default=True)
+        name = f"mismo_materialized_{uuid.uuid4().hex}"
+        path = self._directory / f"{name}.parquet"
+        _profile.run(
+            "to_parquet", t, lambda: con.to_parquet(t, path), name="materialize"
+        )
+        return _Entry(con.read_parquet(path, table_name=name), path=path, con=con)
+
+    @staticmethod
+    def _free(entry: _Entry) -> None:
+        if entry.path is None:
+            entry.table.release()
+        else:
+            entry.con.drop_view(entry.table.get_name(), force=True)
+            entry.path.unlink(missing_ok=True)
+
+
+@dataclasses.dataclass
+class _Entry:
+    table: ir.Table
+    path: Path | None = None
+    con: ibis.BaseBackend | None = None
+    refs: int = 0
+
+
+def _is_physical(t: ir.Table) -> bool:
+    return isinstance(t.op(), (ops.DatabaseTable, ops.InMemoryTable))
+
+
+_ACTIVE: contextvars.ContextVar[Materializer | None] = contextvars.ContextVar(
+    "mismo_materializer", default=None
+)
+
+
+def active() -> Materializer:
+    """The Materializer that mismo's own functions currently persist tables with.
+
+    If no Materializer block is active, this is a new Materializer that nothing
+    else holds on to. Tables it persists behave like `Table.cache()`: they live
+    until they are released through it, or until the connection is closed.
+    """
+    m = _ACTIVE.get()
+    return m if m is not None else Materializer()
+
+
+def materialize(t: ir.Table, *, uses: int | None = None) -> ir.Table:
+    """Persist `t` with the active Materializer."""
+    return active().materialize(t, uses=uses)
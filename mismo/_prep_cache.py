@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable
+import uuid
+
+import ibis
+from ibis.expr import types as ir
+
+from mismo import _profile
+from mismo.__about__ import __version__
+
+
+def cached_prep(
+    t: ir.Table,
+    prep: Callable[[ir.Table], ir.Table],
+    *,
+    cache_dir: str | Path,
+    config: dict[str, Any],
+) -> ir.Table:
+    """Run `prep(t)`, reusing the result from an earlier run if there is one.
+
+    The result is stored as a Parquet file in `cache_dir`, named by a
+    fingerprint of the contents of `t`, `config`, and the mismo version.
+    If the input table or the prep configuration change, the fingerprint
+    changes, so a stale result is never reused.
+
+    Fingerprinting `t` is a single aggregate over it, which is much
+    cheaper than the normalization and tokenization that prep steps do.
+    """
+    cache_dir = Path(cache_dir)
+    path = cache_dir / f"{fingerprint(t, config)}.parquet"
+    con = t._find_backend(use_default=True)
+    if not path.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so an interrupted run never leaves
+        # a partial file that a later run would trust.
+        tmp = cache_dir / f"{path.stem}.{uuid.uuid4().hex}.tmp"
+        try:
+            con.to_parquet(prep(t), tmp)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+    return con.read_parquet(path)
+
+
+def fingerprint(t: ir.Table, config: dict[str, Any]) -> str:
+    """A hash of the contents of `t`, the prep `config`, and the mismo version.
+
+    The contents are summarized as the number of rows and the sum of the hashes
+    of every row, so the fingerprint doesn't depend on the order of the rows.
+    """
+    # DuckDB's hashes are uint64. Sum the low and high 32 bits separately,
+    # so the sums can't overflow an int64.
+    row_hash = ibis.struct({c: t[c] for c in t.columns}).hash()
+    split = ibis.literal(2**32, "uint64")
+    stats = t.aggregate(
+        n=t.count(),
+        low=(row_hash % split).cast("int64").sum(),
+        high=(row_hash // split).cast("int64").sum(),
+    )
+    stats = _profile.to_pyarrow(stats, name="fingerprint")
+    summary = {
+        "schema": [(name, str(typ)) for name, typ in t.schema().items()],
+        "n": stats["n"][0].as_py(),
+        "low": stats["low"][0].as_py(),
+        "high": stats["high"][0].as_py(),
+        "config": config,
+        "mismo": __version__,
+    }
+    encoded = json.dumps(summary, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
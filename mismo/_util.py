@@ -9,6 +9,8 @@ from ibis import _
 from ibis.common.deferred import Deferred
 from ibis.expr import types as ir
 
+from mismo import _profile
+
 
 def cases(
     case_result_pairs: Iterable[tuple[ir.BooleanValue, ir.Value]],
@@ -118,7 +120,7 @@ def sample_table(
     """
     if method is None:
         method = "row" if n_approx <= 2048 * 8 else "block"
-    n_available = table.count().execute()
+    n_available = _profile.execute(table.count(), name="count_available")
     fraction = n_approx / n_available
     return table.sample(fraction, method=method, seed=seed)
 
@@ -13,6 +13,16 @@ from mismo.block._block import block_many as block_many
 from mismo.block._block import block_one as block_one
 from mismo.block._block import join as join
 from mismo.block._blocking_rule import BlockingRule as BlockingRule
+from mismo.block._index import BlockIndex as BlockIndex
+from mismo.block._knn import VectorKNNBlocker as VectorKNNBlocker
+from mismo.block._lsh import MinhashLshBlocker as MinhashLshBlocker
+from mismo.block._pair_view import PairView as PairView
+from mismo.block._plan import BlockingPlan as BlockingPlan
+from mismo.block._plan import plan_blocking as plan_blocking
+from mismo.block._skew import BigKeyWarning as BigKeyWarning
+from mismo.block._sorted_neighborhood import (
+    SortedNeighborhoodBlocker as SortedNeighborhoodBlocker,
+)
 from mismo.block._sql_analyze import JOIN_ALGORITHMS as JOIN_ALGORITHMS
 from mismo.block._sql_analyze import SLOW_JOIN_ALGORITHMS as SLOW_JOIN_ALGORITHMS
 from mismo.block._sql_analyze import SlowJoinError as SlowJoinError
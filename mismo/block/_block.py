@@ -1,14 +1,25 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import shutil
+import tempfile
 from typing import Callable, Iterable, Literal, Union
+import uuid
+import weakref
 
 import ibis
 from ibis import _
 from ibis import selectors as s
+from ibis.backends.duckdb import Backend as DuckDBBackend
 from ibis.common.deferred import Deferred
+from ibis.expr import operations as ops
 from ibis.expr import types as ir
 
 from mismo import _util
+from mismo.block._blocking_rule import BlockingRule
+from mismo.block._skew import guard_big_keys as _guard_big_keys
+from mismo.block._sql_analyze import _UnsupportedBackendError
 
 # Something that can be used to reference a column in a table
 _ColumnReferenceLike = Union[
@@ -35,6 +46,10 @@ def block_one(
     *,
     on_slow: Literal["error", "warn", "ignore"] = "error",
     task: Literal["dedupe", "link"] | None = None,
+    max_pairs_per_key: int | None = None,
+    on_big_key: Literal["drop", "split", "sample"] = "drop",
+    split_key=None,
+    ids_only: bool = False,
     **kwargs,
 ) -> ir.Table:
     """Block two tables together using the given condition.
@@ -90,6 +105,32 @@ def block_one(
         If "link", no additional restriction is added.
         If None, will be assumed to be "dedupe" if `left` and `right`
         are the same table.
+    max_pairs_per_key
+        If given, guard against skewed blocking keys. Before joining, the
+        [key_counts()][mismo.block.key_counts] of the condition are computed,
+        and any key that would generate more than this many pairs
+        is handled according to `on_big_key`, and a
+        [BigKeyWarning][mismo.block.BigKeyWarning] is issued reporting
+        which keys were affected.
+        This only applies to conditions that resolve to equality keys
+        (eg strings, Deferreds, or tuples of these).
+        Other conditions are joined as usual.
+    on_big_key
+        What to do with keys that exceed `max_pairs_per_key`:
+
+        - "drop": Don't generate any pairs for these keys.
+        - "split": Sub-block these keys, only pairing records that also match
+          on `split_key`.
+        - "sample": Deterministically sample records within each of these keys,
+          so each key generates about `max_pairs_per_key` pairs.
+    split_key
+        The secondary key to sub-block on when `on_big_key` is "split".
+        Anything that can be used as an equality key in `condition`.
+    ids_only
+        If True, only return the `record_id_l` and `record_id_r` columns,
+        instead of joining every column of `left` and `right` onto every pair.
+        Use a [PairView][mismo.block.PairView] to join on just the columns
+        that comparing needs, later.
 
     Examples
     --------
@@ -190,8 +231,22 @@ def block_one(
     │           … │           … │          … │          … │ …                                                 │ …                                                 │
     └─────────────┴─────────────┴────────────┴────────────┴───────────────────────────────────────────────────┴───────────────────────────────────────────────────┘
     """  # noqa: E501
+    if max_pairs_per_key is not None:
+        condition = _guard_big_keys(
+            left,
+            right,
+            condition,
+            max_pairs_per_key=max_pairs_per_key,
+            on_big_key=on_big_key,
+            split_key=split_key,
+            on_slow=on_slow,
+            task=task,
+            **kwargs,
+        )
     j = join(left, right, condition, on_slow=on_slow, task=task, **kwargs)
     id_pairs = _distinct_record_ids(j)
+    if ids_only:
+        return id_pairs
     return _join_on_id_pairs(left, right, id_pairs)
 
 
@@ -203,6 +258,13 @@ def block_many(
     on_slow: Literal["error", "warn", "ignore"] = "error",
     task: Literal["dedupe", "link"] | None = None,
     labels: bool = False,
+    n_partitions: int | None = None,
+    spill_dir: str | Path | None = None,
+    n_threads: int | None = None,
+    max_pairs_per_key: int | None = None,
+    on_big_key: Literal["drop", "split", "sample"] = "drop",
+    split_key=None,
+    ids_only: bool = False,
     **kwargs,
 ) -> ir.Table:
     """Block two tables using each of the given conditions, then union the results.
@@ -236,10 +298,97 @@ def block_many(
         rules caused each record pair to be blocked.
         If False, the resulting table will only contain the columns of left and
         right.
+    n_partitions
+        If given, run in an out-of-core mode so that peak memory is bounded by
+        the size of a partition rather than by the total number of pairs.
+        For each condition, both tables are hash-partitioned on the blocking key
+        into `n_partitions` partitions (conditions that don't resolve to
+        equality keys, such as arbitrary boolean expressions,
+        are partitioned on `left.record_id` instead).
+        The condition is run on each partition separately,
+        and the distinct `(record_id_l, record_id_r)` pairs are spilled to Parquet
+        files in `spill_dir`. The record columns are only joined back on at the
+        very end. The returned table reads from these files, so they must not be
+        deleted while it is still in use.
+        If None, everything is done in one query.
+    spill_dir
+        The directory to write the Parquet files to when `n_partitions`
+        or `n_threads` is given.
+        If None, a new temporary directory is created, and deleted once the
+        returned table, and every expression made from it, is garbage collected.
+    n_threads
+        If given, run the conditions (and partitions, if `n_partitions`
+        is given) as separate queries, `n_threads` at a time, each on its own
+        DuckDB cursor. When the conditions produce very different join plans,
+        running them as one big union can leave most cores idle,
+        while this keeps them all busy.
+        The distinct `(record_id_l, record_id_r)` pairs of each query are
+        spilled to Parquet files in `spill_dir`, as for `n_partitions`.
+        Only works with the DuckDB backend. Cursors can't see temporary tables
+        or in-memory tables, so `left` and `right`, and any such tables that
+        the conditions use, are first copied into regular tables, which are
+        dropped again before this returns. Queries that use Python UDFs
+        run on the main connection instead.
+    max_pairs_per_key
+        If given, guard each condition against skewed blocking keys.
+        See [block_one()][mismo.block.block_one] for details.
+    on_big_key
+        What to do with keys that exceed `max_pairs_per_key`.
+        See [block_one()][mismo.block.block_one] for details.
+    split_key
+        The secondary key to sub-block on when `on_big_key` is "split".
+    ids_only
+        If True, only return the `record_id_l` and `record_id_r` columns
+        (and `blocking_rules`, if `labels` is True), instead of joining every
+        column of `left` and `right` onto every pair.
+        Use a [PairView][mismo.block.PairView] to join on just the columns
+        that comparing needs, later.
     """
     conds = tuple(conditions)
     if not conds:
         raise ValueError("No conditions provided")
+    if n_threads is not None:
+        return _block_many_threaded(
+            left,
+            right,
+            conds,
+            n_threads=n_threads,
+            n_partitions=n_partitions,
+            spill_dir=spill_dir,
+            on_slow=on_slow,
+            task=task,
+            labels=labels,
+            max_pairs_per_key=max_pairs_per_key,
+            on_big_key=on_big_key,
+            split_key=split_key,
+            ids_only=ids_only,
+            **kwargs,
+        )
+    if max_pairs_per_key is not None:
+        conds = _guard_conditions(
+            left,
+            right,
+            conds,
+            max_pairs_per_key=max_pairs_per_key,
+            on_big_key=on_big_key,
+            split_key=split_key,
+            on_slow=on_slow,
+            task=task,
+            **kwargs,
+        )
+    if n_partitions is not None:
+        ids = _block_many_partitioned(
+            left,
+            right,
+            conds,
+            n_partitions=n_partitions,
+            spill_dir=spill_dir,
+            on_slow=on_slow,
+            task=task,
+            labels=labels,
+            **kwargs,
+        )
+        return ids if ids_only else _join_on_id_pairs(left, right, ids)
 
     def blk(rule):
         j = join(left, right, rule, on_slow=on_slow, task=task, **kwargs)
@@ -257,9 +406,263 @@ def block_many(
         result = result.relocate("blocking_rules", after="record_id_r")
     else:
         result = ibis.union(*sub_joined, distinct=True)
+    if ids_only:
+        return result
     return _join_on_id_pairs(left, right, result)
 
 
+def _guard_conditions(
+    left: ir.Table,
+    right: ir.Table,
+    conditions: tuple[_Condition, ...],
+    **kwargs,
+) -> tuple[_Condition, ...]:
+    guarded = [_guard_big_keys(left, right, rule, **kwargs) for rule in conditions]
+    names = [_util.get_name(rule) for rule in conditions]
+    return tuple(
+        BlockingRule(g, name=name) if g is not rule else rule
+        for rule, g, name in zip(conditions, guarded, names)
+    )
+
+
+def _block_many_threaded(
+    left: ir.Table,
+    right: ir.Table,
+    conditions: tuple[_Condition, ...],
+    *,
+    n_threads: int,
+    n_partitions: int | None,
+    spill_dir: str | Path | None,
+    on_slow: Literal["error", "warn", "ignore"],
+    task: Literal["dedupe", "link"] | None,
+    labels: bool,
+    max_pairs_per_key: int | None,
+    on_big_key: Literal["drop", "split", "sample"],
+    split_key,
+    ids_only: bool,
+    **kwargs,
+) -> ir.Table:
+    if n_threads < 1:
+        raise ValueError(f"n_threads must be at least 1, got {n_threads}")
+    con = left._find_backend(use_default=True)
+    if not isinstance(con, DuckDBBackend):
+        raise _UnsupportedBackendError(
+            "n_threads only works with the DuckDB backend,"
+            f" but the tables have a {con.name} backend."
+            " Leave n_threads as None to block in a single query."
+        )
+    # The per-thread cursors are separate connections to the same database,
+    # and only see regular tables, so copy the inputs into some.
+    names = []
+
+    def share(t: ir.Table) -> ir.Table:
+        name = f"mismo_block_input_{uuid.uuid4().hex}"
+        names.append(name)
+        return con.create_table(name, t)
+
+    try:
+        shared_left = share(left)
+        # Keep them the same object, so the task is still inferred as "dedupe".
+        shared_right = shared_left if right is left else share(right)
+        if max_pairs_per_key is not None:
+            conditions = _guard_conditions(
+                shared_left,
+                shared_right,
+                conditions,
+                max_pairs_per_key=max_pairs_per_key,
+                on_big_key=on_big_key,
+                split_key=split_key,
+                on_slow=on_slow,
+                task=task,
+                **kwargs,
+            )
+        ids = _block_many_partitioned(
+            shared_left,
+            shared_right,
+            conditions,
+            n_partitions=n_partitions,
+            spill_dir=spill_dir,
+            on_slow=on_slow,
+            task=task,
+            labels=labels,
+            n_threads=n_threads,
+            **kwargs,
+        )
+    finally:
+        for name in names:
+            con.drop_table(name, force=True)
+    return ids if ids_only else _join_on_id_pairs(left, right, ids)
+
+
+def _block_many_partitioned(
+    left: ir.Table,
+    right: ir.Table,
+    conditions: tuple[_Condition, ...],
+    *,
+    n_partitions: int | None,
+    spill_dir: str | Path | None,
+    on_slow: Literal["error", "warn", "ignore"],
+    task: Literal["dedupe", "link"] | None,
+    labels: bool,
+    n_threads: int | None = None,
+    **kwargs,
+) -> ir.Table:
+    """Spill the distinct id pairs of every condition and partition to Parquet.
+
+    If `n_partitions` is None, each condition is run as a single query.
+    If `n_threads` is None, the queries are run one after another.
+    """
+    if n_partitions is not None and n_partitions < 1:
+        raise ValueError(f"n_partitions must be at least 1, got {n_partitions}")
+    own_dir = spill_dir is None
+    if own_dir:
+        spill_dir = tempfile.mkdtemp(prefix="mismo-block-")
+    spill_dir = Path(spill_dir)
+    spill_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        spilled = _spill(
+            left,
+            right,
+            conditions,
+            n_partitions=n_partitions,
+            spill_dir=spill_dir,
+            on_slow=on_slow,
+            task=task,
+            labels=labels,
+            n_threads=n_threads,
+            **kwargs,
+        )
+    except BaseException:
+        if own_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        raise
+    if own_dir:
+        # Every expression made from the result references this node,
+        # so the files are deleted once none of them are left.
+        weakref.finalize(spilled.op(), shutil.rmtree, spill_dir, True)
+    if labels:
+        return spilled.group_by("record_id_l", "record_id_r").agg(
+            blocking_rules=_.blocking_rule.collect()
+        )
+    else:
+        return spilled.distinct()
+
+
+def _spill(
+    left: ir.Table,
+    right: ir.Table,
+    conditions: tuple[_Condition, ...],
+    *,
+    n_partitions: int | None,
+    spill_dir: Path,
+    on_slow: Literal["error", "warn", "ignore"],
+    task: Literal["dedupe", "link"] | None,
+    labels: bool,
+    n_threads: int | None,
+    **kwargs,
+) -> ir.Table:
+    """Write the Parquet files, and return a table that reads all of them."""
+    con = left._find_backend(use_default=True)
+
+    if n_partitions is None:
+        partitions = [None]
+    else:
+        partitions = [(p, n_partitions) for p in range(n_partitions)]
+    jobs = []
+    for i, rule in enumerate(conditions):
+        for partition in partitions:
+            j = _join(
+                left,
+                right,
+                rule,
+                on_slow=on_slow,
+                task=task,
+                partition=partition,
+                **kwargs,
+            )
+            ids = _distinct_record_ids(j)
+            if labels:
+                ids = ids.mutate(blocking_rule=ibis.literal(_util.get_name(rule)))
+            p = 0 if partition is None else partition[0]
+            jobs.append((ids, spill_dir / f"rule{i}-partition{p}.parquet"))
+
+    if n_threads is None:
+        for ids, path in jobs:
+            con.to_parquet(ids, path)
+    else:
+        _to_parquet_concurrently(con, jobs, n_threads=n_threads)
+
+    return con.read_parquet([str(path) for _ids, path in jobs])
+
+
+def _to_parquet_concurrently(
+    con: ibis.BaseBackend, jobs: list[tuple[ir.Table, Path]], *, n_threads: int
+) -> None:
+    # Each cursor is a separate connection to the same database. It sees regular
+    # tables, but not the in-memory tables, temporary tables and views, or
+    # Python UDFs of `con`, which conditions such as kNN blocking can bring in.
+    # So copy those tables into regular tables, and run the few queries that
+    # use Python UDFs on `con` itself.
+    local_names = _connection_local_tables(con)
+    copies: dict[ops.Relation, ops.DatabaseTable] = {}
+
+    def share(ids: ir.Table) -> ir.Table:
+        replacements = {}
+        for node in ids.op().find((ops.InMemoryTable, ops.DatabaseTable)):
+            if isinstance(node, ops.DatabaseTable) and node.name not in local_names:
+                continue
+            if node not in copies:
+                name = f"mismo_block_input_{uuid.uuid4().hex}"
+                copies[node] = con.create_table(name, node.to_expr()).op()
+            replacements[node] = copies[node]
+        if not replacements:
+            return ids
+        return ids.op().replace(replacements).to_expr()
+
+    def run(sql: str, path: Path) -> None:
+        cursor = con.con.cursor()
+        try:
+            quoted = str(path).replace("'", "''")
+            cursor.execute(f"COPY ({sql}) TO '{quoted}' (FORMAT PARQUET)")
+        finally:
+            cursor.close()
+
+    try:
+        # Compile up front, since ibis isn't thread-safe.
+        # DuckDB releases the GIL while a query runs.
+        sqls, on_main = [], []
+        for ids, path in jobs:
+            if _uses_python_udfs(ids):
+                on_main.append((ids, path))
+            else:
+                sqls.append((str(con.compile(share(ids))), path))
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            futures = [pool.submit(run, sql, path) for sql, path in sqls]
+            for ids, path in on_main:
+                con.to_parquet(ids, path)
+            for future in futures:
+                future.result()
+    finally:
+        for copy in copies.values():
+            con.drop_table(copy.name, force=True)
+
+
+def _connection_local_tables(con: ibis.BaseBackend) -> set[str]:
+    """The names of the tables and views that only `con` itself can see."""
+    rows = con.raw_sql(
+        "SELECT table_name FROM duckdb_tables() WHERE temporary"
+        " UNION ALL SELECT view_name FROM duckdb_views() WHERE temporary"
+    ).fetchall()
+    return {name for (name,) in rows}
+
+
+def _uses_python_udfs(t: ir.Table) -> bool:
+    return any(
+        udf.__input_type__ != ops.udf.InputType.BUILTIN
+        for udf in t.op().find((ops.ScalarUDF, ops.AggUDF))
+    )
+
+
 def join(
     left: ir.Table,
     right: ir.Table,
@@ -277,6 +680,24 @@ def join(
     So this has the same behavior as `block_one`,
     but without the final deduplication step.
     """
+    return _join(left, right, condition, on_slow=on_slow, task=task, **kwargs)
+
+
+def _join(
+    left: ir.Table,
+    right: ir.Table,
+    condition: _Condition,
+    *,
+    on_slow: Literal["error", "warn", "ignore"] = "error",
+    task: Literal["dedupe", "link"] | None = None,
+    partition: tuple[int, int] | None = None,
+    **kwargs,
+) -> ir.Table:
+    """`join()`, optionally restricted to one hash partition of the pairs.
+
+    `partition` is a tuple of (partition index, number of partitions).
+    Every pair that `join()` would produce shows up in at least one partition.
+    """
     from mismo.block import _sql_analyze
 
     if id(left) == id(right):
@@ -284,7 +705,13 @@ def join(
         if task is None:
             task = "dedupe"
     resolved = _resolve_predicate(
-        left, right, condition, on_slow=on_slow, task=task, **kwargs
+        left,
+        right,
+        condition,
+        partition=partition,
+        on_slow=on_slow,
+        task=task,
+        **kwargs,
     )
     if isinstance(resolved, ir.Table):
         return resolved
@@ -349,20 +776,66 @@ def _ensure_suffixed(
 
 
 def _resolve_predicate(
-    left: ir.Table, right: ir.Table, raw, **kwargs
+    left: ir.Table,
+    right: ir.Table,
+    raw,
+    *,
+    partition: tuple[int, int] | None = None,
+    **kwargs,
 ) -> tuple[ir.Table, ir.Table, bool | ir.BooleanColumn] | ir.Table:
     if isinstance(raw, ir.Table):
+        if partition is not None:
+            raw = raw.filter(_in_partition(raw.record_id_l, partition))
         return raw
-    if isinstance(raw, (ir.BooleanColumn, bool)):
+    if isinstance(raw, bool):
+        if partition is not None:
+            left = left.filter(_in_partition(left.record_id, partition))
+        return left, right, raw
+    if isinstance(raw, ir.BooleanColumn):
+        if partition is not None:
+            # The condition references the tables directly, so filtering `left`
+            # would leave it referencing the unfiltered table.
+            raise ValueError(
+                "Conditions that are boolean columns can't be partitioned."
+                " Use a callable that takes the left and right tables instead."
+            )
         return left, right, raw
     # Deferred is callable, so guard against that
     if callable(raw) and not isinstance(raw, Deferred):
-        return _resolve_predicate(left, right, raw(left, right, **kwargs))
+        resolved = raw(left, right, **kwargs)
+        if partition is not None and isinstance(resolved, ir.BooleanColumn):
+            # The condition references the tables directly, so we can't
+            # partition on a key. Partition the left records instead,
+            # and re-build the condition so it references the filtered table.
+            left = left.filter(_in_partition(left.record_id, partition))
+            return left, right, raw(left, right, **kwargs)
+        return _resolve_predicate(left, right, resolved, partition=partition)
     keys_l = list(_util.bind(left, raw))
     keys_r = list(_util.bind(right, raw))
     left = left.mutate(keys_l)
     right = right.mutate(keys_r)
     keys_l = [left[val.get_name()] for val in keys_l]
     keys_r = [right[val.get_name()] for val in keys_r]
+    if partition is not None:
+        # Equal keys hash to the same partition,
+        # so every pair ends up in exactly one partition.
+        names_l = [k.get_name() for k in keys_l]
+        names_r = [k.get_name() for k in keys_r]
+        keys_r = [rk.cast(lk.type()) for lk, rk in zip(keys_l, keys_r)]
+        left = left.filter(_in_partition(_key_struct(keys_l), partition))
+        right = right.filter(_in_partition(_key_struct(keys_r), partition))
+        keys_l = [left[name] for name in names_l]
+        keys_r = [right[name] for name in names_r]
     cond = ibis.and_(*[lkey == rkey for lkey, rkey in zip(keys_l, keys_r)])
     return left, right, cond
+
+
+def _key_struct(keys: list[ir.Column]) -> ir.StructColumn:
+    return ibis.struct({f"key{i}": k for i, k in enumerate(keys)})
+
+
+def _in_partition(val: ir.Value, partition: tuple[int, int]) -> ir.BooleanValue:
+    """Is the hash of `val` in the given (partition index, number of partitions)?"""
+    p, n = partition
+    # hash() can be negative, so make the modulo positive
+    return ((val.hash() % n) + n) % n == p
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Iterable
+
+import ibis
+from ibis import _
+from ibis.expr import types as ir
+
+from mismo import _util
+from mismo.block._skew import _resolve_keys
+
+_MANIFEST = "manifest.json"
+
+
+class BlockIndex:
+    """A persisted index of the blocking keys of a large, slowly changing table.
+
+    [block_many()][mismo.block.block_many] derives the blocking keys for both
+    tables every time it is called. When one side is a big master table that
+    barely changes, and the other side is a small batch of new records,
+    almost all of that work is wasted.
+
+    A BlockIndex computes the keys for the master table once and stores them as
+    Parquet files in a directory. It can then be updated incrementally with
+    [add()][mismo.block.BlockIndex.add] and
+    [remove()][mismo.block.BlockIndex.remove]. Blocking a batch against the index
+    only derives the keys for the batch, and then looks them up in the index.
+
+    Only rules that resolve to equality keys, such as `"zipcode"` or
+    `(_.last_name, _.city)`, can be indexed, since arbitrary boolean conditions
+    need both records at once.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> import ibis
+    >>> from ibis import _
+    >>> from mismo.block import BlockIndex
+    >>> con = ibis.duckdb.connect()
+    >>> master = con.create_table(
+    ...     "master",
+    ...     {
+    ...         "record_id": [0, 1, 2],
+    ...         "name": ["alice", "bob", "carol"],
+    ...         "zip": ["11111", "22222", "33333"],
+    ...     },
+    ... )
+    >>> batch = con.create_table(
+    ...     "batch",
+    ...     {
+    ...         "record_id": [10, 11],
+    ...         "name": ["alice", "robert"],
+    ...         "zip": ["99999", "22222"],
+    ...     },
+    ... )
+    >>> index = BlockIndex(tempfile.mkdtemp(), ["name", "zip"])
+    >>> index.add(master)
+    >>> index.block(batch, master)["record_id_l", "record_id_r"].execute()
+       record_id_l  record_id_r
+    0           10            0
+    1           11            1
+    """
+
+    def __init__(self, path: str | Path, rules: Iterable) -> None:
+        """Open the index stored in the directory `path`, creating it if needed.
+
+        Parameters
+        ----------
+        path
+            The directory to store the index in.
+        rules
+            The blocking rules to index. These are the same sort of conditions
+            that [block_many()][mismo.block.block_many] accepts,
+            but they must resolve to equality keys.
+            Since rules are code, they aren't stored in the index,
+            so the same rules must be given every time the index is opened.
+        """
+        self._path = Path(path)
+        self._rules = tuple(rules)
+        if not self._rules:
+            raise ValueError("No rules provided")
+        names = [_util.get_name(rule) for rule in self._rules]
+        manifest_path = self._path / _MANIFEST
+        if manifest_path.exists():
+            self._manifest = json.loads(manifest_path.read_text())
+            if self._manifest["rules"] != names:
+                raise ValueError(
+                    f"The index at {self._path} was built with the rules"
+                    f" {self._manifest['rules']}, but was opened with {names}"
+                )
+        else:
+            self._manifest = {
+                "rules": names,
+                "next_segment": 0,
+                "segments": [[] for _ in names],
+                "tombstones": [],
+            }
+        # The backend the index was last used with, for compact().
+        self._con: ibis.BaseBackend | None = None
+
+    @property
+    def path(self) -> Path:
+        """The directory the index is stored in."""
+        return self._path
+
+    @property
+    def rules(self) -> tuple:
+        """The indexed blocking rules."""
+        return self._rules
+
+    def add(self, t: ir.Table) -> None:
+        """Add records to the index, replacing any with the same `record_id`.
+
+        The keys for each rule are derived from `t` and written as a new segment.
+        """
+        con = self._con = t._find_backend(use_default=True)
+        seg = self._manifest["next_segment"]
+        # Tombstone any old versions of these records. New keys are written in
+        # the same segment, and only rows from older segments are hidden.
+        if not self._is_empty():
+            tomb = self._write_tombstones(con, t.select("record_id"), seg)
+            self._manifest["tombstones"].append(tomb)
+        segments = []
+        for i, rule in enumerate(self._rules):
+            keys = self._derive_keys(t, t, rule).mutate(
+                segment=ibis.literal(seg, "int64")
+            )
+            path = self._path / f"rule{i}" / f"segment{seg}.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            con.to_parquet(keys, path)
+            segments.append(str(path.relative_to(self._path)))
+        for existing, new in zip(self._manifest["segments"], segments):
+            existing.append(new)
+        self._manifest["next_segment"] = seg + 1
+        self._save_manifest()
+
+    def remove(self, record_ids: ir.Column | ir.Table | Iterable) -> None:
+        """Remove records from the index.
+
+        Parameters
+        ----------
+        record_ids
+            The `record_id`s to remove. Either a column, a table with a `record_id`
+            column, or an iterable of ids.
+        """
+        if isinstance(record_ids, ir.Table):
+            ids = record_ids.select("record_id")
+        elif isinstance(record_ids, ir.Column):
+            ids = record_ids.name("record_id").as_table()
+        else:
+            ids = ibis.memtable({"record_id": list(record_ids)})
+        con = self._con = ids._find_backend(use_default=True)
+        seg = self._manifest["next_segment"]
+        self._manifest["tombstones"].append(self._write_tombstones(con, ids, seg))
+        self._manifest["next_segment"] = seg + 1
+        self._save_manifest()
+
+    def compact(self, backend: ibis.BaseBackend | None = None) -> None:
+        """Rewrite the index so each rule is a single segment without tombstones.
+
+        This makes lookups faster after many calls to `add()` and `remove()`.
+
+        Parameters
+        ----------
+        backend
+            The backend to rewrite the index with. If None, use the backend
+            of the tables that were last added, removed, or blocked with this
+            index, or the default backend if there were none yet.
+        """
+        if self._is_empty():
+            return
+        if backend is not None:
+            con = backend
+        elif self._con is not None:
+            con = self._con
+        else:
+            con = ibis.get_backend()
+        seg = self._manifest["next_segment"]
+        segments = []
+        for i in range(len(self._rules)):
+            keys = self._live_keys(con, i).mutate(segment=ibis.literal(seg, "int64"))
+            path = self._path / f"rule{i}" / f"segment{seg}.parquet"
+            con.to_parquet(keys, path)
+            segments.append([str(path.relative_to(self._path))])
+        old = [f for fs in self._manifest["segments"] for f in fs]
+        old += self._manifest["tombstones"]
+        self._manifest["segments"] = segments
+        self._manifest["tombstones"] = []
+        self._manifest["next_segment"] = seg + 1
+        self._save_manifest()
+        for f in old:
+            (self._path / f).unlink(missing_ok=True)
+
+    def block(
+        self,
+        left: ir.Table,
+        right: ir.Table,
+        *,
+        labels: bool = False,
+    ) -> ir.Table:
+        """Block a batch of records against the indexed records.
+
+        Only the keys for `left` are derived. They are looked up in the index
+        to find the matching `record_id`s, which are then joined to `right`.
+        Pairs between two records within `left` are not generated.
+
+        Parameters
+        ----------
+        left
+            The batch of new records.
+        right
+            The table of indexed records. This is only used to join the record
+            columns onto the blocked pairs, so it should be the same records
+            that were added to the index.
+        labels
+            If True, add a `blocking_rules` column of type `array<string>`,
+            as in [block_many()][mismo.block.block_many].
+
+        Returns
+        -------
+        A blocked table, as from [block_many()][mismo.block.block_many].
+        """
+        from mismo.block._block import _join_on_id_pairs
+
+        if self._is_empty():
+            raise ValueError("The index is empty. Use add() to add records first.")
+        con = self._con = left._find_backend(use_default=True)
+        sub_joined = []
+        for i, rule in enumerate(self._rules):
+            indexed = self._live_keys(con, i).rename(record_id_r="record_id")
+            batch = self._derive_keys(left, right, rule).rename(record_id_l="record_id")
+            key_cols = [c for c in batch.columns if c != "record_id_l"]
+            batch = batch.mutate(
+                **{c: batch[c].cast(indexed[c].type()) for c in key_cols}
+            )
+            ids = batch.inner_join(indexed, key_cols).select(
+                "record_id_l", "record_id_r"
+            )
+            ids = ids.distinct()
+            if labels:
+                ids = ids.mutate(blocking_rule=ibis.literal(_util.get_name(rule)))
+            sub_joined.append(ids)
+        if labels:
+            result = ibis.union(*sub_joined, distinct=False)
+            result = result.group_by("record_id_l", "record_id_r").agg(
+                blocking_rules=_.blocking_rule.collect()
+            )
+        else:
+            result = ibis.union(*sub_joined, distinct=True)
+        return _join_on_id_pairs(left, right, result)
+
+    def __repr__(self) -> str:
+        return f"BlockIndex({str(self._path)!r}, {self._manifest['rules']})"
+
+    def _is_empty(self) -> bool:
+        return not self._manifest["segments"][0]
+
+    def _derive_keys(self, t: ir.Table, other: ir.Table, rule) -> ir.Table:
+        key = _resolve_keys(t, other, rule)
+        if key is None:
+            raise ValueError(
+                f"The rule '{_util.get_name(rule)}' doesn't resolve to equality keys,"
+                " so it can't be indexed."
+            )
+        vals = _util.bind(t, key)
+        keys = t.select("record_id", **{f"key{i}": v for i, v in enumerate(vals)})
+        # NULL keys never match in an equality join.
+        return keys.filter(*[keys[f"key{i}"].notnull() for i in range(len(vals))])
+
+    def _live_keys(self, con, rule_index: int) -> ir.Table:
+        paths = [str(self._path / f) for f in self._manifest["segments"][rule_index]]
+        keys = con.read_parquet(paths)
+        if self._manifest["tombstones"]:
+            paths = [str(self._path / f) for f in self._manifest["tombstones"]]
+            tombs = con.read_parquet(paths).rename(tomb_segment="segment")
+            keys = keys.anti_join(
+                tombs,
+                [
+                    keys.record_id == tombs.record_id,
+                    keys.segment < tombs.tomb_segment,
+                ],
+            )
+        return keys.drop("segment")
+
+    def _write_tombstones(self, con, ids: ir.Table, seg: int) -> str:
+        path = self._path / "tombstones" / f"segment{seg}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        con.to_parquet(ids.mutate(segment=ibis.literal(seg, "int64")), path)
+        return str(path.relative_to(self._path))
+
+    def _save_manifest(self) -> None:
+        self._path.mkdir(parents=True, exist_ok=True)
+        tmp = self._path / (_MANIFEST + ".tmp")
+        tmp.write_text(json.dumps(self._manifest, indent=2))
+        # Atomic, so a crash never leaves a half-written manifest.
+        os.replace(tmp, self._path / _MANIFEST)
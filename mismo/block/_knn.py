@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import Callable, Literal
+
+import ibis
+from ibis import _
+from ibis.common.deferred import Deferred
+from ibis.expr import types as ir
+import numpy as np
+import pyarrow as pa
+
+from mismo import _profile, _util
+
+
+@dataclasses.dataclass(frozen=True)
+class VectorKNNBlocker:
+    """Blocks each left record with its `k` most similar right records by embedding.
+
+    This builds an in-memory Inverted File (IVF) index over the right table's
+    vectors, using NumPy:
+
+    1. The right vectors are clustered into `n_lists` clusters with k-means.
+    2. Each left vector is compared to the cluster centroids,
+       and only the right vectors in the `n_probe` closest clusters are searched.
+    3. The `k` most similar right vectors that were found are blocked with the
+       left record.
+
+    This avoids the O(n*m) cross join needed to compare every pair of vectors.
+    Increase `n_probe` to find more of the true nearest neighbors, at the cost
+    of more computation. If `n_probe >= n_lists`, the search is exact.
+
+    Records where the vector is NULL are never blocked.
+    All non-NULL vectors must have the same length.
+
+    Examples
+    --------
+    >>> import ibis
+    >>> from mismo.block import VectorKNNBlocker, block_one
+    >>> con = ibis.duckdb.connect()
+    >>> t = con.create_table(
+    ...     "embedded",
+    ...     {
+    ...         "record_id": [0, 1, 2, 3],
+    ...         "embedding": [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.1, 0.9]],
+    ...     }
+    ... )
+    >>> blocker = VectorKNNBlocker("embedding", k=1)
+    >>> block_one(t, t, blocker).select("record_id_l", "record_id_r").execute()
+       record_id_l  record_id_r
+    0            0            1
+    1            2            3
+    """
+
+    vector: str | Deferred | Callable[[ir.Table], ir.ArrayColumn]
+    """The `array<numeric>` embedding column, eg `_.embedding`."""
+    k: int = 10
+    """The number of neighbors to block with each left record."""
+    metric: Literal["cosine", "dot", "l2"] = "cosine"
+    """
+    How to measure similarity. "cosine" for cosine similarity,
+    "dot" for the raw dot product, or "l2" for (negative) Euclidean distance.
+    """
+    n_lists: int | None = None
+    """
+    The number of clusters in the index.
+    If None, uses the square root of the number of right records.
+    """
+    n_probe: int = 8
+    """The number of clusters to search for each left record."""
+    n_iter: int = 10
+    """The number of k-means iterations to use when building the index."""
+    batch_size: int = 4096
+    """The number of left records to search at once. This bounds memory usage."""
+    seed: int = 0
+    """The seed for initializing k-means."""
+    name: str | None = None
+    """The name of the blocker."""
+
+    def __post_init__(self):
+        if self.k < 1:
+            raise ValueError(f"k must be at least 1, got {self.k}")
+        if self.n_probe < 1:
+            raise ValueError(f"n_probe must be at least 1, got {self.n_probe}")
+        if self.metric not in ("cosine", "dot", "l2"):
+            raise ValueError(
+                f"metric must be one of 'cosine', 'dot', or 'l2'. Got {self.metric}"
+            )
+
+    def __call__(
+        self,
+        left: ir.Table,
+        right: ir.Table,
+        *,
+        task: Literal["dedupe", "link"] | None = None,
+        **kwargs,
+    ) -> ir.Table:
+        """Return the (record_id_l, record_id_r) pairs of nearest neighbors."""
+        if task is None and id(left) == id(right):
+            task = "dedupe"
+        ids_l, vecs_l = _to_numpy(left, self.vector)
+        if task == "dedupe":
+            ids_r, vecs_r = ids_l, vecs_l
+        else:
+            ids_r, vecs_r = _to_numpy(right, self.vector)
+        if self.metric == "cosine":
+            vecs_l = _unit(vecs_l)
+            vecs_r = _unit(vecs_r)
+        index = _IVFIndex.build(
+            vecs_r,
+            metric=self.metric,
+            n_lists=self.n_lists,
+            n_iter=self.n_iter,
+            seed=self.seed,
+        )
+        idx_l, idx_r = index.search(
+            vecs_l,
+            k=self.k,
+            n_probe=self.n_probe,
+            batch_size=self.batch_size,
+            exclude_self=task == "dedupe",
+        )
+        pairs = ibis.memtable(
+            pa.table(
+                {"record_id_l": ids_l.take(idx_l), "record_id_r": ids_r.take(idx_r)}
+            )
+        )
+        if task == "dedupe":
+            pairs = pairs.select(
+                record_id_l=ibis.least(_.record_id_l, _.record_id_r),
+                record_id_r=ibis.greatest(_.record_id_l, _.record_id_r),
+            ).distinct()
+        return pairs
+
+
+def _to_numpy(t: ir.Table, vector) -> tuple[pa.Array, np.ndarray]:
+    t = t.select("record_id", __vec=_util.get_column(t, vector))
+    t = t.filter(_.__vec.notnull())
+    pat = _profile.to_pyarrow(t, name="fetch_vectors")
+    ids = pat["record_id"].combine_chunks()
+    vecs = pat["__vec"].combine_chunks()
+    lengths = np.unique(pa.compute.list_value_length(vecs).to_numpy())
+    if len(lengths) > 1:
+        raise ValueError(f"All vectors must have the same length. Got {lengths}")
+    dim = int(lengths[0]) if len(lengths) else 0
+    values = vecs.flatten().to_numpy(zero_copy_only=False).astype(np.float32)
+    return ids, values.reshape(len(vecs), dim)
+
+
+def _unit(vecs: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vecs / norms
+
+
+@dataclasses.dataclass
+class _IVFIndex:
+    vecs: np.ndarray
+    """The indexed vectors, sorted by cluster."""
+    order: np.ndarray
+    """The original index of each vector in `vecs`."""
+    offsets: np.ndarray
+    """Cluster i is vecs[offsets[i]:offsets[i + 1]]."""
+    centroids: np.ndarray
+    metric: str
+
+    @classmethod
+    def build(
+        cls,
+        vecs: np.ndarray,
+        *,
+        metric: str,
+        n_lists: int | None,
+        n_iter: int,
+        seed: int,
+    ) -> _IVFIndex:
+        n = len(vecs)
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+        # Like faiss, training on a sample is plenty to place the centroids.
+        n_train = min(n, 256 * n_lists)
+        train = vecs[rng.choice(n, size=n_train, replace=False)] if n else vecs
+        centroids = train[:n_lists].copy()
+        for _i in range(n_iter if n_lists > 1 else 0):
+            assignment = _nearest_centroid(train, centroids, metric)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, train)
+            counts = np.bincount(assignment, minlength=n_lists)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+            if metric == "cosine":
+                centroids = _unit(centroids)
+        assignment = _nearest_centroid(vecs, centroids, metric)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(vecs[order], order, offsets, centroids, metric)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        *,
+        k: int,
+        n_probe: int,
+        batch_size: int,
+        exclude_self: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (query index, vector index) pairs of the top k neighbors."""
+        if len(self.vecs) == 0:
+            queries = queries[:0]
+        results = [
+            self._search_batch(
+                queries[start : start + batch_size],
+                start,
+                k=k,
+                n_probe=n_probe,
+                exclude_self=exclude_self,
+            )
+            for start in range(0, len(queries), batch_size)
+        ]
+        if not results:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty
+        return (
+            np.concatenate([q for q, _v in results]),
+            np.concatenate([v for _q, v in results]),
+        )
+
+    def _search_batch(
+        self,
+        queries: np.ndarray,
+        start: int,
+        *,
+        k: int,
+        n_probe: int,
+        exclude_self: bool,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        n_lists = len(self.centroids)
+        n_probe = min(n_probe, n_lists)
+        centroid_sims = _similarity(queries, self.centroids, self.metric)
+        probes = np.argpartition(-centroid_sims, n_probe - 1, axis=1)[:, :n_probe]
+
+        # Invert the probes, so we know which queries probe each list.
+        probed_lists = probes.ravel()
+        probing_queries = np.repeat(np.arange(len(queries)), n_probe)
+        by_list = np.argsort(probed_lists, kind="stable")
+        probing_queries = probing_queries[by_list]
+        probe_offsets = np.searchsorted(probed_lists[by_list], np.arange(n_lists + 1))
+
+        # Search list by list, so each search is a single dense matrix product.
+        query_idxs, vec_idxs, sims = [], [], []
+        for lst in range(n_lists):
+            lo, hi = self.offsets[lst], self.offsets[lst + 1]
+            q = probing_queries[probe_offsets[lst] : probe_offsets[lst + 1]]
+            if hi == lo or len(q) == 0:
+                continue
+            s = _similarity(queries[q], self.vecs[lo:hi], self.metric)
+            members = self.order[lo:hi]
+            if exclude_self:
+                s[members[None, :] == (q + start)[:, None]] = -np.inf
+            kk = min(k, hi - lo)
+            top = np.argpartition(-s, kk - 1, axis=1)[:, :kk]
+            query_idxs.append(np.repeat(q, kk))
+            vec_idxs.append(members[top].ravel())
+            sims.append(np.take_along_axis(s, top, axis=1).ravel())
+        if not query_idxs:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty
+        query_idx = np.concatenate(query_idxs)
+        vec_idx = np.concatenate(vec_idxs)
+        sim = np.concatenate(sims)
+
+        # Keep the k best candidates for each query, across all the probed lists.
+        keep = np.isfinite(sim)
+        query_idx, vec_idx, sim = query_idx[keep], vec_idx[keep], sim[keep]
+        by_query = np.lexsort((-sim, query_idx))
+        query_idx, vec_idx = query_idx[by_query], vec_idx[by_query]
+        group_starts = np.searchsorted(query_idx, query_idx, side="left")
+        rank = np.arange(len(query_idx)) - group_starts
+        keep = rank < k
+        return query_idx[keep] + start, vec_idx[keep]
+
+
+def _similarity(a: np.ndarray, b: np.ndarray, metric: str) -> np.ndarray:
+    """The (len(a), len(b)) matrix of similarities, where bigger is more similar."""
+    sims = a @ b.T
+    if metric == "l2":
+        sq_a = (a * a).sum(axis=1)[:, None]
+        sq_b = (b * b).sum(axis=1)[None, :]
+        sims = -np.sqrt(np.maximum(sq_a + sq_b - 2 * sims, 0))
+    return sims
+
+
+def _nearest_centroid(
+    vecs: np.ndarray, centroids: np.ndarray, metric: str, batch_size: int = 65536
+) -> np.ndarray:
+    result = np.empty(len(vecs), dtype=np.int64)
+    for start in range(0, len(vecs), batch_size):
+        batch = vecs[start : start + batch_size]
+        result[start : start + batch_size] = np.argmax(
+            _similarity(batch, centroids, metric), axis=1
+        )
+    return result
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import dataclasses
+import random
+from typing import Callable
+
+import ibis
+from ibis.common.deferred import Deferred, deferrable
+from ibis.expr import types as ir
+
+# A Mersenne prime, so (a * h + b) % _PRIME is a universal hash family.
+# It is small enough that a * h never overflows an int64.
+_PRIME = 2**31 - 1
+
+
+@dataclasses.dataclass(frozen=True)
+class MinhashLshBlocker:
+    """Blocks records together if their sets of tokens have a high Jaccard similarity.
+
+    Blocking on `_.tokens.unnest()` pairs up two records if they share *any*
+    token, so common tokens generate a huge number of pairs.
+    This instead uses MinHash Locality Sensitive Hashing (LSH):
+
+    1. Each array of tokens is summarized as a MinHash signature of
+       `n_bands * n_rows` integers. The probability that two signatures agree
+       at any one position is the Jaccard similarity of the two token sets.
+    2. The signature is split into `n_bands` bands of `n_rows` integers each,
+       and each band is hashed into a single key.
+    3. Two records are blocked together if they share at least one band key.
+
+    Two records with Jaccard similarity `s` are blocked together with probability
+    `1 - (1 - s**n_rows)**n_bands`. This is an S-curve, with its steepest point
+    near the threshold `(1 / n_bands) ** (1 / n_rows)`.
+    Increase `n_rows` to make the blocker stricter (fewer pairs, lower recall),
+    and increase `n_bands` to make it more lenient (more pairs, higher recall).
+    Each record generates at most `n_bands` keys,
+    so this is an equality join that runs in near-linear time.
+
+    Records where the token array is NULL or empty are never blocked.
+
+    Examples
+    --------
+    >>> import ibis
+    >>> from ibis import _
+    >>> from mismo.block import MinhashLshBlocker, block_one
+    >>> con = ibis.duckdb.connect()
+    >>> t = con.create_table(
+    ...     "addresses",
+    ...     {
+    ...         "record_id": [0, 1, 2],
+    ...         "tokens": [
+    ...             ["123", "main", "st", "springfield"],
+    ...             ["123", "main", "street", "springfield"],
+    ...             ["456", "oak", "st", "shelbyville"],
+    ...         ],
+    ...     }
+    ... )
+    >>> blocker = MinhashLshBlocker(_.tokens, n_bands=10, n_rows=2)
+    >>> block_one(t, t, blocker).select("record_id_l", "record_id_r").execute()
+       record_id_l  record_id_r
+    0            0            1
+    """
+
+    terms: str | Deferred | Callable[[ir.Table], ir.ArrayColumn]
+    """The array of tokens to compare, eg `_.name_tokens`."""
+    n_bands: int = 20
+    """The number of bands to split the MinHash signature into."""
+    n_rows: int = 5
+    """The number of signature values in each band."""
+    seed: int = 0
+    """The seed for choosing the hash functions. Both tables use the same seed."""
+    name: str | None = None
+    """The name of the blocker."""
+
+    def __post_init__(self):
+        if self.n_bands < 1:
+            raise ValueError(f"n_bands must be at least 1, got {self.n_bands}")
+        if self.n_rows < 1:
+            raise ValueError(f"n_rows must be at least 1, got {self.n_rows}")
+
+    @property
+    def threshold(self) -> float:
+        """The approximate Jaccard similarity where blocking becomes likely."""
+        return (1 / self.n_bands) ** (1 / self.n_rows)
+
+    def __call__(self, left: ir.Table, right: ir.Table, **kwargs) -> Deferred:
+        """Return the band key to join on, which is the same for both tables."""
+        return self.band_keys(self.terms).unnest()
+
+    def band_keys(self, terms) -> ir.ArrayValue | Deferred:
+        """Compute the `n_bands` band keys for an array of tokens.
+
+        Parameters
+        ----------
+        terms
+            An array expression, or a Deferred that resolves to one.
+
+        Returns
+        -------
+        An array of `n_bands` int64 keys, or NULL if `terms` is NULL or empty.
+        """
+        if isinstance(terms, str):
+            terms = ibis._[terms]
+        elif callable(terms) and not isinstance(terms, Deferred):
+            terms = ibis._.pipe(terms)
+        return _band_keys(
+            terms, n_bands=self.n_bands, n_rows=self.n_rows, seed=self.seed
+        )
+
+
+@deferrable
+def _band_keys(
+    terms: ir.ArrayValue, *, n_bands: int, n_rows: int, seed: int
+) -> ir.ArrayValue:
+    hashed = terms.map(lambda x: ((x.hash() % _PRIME) + _PRIME) % _PRIME)
+    rng = random.Random(seed)
+    coeffs = [
+        (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+        for _ in range(n_bands * n_rows)
+    ]
+    # ibis has no array min(), so sort and take the first element.
+    signature = [
+        hashed.map(lambda h: (a * h + b) % _PRIME).sort()[0] for a, b in coeffs
+    ]
+    bands = [
+        # Include the band number so that identical values in different bands
+        # don't collide.
+        ibis.struct(
+            {
+                "band": ibis.literal(band, "int16"),
+                **{
+                    f"m{i}": signature[band * n_rows + i].cast("int64")
+                    for i in range(n_rows)
+                },
+            }
+        ).hash()
+        for band in range(n_bands)
+    ]
+    return (terms.length() > 0).ifelse(ibis.array(bands), ibis.null())
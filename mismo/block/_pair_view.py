@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from typing import Any
+
+from ibis.expr import operations as ops
+from ibis.expr import types as ir
+
+from mismo.block._block import _join_on_id_pairs
+
+
+class PairView:
+    """Record pairs that store only their ids, and join on record columns lazily.
+
+    Blocking normally joins every column of both tables onto every pair.
+    With wide records and many pairs, that table can be far bigger than
+    anything downstream needs. Instead, block with `ids_only=True`,
+    and wrap the result in a PairView. [compare()][mismo.block.PairView.compare]
+    then joins on only the columns that the comparers actually reference.
+
+    Examples
+    --------
+    >>> import ibis
+    >>> from ibis import _
+    >>> from mismo.block import PairView, block_one
+    >>> from mismo.compare import LevelComparer
+    >>> con = ibis.duckdb.connect()
+    >>> t = con.create_table(
+    ...     "records",
+    ...     {
+    ...         "record_id": [0, 1, 2],
+    ...         "letter": ["a", "a", "b"],
+    ...         "name": ["Alice", "Alicia", "Bob"],
+    ...         "notes": ["long text", "more long text", "even more"],
+    ...     }
+    ... )
+    >>> ids = block_one(t, t, "letter", ids_only=True)
+    >>> ids.columns
+    ['record_id_l', 'record_id_r']
+    >>> pairs = PairView(t, t, ids)
+    >>> name = LevelComparer("name", [("exact", _.name_l == _.name_r)])
+    >>> pairs.compare(name).to_pandas()
+       record_id_l  record_id_r  name
+    0            0            1  else
+    """
+
+    def __init__(self, left: ir.Table, right: ir.Table, pairs: ir.Table) -> None:
+        """Create a PairView.
+
+        Parameters
+        ----------
+        left
+            The left table that was blocked.
+        right
+            The right table that was blocked.
+        pairs
+            The pairs, with at least the columns `record_id_l` and `record_id_r`,
+            eg from [block_many()][mismo.block.block_many] with `ids_only=True`.
+            Any other columns, such as `blocking_rules`, are kept as they are.
+        """
+        missing = {"record_id_l", "record_id_r"} - set(pairs.columns)
+        if missing:
+            raise ValueError(f"pairs is missing the columns {sorted(missing)}")
+        self._left = left
+        self._right = right
+        self._pairs = pairs
+
+    @property
+    def left(self) -> ir.Table:
+        """The left table."""
+        return self._left
+
+    @property
+    def right(self) -> ir.Table:
+        """The right table."""
+        return self._right
+
+    @property
+    def pairs(self) -> ir.Table:
+        """The pairs table, as given."""
+        return self._pairs
+
+    def select(self, *columns: str) -> ir.Table:
+        """The pairs, with only the given record columns joined on.
+
+        Parameters
+        ----------
+        columns
+            Suffixed column names, eg "name_l" for the `name` column of `left`.
+            The columns of [pairs][mismo.block.PairView.pairs] are always included.
+        """
+        left_columns, right_columns = [], []
+        for c in columns:
+            if c in self._pairs.columns:
+                continue
+            table, side, name = self._split(c)
+            if name not in table.columns:
+                raise ValueError(f"Column {name} is not in the {side} table")
+            if name != "record_id":
+                (left_columns if side == "left" else right_columns).append(name)
+        left = self._left.select("record_id", *dict.fromkeys(left_columns))
+        right = self._right.select("record_id", *dict.fromkeys(right_columns))
+        return _join_on_id_pairs(left, right, self._pairs)
+
+    def to_table(self) -> ir.Table:
+        """The pairs with every column of both tables, as blocking returns them."""
+        return _join_on_id_pairs(self._left, self._right, self._pairs)
+
+    def compare(self, *comparers: Any) -> ir.Table:
+        """Compare the pairs, joining on only the columns the comparers use.
+
+        Parameters
+        ----------
+        comparers
+            As for [compare()][mismo.compare.compare].
+
+        Returns
+        -------
+        The columns of [pairs][mismo.block.PairView.pairs],
+        and a column for each comparer.
+        """
+        from mismo.compare import compare
+
+        # Comparing the full table is only to find out which columns the comparers
+        # reference. This just builds an expression, nothing is executed.
+        wide = self.to_table()
+        probe = compare(wide, *comparers)
+        used = _referenced_columns(probe, wide) & set(wide.columns)
+        outputs = [c for c in probe.columns if c not in wide.columns]
+        compared = compare(self.select(*used), *comparers)
+        return compared.select(*self._pairs.columns, *outputs)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(pairs={self._pairs.columns})"
+
+    def _split(self, column: str) -> tuple[ir.Table, str, str]:
+        if column.endswith("_l"):
+            return self._left, "left", column[:-2]
+        if column.endswith("_r"):
+            return self._right, "right", column[:-2]
+        raise ValueError(f"Column {column} must end with '_l' or '_r'")
+
+
+def _referenced_columns(t: ir.Table, base: ir.Table) -> set[str]:
+    """The names of the columns that the relations on top of `base` compute with.
+
+    Columns that are only passed through unchanged don't count.
+    """
+    base_relations = set(base.op().find(ops.Relation))
+
+    def not_relation(node) -> bool:
+        return not isinstance(node, ops.Relation)
+
+    names = set()
+    for rel in t.op().find(ops.Relation):
+        if rel in base_relations:
+            continue
+        if isinstance(rel, ops.Project):
+            values = [
+                v
+                for k, v in rel.values.items()
+                if not (isinstance(v, ops.Field) and v.name == k)
+            ]
+        else:
+            # Eg a filter or an aggregation.
+            values = [c for c in rel.__children__ if not isinstance(c, ops.Relation)]
+        for v in values:
+            names |= {f.name for f in v.find(ops.Field, filter=not_relation)}
+    return names
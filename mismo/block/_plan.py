@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import itertools
+from typing import Iterable, Literal
+
+import ibis
+from ibis import _
+from ibis.expr import types as ir
+import numpy as np
+import pandas as pd
+
+from mismo import _profile, _util
+from mismo.block import _sql_analyze
+from mismo.block._skew import _resolve_keys
+
+
+class BlockingPlan:
+    """An estimate of what [block_many()][mismo.block.block_many] would produce.
+
+    Made by [plan_blocking()][mismo.block.plan_blocking].
+    """
+
+    def __init__(self, rules: pd.DataFrame, overlaps: pd.DataFrame) -> None:
+        self._rules = rules
+        self._overlaps = overlaps
+
+    @property
+    def rules(self) -> pd.DataFrame:
+        """One row per rule, indexed by the rule name.
+
+        Has the columns
+
+        - `join_algorithm`: The join algorithm DuckDB would use, one of the
+          [JOIN_ALGORITHMS][mismo.block.JOIN_ALGORITHMS], or None if the rule
+          is a precomputed table of pairs, or the backend isn't DuckDB.
+        - `n_pairs`: The number of pairs the rule would generate, or NaN if
+          the rule isn't based on equality keys, so it can't be estimated
+          without running the join.
+        """
+        return self._rules
+
+    @property
+    def overlaps(self) -> pd.DataFrame:
+        """The number of pairs that each two rules would both generate.
+
+        A square table with the rule names as both the index and the columns.
+        The diagonal is the number of pairs of each rule.
+        """
+        return self._overlaps
+
+    @property
+    def n_pairs(self) -> float:
+        """An estimate of the number of pairs in the union of all the rules.
+
+        This is the sum of the rules' pairs, minus the pairs shared by every two
+        rules. Pairs shared by three or more rules are subtracted too many times,
+        so this underestimates when many rules overlap. It is clipped to be at
+        least the number of pairs of the biggest rule.
+        NaN if any rule can't be estimated.
+        """
+        n = self._rules.n_pairs.to_numpy(dtype=np.float64)
+        if np.isnan(n).any():
+            return float("nan")
+        shared = np.triu(self._overlaps.to_numpy(dtype=np.float64), k=1).sum()
+        return float(max(n.sum() - shared, n.max(initial=0)))
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(n_pairs≈{self.n_pairs:,.0f})\n"
+            + self._rules.to_string()
+        )
+
+
+def plan_blocking(
+    left: ir.Table,
+    right: ir.Table,
+    rules: Iterable,
+    *,
+    task: Literal["dedupe", "link"] | None = None,
+) -> BlockingPlan:
+    """Estimate the pairs each blocking rule would generate, without blocking.
+
+    This is a dry run of [block_many()][mismo.block.block_many] that helps you
+    tune the rules before running them for real, which can take hours.
+
+    For rules based on equality keys, such as `"zipcode"` or
+    `("first_name", _.last_name.upper())`, the number of pairs is computed from
+    the number of records with each key value, as in
+    [key_counts()][mismo.block.key_counts]. Two such rules both generate a pair
+    if the records share the keys of both rules, so the overlap between two rules
+    is computed from the counts of the combined keys. These are group-bys over
+    each table, which are much cheaper than the joins themselves.
+
+    If a key produces several values per record, such as `_.tokens.unnest()`,
+    a pair that shares several values is counted once for each,
+    so the numbers are upper bounds.
+
+    Rules that are arbitrary boolean conditions can't be estimated this way,
+    and their number of pairs is NaN.
+
+    The join algorithm for every rule comes from the query plan,
+    as in [get_join_algorithm()][mismo.block.get_join_algorithm].
+
+    Parameters
+    ----------
+    left
+        The left table to block
+    right
+        The right table to block
+    rules
+        The blocking rules, as given to [block_many()][mismo.block.block_many].
+    task
+        If "dedupe", only pairs with `record_id_l < record_id_r` are counted.
+        If "link", all pairs are counted.
+        If None, will be assumed to be "dedupe" if `left` and `right`
+        are the same table.
+
+    Returns
+    -------
+    A [BlockingPlan][mismo.block.BlockingPlan].
+
+    Examples
+    --------
+    >>> import ibis
+    >>> from ibis import _
+    >>> from mismo.block import plan_blocking
+    >>> con = ibis.duckdb.connect()
+    >>> t = con.create_table(
+    ...     "records",
+    ...     {
+    ...         "record_id": [0, 1, 2, 3],
+    ...         "letter": ["a", "a", "a", "b"],
+    ...         "num": [1, 1, 2, 2],
+    ...     }
+    ... )
+    >>> plan = plan_blocking(t, t, ["letter", "num"])
+    >>> plan.rules
+           join_algorithm  n_pairs
+    letter      HASH_JOIN      3.0
+    num         HASH_JOIN      2.0
+    >>> plan.overlaps
+            letter  num
+    letter     3.0  1.0
+    num        1.0  2.0
+    >>> plan.n_pairs
+    4.0
+    """
+    from mismo.block._block import _resolve_predicate
+
+    rules = tuple(rules)
+    if not rules:
+        raise ValueError("No rules provided")
+    same = id(left) == id(right)
+    if same:
+        right = right.view()
+        if task is None:
+            task = "dedupe"
+
+    names = _unique_names([_util.get_name(rule) for rule in rules])
+    keys = [_resolve_keys(left, right, rule, task=task) for rule in rules]
+    algorithms = []
+    for rule in rules:
+        resolved = _resolve_predicate(left, right, rule, task=task)
+        algorithms.append(_join_algorithm(resolved, dedupe=task == "dedupe"))
+
+    overlaps = pd.DataFrame(np.nan, index=names, columns=names)
+    for i, j in itertools.combinations_with_replacement(range(len(rules)), 2):
+        if keys[i] is None or keys[j] is None:
+            continue
+        key = _combine_keys(keys[i]) if i == j else _combine_keys(keys[i], keys[j])
+        n = _n_pairs(left, right, key, dedupe=task == "dedupe", same=same)
+        overlaps.iloc[i, j] = overlaps.iloc[j, i] = n
+    rules_df = pd.DataFrame(
+        {"join_algorithm": algorithms, "n_pairs": np.diag(overlaps.to_numpy())},
+        index=names,
+    )
+    return BlockingPlan(rules_df, overlaps)
+
+
+def _combine_keys(*keys) -> list:
+    result = []
+    for key in keys:
+        # A tuple is several keys, but a Deferred or a string is one.
+        result.extend(key if isinstance(key, (tuple, list)) else [key])
+    return result
+
+
+def _n_pairs(
+    left: ir.Table, right: ir.Table, key: list, *, dedupe: bool, same: bool
+) -> int:
+    kl = _key_counts(left, key)
+    if dedupe and same:
+        n_pairs = (kl.n * (kl.n - 1) // 2).sum()
+    elif dedupe and "record_id" in left.columns and "record_id" in right.columns:
+        n_pairs = _n_ordered_pairs(left, right, key)
+    else:
+        kr = _key_counts(right, key)
+        k = [c for c in kl.columns if c != "n"]
+        n_pairs = ibis.join(kl, kr, k).mutate(n=_.n * _.n_right).n.sum()
+    return int(_profile.execute(n_pairs, name="count_pairs") or 0)
+
+
+def _n_ordered_pairs(left: ir.Table, right: ir.Table, key: list) -> ir.IntegerScalar:
+    """The number of pairs with the same key and `record_id_l < record_id_r`.
+
+    For each right record, a running count over the records with its key,
+    ordered by record_id, gives the number of left records with a smaller id.
+    This is a sort per key, without generating the pairs.
+    """
+
+    def tagged(t: ir.Table, is_left: int) -> ir.Table:
+        cols = [v for k in key for v in _util.bind(t, k)]
+        t = t.select(
+            "record_id",
+            __is_left=ibis.literal(is_left, "int64"),
+            **{f"__key{i}": c for i, c in enumerate(cols)},
+        )
+        return t.dropna(how="any")
+
+    u = ibis.union(tagged(left, 1), tagged(right, 0))
+    keys = [c for c in u.columns if c.startswith("__key")]
+    # At equal ids, right records sort first, so they don't count those left ones.
+    w = ibis.window(group_by=keys, order_by=["record_id", "__is_left"], rows=(None, 0))
+    u = u.mutate(__n_smaller=u.__is_left.sum().over(w))
+    return u.filter(u.__is_left == 0).__n_smaller.sum()
+
+
+def _key_counts(t: ir.Table, key: list) -> ir.Table:
+    cols = [v for k in key for v in _util.bind(t, k)]
+    t = t.select(**{f"__key{i}": c for i, c in enumerate(cols)})
+    t = t.dropna(how="any")
+    return t.group_by(t.columns).agg(n=_.count())
+
+
+def _join_algorithm(resolved, *, dedupe: bool) -> str | None:
+    if isinstance(resolved, ir.Table):
+        return None
+    left, right, pred = resolved
+    if dedupe and "record_id" in left.columns and "record_id" in right.columns:
+        pred = pred & (left.record_id < right.record_id)
+    try:
+        return _sql_analyze.get_join_algorithm(left, right, pred)
+    except _sql_analyze._UnsupportedBackendError:
+        return None
+
+
+def _unique_names(names: list[str]) -> list[str]:
+    seen: dict[str, int] = {}
+    result = []
+    for name in names:
+        n = seen.get(name, 0)
+        seen[name] = n + 1
+        result.append(name if n == 0 else f"{name} ({n})")
+    return result
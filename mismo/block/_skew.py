@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from typing import Any, Literal
+import warnings
+
+import ibis
+from ibis import _
+from ibis.common.deferred import Deferred
+from ibis.expr import types as ir
+import pandas as pd
+
+from mismo import _profile, _util
+from mismo.block._analyze import key_counts
+
+
+class BigKeyWarning(UserWarning):
+    """Warning that some blocking keys exceeded the pair budget and were handled.
+
+    Issued by [block_one()][mismo.block.block_one] and
+    [block_many()][mismo.block.block_many] when `max_pairs_per_key` is given.
+    """
+
+    def __init__(
+        self,
+        condition,
+        keys: pd.DataFrame,
+        action: Literal["drop", "split", "sample"],
+        max_pairs_per_key: int,
+    ) -> None:
+        self.condition = condition
+        self.keys = keys
+        """The offending keys, with a column `n` of the number of pairs for each."""
+        self.action = action
+        """What was done with the pairs from the offending keys."""
+        self.max_pairs_per_key = max_pairs_per_key
+        verb = {"drop": "dropped", "split": "split", "sample": "sampled"}[action]
+        super().__init__(
+            f"The blocking rule '{_util.get_name(condition)}' had {len(keys):,} keys"
+            f" that would each generate more than {max_pairs_per_key:,} pairs"
+            f" (totalling {keys.n.sum():,} pairs). These keys were {verb}."
+        )
+
+
+def guard_big_keys(
+    left: ir.Table,
+    right: ir.Table,
+    condition,
+    *,
+    max_pairs_per_key: int,
+    on_big_key: Literal["drop", "split", "sample"],
+    split_key: Any = None,
+    on_slow: Literal["error", "warn", "ignore"] = "error",
+    task: Literal["dedupe", "link"] | None = None,
+    **kwargs,
+):
+    """Rewrite `condition` so that no single key generates too many pairs.
+
+    If `condition` doesn't resolve to equality keys, or none of the keys are
+    too big, `condition` is returned unchanged.
+    Otherwise, the blocked table of `(record_id_l, record_id_r)` pairs is returned,
+    which can be used as a condition for `join()`.
+    """
+    from mismo.block._block import _distinct_record_ids, _join
+
+    if on_big_key not in ("drop", "split", "sample"):
+        raise ValueError(
+            f"on_big_key must be one of 'drop', 'split', or 'sample'. Got {on_big_key}"
+        )
+    if on_big_key == "split" and split_key is None:
+        raise ValueError("split_key must be given when on_big_key='split'")
+    if id(left) == id(right):
+        right = right.view()
+        if task is None:
+            task = "dedupe"
+
+    key = _resolve_keys(left, right, condition, on_slow=on_slow, task=task, **kwargs)
+    if key is None:
+        return condition
+
+    big = key_counts(left, right, key).filter(_.n > max_pairs_per_key)
+    big_df = _profile.to_pandas(big, name="big_keys")
+    if len(big_df) == 0:
+        return condition
+    warnings.warn(
+        BigKeyWarning(condition, big_df, on_big_key, max_pairs_per_key),
+        stacklevel=3,
+    )
+
+    keys_l = _util.bind(left, key)
+    keys_r = _util.bind(right, key)
+    names = tuple(k.get_name() for k in keys_l)
+    left = left.mutate(keys_l)
+    right = right.mutate(keys_r)
+    big_keys = big.select(*names)
+
+    def blk(le: ir.Table, ri: ir.Table, cond) -> ir.Table:
+        j = _join(le, ri, cond, on_slow=on_slow, task=task, **kwargs)
+        return _distinct_record_ids(j)
+
+    small = blk(
+        left.anti_join(big_keys, list(names)),
+        right.anti_join(big_keys, list(names)),
+        names,
+    )
+    if on_big_key == "drop":
+        return small
+
+    if on_big_key == "split":
+        big_pairs = blk(
+            left.semi_join(big_keys, list(names)),
+            right.semi_join(big_keys, list(names)),
+            (*names, *_util.promote_list(split_key)),
+        )
+    else:
+        # Keep a fraction of sqrt(budget / n) of the records on each side,
+        # so each key generates about `max_pairs_per_key` pairs.
+        fracs = big.select(*names, __frac=(max_pairs_per_key / _.n).sqrt())
+        big_pairs = blk(
+            _sample_by_key(left, fracs, names),
+            _sample_by_key(right, fracs, names),
+            names,
+        )
+    return ibis.union(small, big_pairs, distinct=True)
+
+
+def _resolve_keys(left: ir.Table, right: ir.Table, raw, **kwargs):
+    """Return the equality keys of a condition, or None if it isn't key-based."""
+    if isinstance(raw, (ir.Table, bool, ir.BooleanValue)):
+        return None
+    # Deferred is callable, so guard against that
+    if callable(raw) and not isinstance(raw, Deferred):
+        return _resolve_keys(left, right, raw(left, right, **kwargs))
+    return raw
+
+
+def _sample_by_key(t: ir.Table, fracs: ir.Table, names: tuple[str, ...]) -> ir.Table:
+    t = t.inner_join(fracs, list(names))
+    # Deterministic, so the same records are kept every time.
+    resolution = 1_000_000
+    h = ((t.record_id.hash() % resolution) + resolution) % resolution
+    t = t.filter(h < t.__frac * resolution)
+    return t.drop("__frac")
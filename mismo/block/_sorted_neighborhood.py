@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import Callable, Literal
+
+import ibis
+from ibis import _
+from ibis.common.deferred import Deferred
+from ibis.expr import types as ir
+
+from mismo import _util
+
+
+@dataclasses.dataclass(frozen=True)
+class SortedNeighborhoodBlocker:
+    """Blocks records together if they are near each other when sorted by a key.
+
+    Both tables are stacked on top of each other and sorted by `key`.
+    Then, a window of `window_size` records is slid down the sorted records,
+    and every pair of records within the window is blocked together.
+
+    This is useful for noisy keys, such as names, where exact-equality
+    blocking misses matches due to typos, but similar values still sort
+    near each other.
+    Because each record is only paired with the `window_size - 1` records that
+    follow it, the number of pairs is linear in the number of records.
+    This is implemented with window functions, so it runs as an O(n*log(n)) sort,
+    not as an O(n*m) NESTED_LOOP_JOIN.
+
+    Records where `key` is NULL are never blocked.
+
+    Examples
+    --------
+    >>> import ibis
+    >>> from ibis import _
+    >>> from mismo.block import SortedNeighborhoodBlocker, block_one
+    >>> ibis.options.interactive = True
+    >>> t = ibis.memtable(
+    ...     {
+    ...         "record_id": [0, 1, 2, 3, 4],
+    ...         "name": ["jon", "john", "johnny", "sue", "suzy"],
+    ...     }
+    ... )
+    >>> blocker = SortedNeighborhoodBlocker(_.name, window_size=2)
+    >>> block_one(t, t, blocker).order_by("record_id_l", "record_id_r")
+    ┏━━━━━━━━━━━━━┳━━━━━━━━━━━━━┳━━━━━━━━┳━━━━━━━━┓
+    ┃ record_id_l ┃ record_id_r ┃ name_l ┃ name_r ┃
+    ┡━━━━━━━━━━━━━╇━━━━━━━━━━━━━╇━━━━━━━━╇━━━━━━━━┩
+    │ int64       │ int64       │ string │ string │
+    ├─────────────┼─────────────┼────────┼────────┤
+    │           0 │           2 │ jon    │ johnny │
+    │           0 │           3 │ jon    │ sue    │
+    │           1 │           2 │ john   │ johnny │
+    │           3 │           4 │ sue    │ suzy   │
+    └─────────────┴─────────────┴────────┴────────┘
+    """
+
+    key: str | Deferred | Callable[[ir.Table], ir.Column]
+    """The key to sort the records by, eg `_.last_name + _.first_name`."""
+    window_size: int
+    """
+    The size of the sliding window.
+    Each record is paired with the `window_size - 1` records that follow it.
+    """
+    name: str | None = None
+    """The name of the blocker."""
+
+    def __post_init__(self):
+        if self.window_size < 2:
+            raise ValueError(f"window_size must be at least 2, got {self.window_size}")
+
+    def __call__(
+        self,
+        left: ir.Table,
+        right: ir.Table,
+        *,
+        task: Literal["dedupe", "link"] | None = None,
+        **kwargs,
+    ) -> ir.Table:
+        """Return the (record_id_l, record_id_r) pairs within the sliding window."""
+        return _sorted_neighborhood_pairs(
+            left, right, self.key, self.window_size, task=task
+        )
+
+
+def _sorted_neighborhood_pairs(
+    left: ir.Table,
+    right: ir.Table,
+    key: str | Deferred | Callable[[ir.Table], ir.Column],
+    window_size: int,
+    *,
+    task: Literal["dedupe", "link"] | None = None,
+) -> ir.Table:
+    # Keep the left and right ids in separate columns,
+    # since they might not be the same type.
+    id_type_l = left.record_id.type()
+    id_type_r = right.record_id.type()
+    stacked = left.select(
+        __side=ibis.literal(0, "int8"),
+        __id_l=_.record_id,
+        __id_r=ibis.null().cast(id_type_r),
+        __key=_util.get_column(left, key),
+    )
+    if task != "dedupe":
+        stacked_r = right.select(
+            __side=ibis.literal(1, "int8"),
+            __id_l=ibis.null().cast(id_type_l),
+            __id_r=_.record_id,
+            __key=_util.get_column(right, key),
+        )
+        stacked = stacked.union(stacked_r)
+    stacked = stacked.filter(_.__key.notnull())
+
+    w = ibis.window(order_by=["__key", "__side", "__id_l", "__id_r"])
+    neighbors = [
+        ibis.struct(
+            {
+                "side": stacked.__side.lead(offset).over(w),
+                "id_l": stacked.__id_l.lead(offset).over(w),
+                "id_r": stacked.__id_r.lead(offset).over(w),
+            }
+        )
+        for offset in range(1, window_size)
+    ]
+    pairs = stacked.select(
+        "__side", "__id_l", "__id_r", __neighbor=ibis.array(neighbors).unnest()
+    )
+    pairs = pairs.filter(_.__neighbor.side.notnull())
+    if task == "dedupe":
+        a, b = pairs.__id_l, pairs.__neighbor.id_l
+        return pairs.select(
+            record_id_l=ibis.least(a, b), record_id_r=ibis.greatest(a, b)
+        )
+    pairs = pairs.filter(_.__side != _.__neighbor.side)
+    is_left = pairs.__side == 0
+    return pairs.select(
+        record_id_l=is_left.ifelse(pairs.__id_l, pairs.__neighbor.id_l),
+        record_id_r=is_left.ifelse(pairs.__neighbor.id_r, pairs.__id_r),
+    )
@@ -4,6 +4,7 @@ import altair as alt
 from ibis import _
 from ibis.expr import types as ir
 
+from mismo import _materialize
 from mismo.block import _upset
 
 
@@ -31,7 +32,16 @@ def upset_chart(blocked: ir.Table) -> alt.Chart:
         An Altair chart.
     """
     intersections = blocked.group_by("blocking_rules").agg(intersection_size=_.count())
-    intersections = intersections.cache()
+    materializer = _materialize.active()
+    persisted = materializer.materialize(intersections)
+    try:
+        return _chart(persisted)
+    finally:
+        # The chart holds the data as a DataFrame, so this isn't needed anymore.
+        materializer.release(persisted)
+
+
+def _chart(intersections: ir.Table) -> alt.Chart:
     rule_names: list[str] = (
         intersections.blocking_rules.unnest()
         .as_table()
@@ -1,20 +1,23 @@
 from __future__ import annotations
 
+import math
+import random
 import warnings
 
 import ibis
 from ibis.expr import types as ir
 
+from mismo import _materialize, _profile
 from mismo.block import block_one
 from mismo.block._block import fix_blocked_column_order
 
 
-# TODO: could we come up with an algorithm that would allow for a random seed?
 def sample_all_pairs(
     left: ir.Table,
     right: ir.Table,
     *,
     max_pairs: int | None = None,
+    seed: int | None = None,
 ) -> ir.Table:
     """Samples up to `max_pairs` from all possible pairs of records.
 
@@ -26,6 +29,9 @@ def sample_all_pairs(
         The right table.
     max_pairs :
         The maximum number of pairs to sample. If None, all possible pairs are sampled.
+    seed :
+        The random seed to use. If None, use a random seed.
+        With the same seed, the same tables give the same sample.
 
     Returns
     -------
@@ -66,9 +72,13 @@ def sample_all_pairs(
     │ rec-494-org   │ rec-307-dup-0 │ mcmillan crescent │ birrigaisquare   │ arcadia                    │ arabian stud ielkette park │ … │
     └───────────────┴───────────────┴───────────────────┴──────────────────┴────────────────────────────┴────────────────────────────┴───┘
     """  # noqa: E501
-    left = left.cache()
-    right = right.cache()
-    n_possible_pairs = (left.count() * right.count()).execute()
+    # Each is counted, and then joined.
+    left = _materialize.materialize(left, uses=2)
+    right = _materialize.materialize(right, uses=2)
+    # Count each side on its own, since ibis can't multiply counts of two tables.
+    n_left = int(_profile.execute(left.count(), name="count_left"))
+    n_right = int(_profile.execute(right.count(), name="count_right"))
+    n_possible_pairs = n_left * n_right
     n_pairs = (
         n_possible_pairs if max_pairs is None else min(n_possible_pairs, max_pairs)
     )
@@ -86,36 +96,81 @@ def sample_all_pairs(
     if n_pairs == 0:
         return block_one(left, right, True, on_slow="ignore").limit(0)
 
-    def make_pair_ids():
-        pair_ids = ibis.range(n_pairs).unnest().as_table()
-        return pair_ids.select(
-            __left_id=(ibis.random() * left.count()).floor().cast("int64"),
-            __right_id=(ibis.random() * right.count()).floor().cast("int64"),
-        )
-
-    # This iterative method is the best I could come up with to avoid duplicates.
-    # A better method might be possible.
-    # At first I tried ibis.range(n_pairs * 2)....distinct().limit(n_pairs)
-    # but choosing the safety margin (here it is 2) is tricky.
-    # The closer n_pairs gets to n_possible_pairs, the higher the safety margin
-    # needs to be.
-    # But you are doing unneeded computation if you set it higher than it needs
-    # to be.
-    # For example if we have 10 records, and max_pairs is 99, then we need
-    # to do really large samples in order to get to the 99 unique pairs.
-    # On the other hand, if we have 10k records and max_pairs is only 10,
-    # then we could get away with doing a sample of 20 pairs and we would
-    # probably get all unique pairs.
-    pair_ids = make_pair_ids().distinct().cache()
-    while pair_ids.count().execute() < n_pairs:
-        pair_ids = pair_ids.union(make_pair_ids()).distinct().limit(n_pairs).cache()
+    if seed is None:
+        seed = random.randrange(2**32)
+    pair_ids = _distinct_ids(n_pairs, n_possible_pairs, seed)
+    pair_ids = pair_ids.select(
+        __left_id=pair_ids.__pair_id // n_right,
+        __right_id=pair_ids.__pair_id % n_right,
+    )
 
     right = right.view()
-    left = left.rename("{name}_l").mutate(__left_id=ibis.row_number())
-    right = right.rename("{name}_r").mutate(__right_id=ibis.row_number())
+    # Number the records in a deterministic order, so the seed is reproducible.
+    left = left.rename("{name}_l").mutate(
+        __left_id=ibis.row_number().over(order_by="record_id_l")
+    )
+    right = right.rename("{name}_r").mutate(
+        __right_id=ibis.row_number().over(order_by="record_id_r")
+    )
     result = (
         pair_ids.left_join(left, "__left_id")
         .left_join(right, "__right_id")
         .drop("__left_id", "__right_id", "__left_id_right", "__right_id_right")
     )
     return fix_blocked_column_order(result)
+
+
+# Each is one half of a Feistel round. Luby-Rackoff says 3 full rounds
+# are enough for a good pseudorandom permutation.
+_N_HALF_ROUNDS = 6
+
+
+def _distinct_ids(n_ids: int, n: int, seed: int) -> ir.Table:
+    """Choose `n_ids` distinct, pseudorandom integers from [0, n).
+
+    Push the numbers 0, 1, 2, ... through
+    a pseudorandom permutation of [0, 2**n_bits) (a Feistel network keyed
+    by `seed`). The outputs are distinct because it is a permutation, so this
+    needs no rejection loop. Outputs that are >= n are skipped: since
+    n > 2**n_bits / 2, we only need about twice as many inputs as outputs.
+
+    The result is a table with one column, `__pair_id`.
+    """
+    n_bits = max(2, (n - 1).bit_length())
+    left_bits = n_bits // 2
+    right_bits = n_bits - left_bits
+    # Enough inputs that we are (essentially) certain to get n_ids outputs:
+    # the number of outputs that land in [0, n) is within a few standard
+    # deviations (at most sqrt of the inputs) of its mean.
+    n_inputs = (n_ids + 10 * math.isqrt(n_ids) + 100) * 2**n_bits // n + 1
+    n_inputs = min(n_inputs, 2**n_bits)
+
+    t = ibis.range(n_inputs).unnest().name("__x").as_table()
+    t = t.select(
+        __l=t.__x >> right_bits,
+        __r=t.__x & (2**right_bits - 1),
+    )
+    rng = random.Random(seed)
+    for i in range(_N_HALF_ROUNDS):
+        salt = rng.randrange(2**32)
+        # One select per half round. Inlining them all into one expression
+        # would make it exponentially large.
+        if i % 2 == 0:
+            t = t.select("__r", __l=t.__l ^ _round_function(t.__r, salt, left_bits))
+        else:
+            t = t.select("__l", __r=t.__r ^ _round_function(t.__l, salt, right_bits))
+    t = t.select(__pair_id=(t.__l << right_bits) | t.__r)
+    # This limit does nothing, except stop DuckDB from pushing the filter below
+    # into the rounds above, where it would inline them all into one huge
+    # expression.
+    t = t.limit(n_inputs)
+    # DuckDB preserves insertion order by default, so this always takes the
+    # same outputs for the same seed.
+    return t.filter(t.__pair_id < n).limit(n_ids)
+
+
+def _round_function(x: ir.IntegerValue, salt: int, n_bits: int) -> ir.IntegerValue:
+    # DuckDB's hash is a uint64, so keep the mask unsigned too.
+    # Mixing it with a signed int would promote to a slow int128.
+    h = (x + salt).hash() & ibis.literal(2**n_bits - 1, "uint64")
+    return h.cast("int64")
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import math
+
 from ibis import _
 import pytest
 
-from mismo.block import key_counts
+from mismo.block import block_many, block_one, key_counts, plan_blocking
 from mismo.tests.util import assert_tables_equal
 
 
@@ -79,3 +81,44 @@ def test_key_counts_errs(inp):
         key_counts(inp, key="letter")
     with pytest.raises(TypeError):
         key_counts(left=inp, right=inp, key="letter")
+
+
+def test_plan_blocking(t1, t2):
+    def by_int(left, right, **_):
+        return left.int < right.int
+
+    rules = ["letter", ("letter", "int"), _.array.unnest(), by_int]
+    plan = plan_blocking(t1, t2, rules)
+    for name, rule in zip(plan.rules.index[:3], rules[:3]):
+        actual = block_one(t1, t2, rule).count().execute()
+        assert plan.rules.n_pairs[name] == actual
+    assert plan.rules.n_pairs.isna().tolist() == [False, False, False, True]
+    assert plan.rules.join_algorithm.tolist()[:3] == ["HASH_JOIN"] * 3
+    # letter and (letter, int) share the one pair (1, 90)
+    assert plan.overlaps.iloc[0, 1] == 1
+    assert math.isnan(plan.overlaps.iloc[0, 3])
+    assert math.isnan(plan.n_pairs)
+
+    plan = plan_blocking(t1, t1, ["letter", "int"])
+    assert plan.rules.n_pairs.tolist() == [0, 0]
+    assert plan.n_pairs == 0
+
+
+def test_plan_blocking_dedupe(table_factory):
+    t = table_factory(
+        {
+            "record_id": [0, 1, 2, 3],
+            "letter": ["a", "a", "a", "b"],
+            "num": [1, 1, 2, 2],
+        }
+    )
+    rules = ["letter", "num"]
+    expected = [block_one(t, t, rule).count().execute() for rule in rules]
+    assert expected == [3, 2]
+    for right, task in [(t, None), (t.view(), "dedupe")]:
+        plan = plan_blocking(t, right, rules, task=task)
+        assert plan.rules.n_pairs.tolist() == expected
+        assert plan.overlaps.iloc[0, 1] == 1
+        assert plan.n_pairs == 4
+        actual = block_many(t, right, rules, task=task).count().execute()
+        assert plan.n_pairs == actual
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import gc
+import tempfile
+
 import ibis
 from ibis import _
 from ibis.expr import types as ir
 import pytest
 
 import mismo
-from mismo.block import SlowJoinError, SlowJoinWarning, block_one
+from mismo.block import SlowJoinError, SlowJoinWarning, block_many, block_one
 from mismo.tests.util import assert_tables_equal
 
 
@@ -139,3 +142,171 @@ def test_warn_slow_join(
     elif is_slow and result is SlowJoinError:
         with pytest.raises(SlowJoinError):
             f()
+
+
+@pytest.mark.parametrize("labels", [False, True])
+@pytest.mark.parametrize("n_partitions", [1, 3])
+def test_block_many_partitioned(
+    t1: ir.Table, t2: ir.Table, tmp_path, n_partitions, labels
+):
+    conditions = [
+        "letter",
+        _.array.unnest(),
+        lambda left, right, **_: left.int == right.int,
+    ]
+    expected = block_many(t1, t2, conditions, labels=labels)
+    result = block_many(
+        t1,
+        t2,
+        conditions,
+        labels=labels,
+        n_partitions=n_partitions,
+        spill_dir=tmp_path,
+    )
+    assert len(list(tmp_path.glob("*.parquet"))) == len(conditions) * n_partitions
+    if labels:
+        expected = expected.mutate(blocking_rules=_.blocking_rules.sort())
+        result = result.mutate(blocking_rules=_.blocking_rules.sort())
+    assert_tables_equal(expected, result)
+
+
+def test_block_many_partitioned_cleans_up(t1: ir.Table, t2: ir.Table, tmp_path):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(tempfile, "tempdir", str(tmp_path))
+        result = block_many(t1, t2, ["letter"], n_partitions=2)
+        (spill_dir,) = tmp_path.glob("mismo-block-*")
+        assert len(list(spill_dir.glob("*.parquet"))) == 2
+        assert result.count().execute() > 0
+        del result
+        gc.collect()
+        assert not spill_dir.exists()
+
+        # The files are deleted even if spilling fails.
+        with pytest.raises(ValueError, match="can't be partitioned"):
+            block_many(t1, t2, [t1.letter == t2.letter], n_partitions=2)
+        assert not list(tmp_path.glob("mismo-block-*"))
+
+
+def test_block_many_partitioned_boolean_column(t1: ir.Table, t2: ir.Table, tmp_path):
+    with pytest.raises(ValueError, match="can't be partitioned"):
+        block_many(
+            t1, t2, [t1.letter == t2.letter], n_partitions=2, spill_dir=tmp_path
+        )
+
+
+@pytest.mark.parametrize("n_partitions", [None, 2])
+def test_block_many_threaded(t1: ir.Table, t2: ir.Table, tmp_path, n_partitions):
+    conditions = [
+        "letter",
+        _.array.unnest(),
+        lambda left, right, **_: left.int == right.int,
+    ]
+    for left, right in [(t1, t2), (t1, t1)]:
+        expected = block_many(left, right, conditions, labels=True)
+        result = block_many(
+            left,
+            right,
+            conditions,
+            labels=True,
+            n_threads=2,
+            n_partitions=n_partitions,
+            spill_dir=tmp_path / str(id(right)),
+        )
+        expected = expected.mutate(blocking_rules=_.blocking_rules.sort())
+        result = result.mutate(blocking_rules=_.blocking_rules.sort())
+        assert_tables_equal(expected, result)
+    # the copies of the inputs are cleaned up
+    con = t1._find_backend()
+    assert not [n for n in con.list_tables() if n.startswith("mismo_block_input")]
+
+
+def test_block_many_threaded_connection_local(t1: ir.Table, tmp_path):
+    # Neither temp tables nor Python UDFs are visible to the worker cursors.
+    con = t1._find_backend()
+    letters = con.create_table(
+        "letters_temp", ibis.memtable({"letter": ["a", "b"]}), temp=True
+    )
+
+    @ibis.udf.scalar.python
+    def same(a: str, b: str) -> bool:
+        return a == b
+
+    conditions = [
+        lambda left, right, **_: (left.letter == right.letter)
+        & left.letter.isin(letters.letter),
+        lambda left, right, **_: same(left.letter, right.letter),
+    ]
+    kwargs = dict(on_slow="ignore")
+    expected = block_many(t1, t1, conditions, **kwargs)
+    result = block_many(t1, t1, conditions, n_threads=2, spill_dir=tmp_path, **kwargs)
+    assert_tables_equal(expected, result)
+    assert not [n for n in con.list_tables() if n.startswith("mismo_block_input")]
+
+
+def test_block_many_threaded_not_duckdb():
+    con = ibis.sqlite.connect()
+    t = con.create_table("t", ibis.memtable({"record_id": [0, 1], "letter": "a"}))
+    with pytest.raises(ValueError, match="only works with the DuckDB backend"):
+        block_many(t, t, ["letter"], n_threads=2)
+
+
+@pytest.fixture
+def skewed(table_factory):
+    # key "a" generates 6*6=36 pairs, key "b" generates 2*2=4 pairs
+    return table_factory(
+        {
+            "record_id": range(8),
+            "key": ["a"] * 6 + ["b"] * 2,
+            "sub": [0, 0, 0, 1, 1, 1, 0, 1],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "on_big_key,expected_a_pairs",
+    [
+        pytest.param("drop", set(), id="drop"),
+        pytest.param(
+            "split", {(0, 1), (0, 2), (1, 2), (3, 4), (3, 5), (4, 5)}, id="split"
+        ),
+    ],
+)
+def test_block_max_pairs_per_key(skewed, on_big_key, expected_a_pairs):
+    with pytest.warns(mismo.block.BigKeyWarning) as record:
+        blocked = block_one(
+            skewed,
+            skewed,
+            "key",
+            max_pairs_per_key=10,
+            on_big_key=on_big_key,
+            split_key="sub",
+        )
+    (warning,) = record
+    assert warning.message.keys.key.tolist() == ["a"]
+    assert warning.message.keys.n.tolist() == [36]
+    assert warning.message.action == on_big_key
+    df = blocked["record_id_l", "record_id_r"].execute()
+    pairs = set(df.itertuples(index=False, name=None))
+    assert pairs == expected_a_pairs | {(6, 7)}
+
+
+def test_block_max_pairs_per_key_sample(skewed):
+    with pytest.warns(mismo.block.BigKeyWarning):
+        blocked = block_one(
+            skewed, skewed, "key", max_pairs_per_key=10, on_big_key="sample"
+        )
+    df = blocked["record_id_l", "record_id_r"].execute()
+    pairs = set(df.itertuples(index=False, name=None))
+    assert (6, 7) in pairs
+    assert len(pairs - {(6, 7)}) < 15
+
+
+def test_block_max_pairs_per_key_under_budget(skewed, recwarn):
+    blocked = block_one(skewed, skewed, "key", max_pairs_per_key=100)
+    assert blocked.count().execute() == 15 + 1
+    assert len(recwarn) == 0
+
+
+def test_block_max_pairs_per_key_split_requires_key(skewed):
+    with pytest.raises(ValueError):
+        block_one(skewed, skewed, "key", max_pairs_per_key=10, on_big_key="split")
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from ibis import _
+import pytest
+
+from mismo.block import BlockIndex, block_many
+
+
+@pytest.fixture
+def master(table_factory):
+    return table_factory(
+        {
+            "record_id": [0, 1, 2, 3],
+            "name": ["alice", "bob", "carol", None],
+            "zip": ["11111", "22222", "33333", "44444"],
+        }
+    )
+
+
+@pytest.fixture
+def batch(table_factory):
+    return table_factory(
+        {
+            "record_id": [10, 11, 12],
+            "name": ["alice", "robert", None],
+            "zip": ["99999", "22222", "44444"],
+        }
+    )
+
+
+def _pairs(blocked) -> set[tuple]:
+    df = blocked["record_id_l", "record_id_r"].execute()
+    return set(df.itertuples(index=False, name=None))
+
+
+RULES = ["name", (_.zip, _.name.length())]
+
+
+def test_block_matches_block_many(tmp_path, master, batch):
+    index = BlockIndex(tmp_path, RULES)
+    index.add(master)
+    expected = block_many(batch, master, RULES, labels=True)
+    actual = index.block(batch, master, labels=True)
+    assert set(actual.columns) == set(expected.columns)
+    assert _pairs(actual) == _pairs(expected) == {(10, 0)}
+
+
+def test_incremental_updates(tmp_path, master, batch):
+    index = BlockIndex(tmp_path, ["zip"])
+    index.add(master.filter(_.record_id < 2))
+    assert _pairs(index.block(batch, master)) == {(11, 1)}
+    index.add(master.filter(_.record_id >= 2))
+    assert _pairs(index.block(batch, master)) == {(11, 1), (12, 3)}
+    index.remove([1])
+    assert _pairs(index.block(batch, master)) == {(12, 3)}
+    # Re-adding a record replaces its old keys.
+    index.add(master.filter(_.record_id == 3).mutate(zip=_.zip + "0"))
+    assert _pairs(index.block(batch, master)) == set()
+    index.add(master.filter(_.record_id == 1))
+
+    # The index persists, and compaction doesn't change the results.
+    reopened = BlockIndex(tmp_path, ["zip"])
+    assert _pairs(reopened.block(batch, master)) == {(11, 1)}
+    reopened.compact()
+    assert _pairs(reopened.block(batch, master)) == {(11, 1)}
+    assert len(list((tmp_path / "rule0").iterdir())) == 1
+
+
+def test_wrong_rules(tmp_path, master):
+    BlockIndex(tmp_path, ["zip"]).add(master)
+    with pytest.raises(ValueError, match="built with the rules"):
+        BlockIndex(tmp_path, ["name"])
+
+
+def test_unindexable_rule(tmp_path, master):
+    index = BlockIndex(tmp_path, [lambda left, right, **kw: left.zip == right.zip])
+    with pytest.raises(ValueError, match="equality keys"):
+        index.add(master)
+
+
+def test_empty_index(tmp_path, master, batch):
+    with pytest.raises(ValueError, match="empty"):
+        BlockIndex(tmp_path, ["zip"]).block(batch, master)
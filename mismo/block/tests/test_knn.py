@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from ibis import _
+import numpy as np
+import pytest
+
+from mismo.block import VectorKNNBlocker, block_many, block_one
+
+
+def _pairs(blocked) -> set[tuple]:
+    df = blocked["record_id_l", "record_id_r"].execute()
+    return set(df.itertuples(index=False, name=None))
+
+
+@pytest.fixture
+def embedded(table_factory):
+    return table_factory(
+        {
+            "record_id": [0, 1, 2, 3, 4],
+            "embedding": [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.1, 0.9], None],
+        }
+    )
+
+
+@pytest.mark.parametrize("vector", ["embedding", _.embedding])
+def test_knn_dedupe(embedded, vector):
+    blocker = VectorKNNBlocker(vector, k=1)
+    assert _pairs(block_one(embedded, embedded, blocker)) == {(0, 1), (2, 3)}
+
+
+def test_knn_threaded(embedded, tmp_path):
+    # The kNN pairs are an in-memory table, which the worker cursors can't see.
+    blocker = VectorKNNBlocker("embedding", k=1)
+    blocked = block_many(
+        embedded, embedded, [blocker, "record_id"], n_threads=2, spill_dir=tmp_path
+    )
+    assert _pairs(blocked) == {(0, 1), (2, 3)}
+
+
+def test_knn_link(embedded, table_factory):
+    right = table_factory(
+        {
+            "record_id": ["a", "b", "c"],
+            "embedding": [[2.0, 0.1], [0.0, -1.0], [0.2, 1.5]],
+        }
+    )
+    pairs = _pairs(block_one(embedded, right, VectorKNNBlocker(_.embedding, k=1)))
+    assert pairs == {(0, "a"), (1, "a"), (2, "c"), (3, "c")}
+    pairs = _pairs(
+        block_one(embedded, right, VectorKNNBlocker(_.embedding, k=1, metric="l2"))
+    )
+    assert pairs == {(0, "a"), (1, "a"), (2, "c"), (3, "c")}
+
+
+@pytest.mark.parametrize("metric", ["cosine", "dot", "l2"])
+def test_knn_exact_when_probing_everything(table_factory, metric):
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(200, 8))
+    t = table_factory({"record_id": np.arange(200), "v": list(vecs)})
+    blocker = VectorKNNBlocker("v", k=3, metric=metric, n_lists=5, n_probe=5)
+    pairs = _pairs(blocker(t, t.view(), task="link"))
+
+    if metric == "cosine":
+        vecs = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+    sims = vecs @ vecs.T
+    if metric == "l2":
+        sims = -np.linalg.norm(vecs[:, None, :] - vecs[None, :, :], axis=2)
+    top = np.argsort(-sims, axis=1)[:, :3]
+    expected = {(i, j) for i in range(200) for j in top[i]}
+    assert pairs == expected
+
+
+def test_knn_mismatched_lengths(table_factory):
+    t = table_factory({"record_id": [0, 1], "v": [[1.0, 0.0], [1.0]]})
+    with pytest.raises(ValueError):
+        block_one(t, t, VectorKNNBlocker("v"))
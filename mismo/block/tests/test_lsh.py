@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from ibis import _
+import pytest
+
+from mismo.block import MinhashLshBlocker, block_one
+
+
+@pytest.fixture
+def addresses(table_factory):
+    return table_factory(
+        {
+            "record_id": [0, 1, 2, 3, 4],
+            "tokens": [
+                ["apt", "4", "123", "main", "st", "springfield", "il", "62701"],
+                ["apt", "4", "123", "main", "street", "springfield", "il", "62701"],
+                ["456", "oak", "st", "shelbyville", "il", "62565"],
+                [],
+                None,
+            ],
+        }
+    )
+
+
+def _pairs(blocked) -> set[tuple]:
+    df = blocked["record_id_l", "record_id_r"].execute()
+    return set(df.itertuples(index=False, name=None))
+
+
+@pytest.mark.parametrize("terms", [_.tokens, "tokens", lambda t: t.tokens])
+def test_lsh_dedupe(addresses, terms):
+    blocker = MinhashLshBlocker(terms, n_bands=10, n_rows=5)
+    assert _pairs(block_one(addresses, addresses, blocker)) == {(0, 1)}
+
+
+def test_lsh_link(addresses, table_factory):
+    right = table_factory(
+        {
+            "record_id": ["a", "b"],
+            "tokens": [
+                ["456", "oak", "st", "shelbyville", "il", "62565", "usa"],
+                ["il"],
+            ],
+        }
+    )
+    blocker = MinhashLshBlocker(_.tokens, n_bands=10, n_rows=5)
+    assert _pairs(block_one(addresses, right, blocker)) == {(2, "a")}
+
+
+def test_lsh_stricter_with_more_rows(addresses):
+    # With one row per band, sharing any single minhash is enough.
+    lenient = MinhashLshBlocker(_.tokens, n_bands=50, n_rows=1)
+    strict = MinhashLshBlocker(_.tokens, n_bands=5, n_rows=20)
+    assert lenient.threshold < strict.threshold
+    lenient_pairs = _pairs(block_one(addresses, addresses, lenient))
+    strict_pairs = _pairs(block_one(addresses, addresses, strict))
+    assert strict_pairs <= lenient_pairs
+    assert {(0, 1), (0, 2), (1, 2)} <= lenient_pairs
+
+
+def test_lsh_band_keys_deterministic(addresses):
+    b1 = MinhashLshBlocker(_.tokens, n_bands=4, n_rows=3, seed=42)
+    b2 = MinhashLshBlocker(_.tokens, n_bands=4, n_rows=3, seed=42)
+    keys1 = addresses.select(k=b1.band_keys(_.tokens)).k.execute()
+    keys2 = addresses.select(k=b2.band_keys(_.tokens)).k.execute()
+    assert list(keys1[:3].map(list)) == list(keys2[:3].map(list))
+    assert all(len(k) == 4 for k in keys1[:3])
+    assert keys1[3:].isna().all()
+
+
+@pytest.mark.parametrize("n_bands,n_rows", [(0, 1), (1, 0)])
+def test_lsh_invalid(n_bands, n_rows):
+    with pytest.raises(ValueError):
+        MinhashLshBlocker(_.tokens, n_bands=n_bands, n_rows=n_rows)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from ibis import _
+from ibis.expr import types as ir
+import pytest
+
+from mismo.block import PairView, block_many, block_one
+from mismo.compare import LevelComparer, compare
+
+
+@pytest.mark.parametrize("n_threads", [None, 2])
+def test_block_ids_only(t1: ir.Table, t2: ir.Table, n_threads):
+    ids = block_many(t1, t2, ["letter", "int"], ids_only=True, n_threads=n_threads)
+    assert ids.columns == ["record_id_l", "record_id_r"]
+    wide = block_many(t1, t2, ["letter", "int"])
+    expected = wide["record_id_l", "record_id_r"].to_pandas()
+    actual = ids.to_pandas()
+    assert set(actual.itertuples(index=False)) == set(expected.itertuples(index=False))
+
+    labeled = block_many(t1, t2, ["letter"], ids_only=True, labels=True)
+    assert labeled.columns == ["record_id_l", "record_id_r", "blocking_rules"]
+    assert block_one(t1, t2, "letter", ids_only=True).count().execute() == 2
+
+
+def test_pair_view_compare(t1: ir.Table, t2: ir.Table):
+    ids = block_many(t1, t2, ["letter", "int"], ids_only=True, labels=True)
+    pairs = PairView(t1, t2, ids.cache())
+    comparer = LevelComparer("int", [("close", (_.int_l - _.int_r).abs() <= 1)])
+    compared = pairs.compare(comparer, {"same_letter": _.letter_l == _.letter_r})
+    assert compared.columns == [
+        "record_id_l",
+        "record_id_r",
+        "blocking_rules",
+        "int",
+        "same_letter",
+    ]
+    # Only the referenced columns are joined on, not eg `array`.
+    sql = compared.compile()
+    assert "array" not in str(sql)
+
+    expected = compare(pairs.to_table(), comparer)
+    expected = expected["record_id_l", "record_id_r", "int"].to_pandas()
+    actual = compared["record_id_l", "record_id_r", "int"].to_pandas()
+    assert set(actual.itertuples(index=False)) == set(expected.itertuples(index=False))
+
+
+def test_pair_view_select(t1: ir.Table, t2: ir.Table):
+    pairs = PairView(t1, t2, block_one(t1, t2, "letter", ids_only=True))
+    assert pairs.select("letter_l").columns == [
+        "record_id_l",
+        "record_id_r",
+        "letter_l",
+    ]
+    with pytest.raises(ValueError, match="must end with"):
+        pairs.select("letter")
+    with pytest.raises(ValueError, match="not in the right table"):
+        pairs.select("nope_r")
+    with pytest.raises(ValueError, match="missing the columns"):
+        PairView(t1, t2, t1)
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from ibis import _
+import pytest
+
+from mismo.block import SortedNeighborhoodBlocker, block_one
+
+
+@pytest.fixture
+def names(table_factory):
+    return table_factory(
+        {
+            "record_id": [0, 1, 2, 3, 4, 5],
+            "name": ["jon", "john", "johnny", "sue", "suzy", None],
+        }
+    )
+
+
+def _pairs(blocked) -> set[tuple]:
+    df = blocked["record_id_l", "record_id_r"].execute()
+    return set(df.itertuples(index=False, name=None))
+
+
+@pytest.mark.parametrize(
+    "window_size,expected",
+    [
+        pytest.param(2, {(1, 2), (0, 2), (0, 3), (3, 4)}, id="w2"),
+        pytest.param(
+            3, {(1, 2), (0, 1), (0, 2), (2, 3), (0, 3), (0, 4), (3, 4)}, id="w3"
+        ),
+    ],
+)
+def test_sorted_neighborhood_dedupe(names, window_size, expected):
+    blocker = SortedNeighborhoodBlocker(_.name, window_size=window_size)
+    assert _pairs(block_one(names, names, blocker)) == expected
+
+
+def test_sorted_neighborhood_link(names, table_factory):
+    right = table_factory({"record_id": ["a", "b", "c"], "name": ["joh", "sus", None]})
+    blocker = SortedNeighborhoodBlocker("name", window_size=3)
+    expected = {(0, "b"), (1, "a"), (2, "a"), (3, "b"), (4, "b")}
+    assert _pairs(block_one(names, right, blocker)) == expected
+
+
+def test_sorted_neighborhood_is_fast(names):
+    # It's built from window functions, not a join, so it should never
+    # trigger the slow join check.
+    blocker = SortedNeighborhoodBlocker(_.name.upper(), window_size=50)
+    blocked = block_one(names, names, blocker, on_slow="error")
+    assert blocked.count().execute() == 10
+
+
+def test_sorted_neighborhood_bad_window():
+    with pytest.raises(ValueError):
+        SortedNeighborhoodBlocker("name", window_size=1)
@@ -60,3 +60,46 @@ def test_sample_all_pairs_warns(table_factory):
     t = table_factory({"record_id": range(100_000)})
     with pytest.warns(UserWarning):
         sample_all_pairs(t, t)
+
+
+def test_sample_all_pairs_seed(table_factory):
+    t = table_factory({"record_id": range(1000)})
+
+    def sample(seed):
+        df = sample_all_pairs(t, t, max_pairs=100, seed=seed).execute()
+        assert len(df) == 100
+        assert df.record_id_l.notnull().all()
+        assert df.record_id_r.notnull().all()
+        return set(zip(df.record_id_l, df.record_id_r))
+
+    assert len(sample(42)) == 100
+    assert sample(42) == sample(42)
+    assert sample(42) != sample(43)
+
+
+@pytest.mark.parametrize(
+    "n_left,n_right",
+    [
+        (7, 7),
+        # Different sizes, so mixing up the `//` and `%` split of the pair
+        # numbers gives ids that don't exist.
+        (3, 11),
+        (11, 3),
+    ],
+)
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_sample_all_pairs_near_all(table_factory, n_left, n_right, seed):
+    left = table_factory({"record_id": range(n_left)})
+    right = table_factory({"record_id": [f"r{i}" for i in range(n_right)]})
+    all_pairs = {(i, f"r{j}") for i in range(n_left) for j in range(n_right)}
+    n_possible = len(all_pairs)
+    # Skipping out-of-range outputs of the permutation is most likely to come up
+    # short when nearly every possible pair is wanted.
+    for max_pairs in [n_possible - 1, n_possible]:
+        df = sample_all_pairs(left, right, max_pairs=max_pairs, seed=seed).execute()
+        assert len(df) == max_pairs
+        assert df.record_id_l.notnull().all()
+        assert df.record_id_r.notnull().all()
+        pairs = set(zip(df.record_id_l, df.record_id_r))
+        assert len(pairs) == max_pairs
+        assert pairs <= all_pairs
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import functools
+
 import ibis
 from ibis.expr import types as ir
+import pyarrow as pa
+import pyarrow.compute as pc
 
 from mismo import _util
 
@@ -12,7 +16,11 @@ def double_metaphone(s: ir.StringValue) -> ir.ArrayValue[ir.StringValue]:
     This requires the [doublemetaphone](https://github.com/dedupeio/doublemetaphone)
     package to be installed.
     You can install it with `python -m pip install DoubleMetaphone`.
-    This uses a python UDF so it is going to be slow.
+
+    The encoding is done in Python, but a whole batch of strings at a time.
+    Each distinct string in a batch is only encoded once, and recently seen
+    strings are remembered between batches, so columns with many repeated
+    values, such as names, are fast.
 
     Examples
     --------
@@ -27,9 +35,21 @@ def double_metaphone(s: ir.StringValue) -> ir.ArrayValue[ir.StringValue]:
     return _dm_udf(s)
 
 
-@ibis.udf.scalar.python(signature=(("string",), "array<string>"))
-def _dm_udf(s):
+@ibis.udf.scalar.pyarrow(signature=(("string",), "array<string>"))
+def _dm_udf(s: pa.Array) -> pa.Array:
+    # Encode each distinct value once, then expand back out with the indices.
+    # Nulls become null indices, so they stay null in the result.
+    encoded = pc.dictionary_encode(s)
+    if isinstance(encoded, pa.ChunkedArray):
+        encoded = encoded.combine_chunks()
+    codes = [list(_dm(v)) for v in encoded.dictionary.to_pylist()]
+    return pa.array(codes, type=pa.list_(pa.string())).take(encoded.indices)
+
+
+# Cached values are shared between callers, so return an immutable tuple.
+@functools.lru_cache(maxsize=2**16)
+def _dm(s: str) -> tuple[str, ...]:
     with _util.optional_import("DoubleMetaphone"):
         from doublemetaphone import doublemetaphone
 
-    return doublemetaphone(s)
+    return tuple(doublemetaphone(s))
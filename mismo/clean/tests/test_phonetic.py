@@ -19,3 +19,15 @@ from mismo.clean import double_metaphone
 def test_double_metaphone(input, expected):
     result = double_metaphone(input).execute()
     assert expected == result
+
+
+def test_double_metaphone_column(table_factory):
+    values = ["hello", "world", None, "", "hello", "catherine", "", None, "world"]
+    t = table_factory({"name": values}, schema={"name": "string"})
+    result = t.mutate(dm=double_metaphone(t.name)).to_pandas()
+    assert result.name.tolist() == values
+    for value, codes in zip(result.name, result.dm):
+        if value is None:
+            assert codes is None
+        else:
+            assert list(codes) == double_metaphone(value).execute()
@@ -2,12 +2,15 @@ from __future__ import annotations
 
 from itertools import count
 import logging
-from typing import Callable
+from typing import Callable, Literal
 
 import ibis
 from ibis import _
 from ibis.expr import types as ir
+import numpy as np
+import pyarrow as pa
 
+from mismo import _materialize, _profile
 from mismo._factorizer import Factorizer
 
 logger = logging.getLogger(__name__)
@@ -20,12 +23,17 @@ def connected_components(
     *,
     nodes: ir.Table | ir.Column | None = None,
     max_iter: int | None = None,
+    method: Literal[
+        "label_propagation", "pointer_jumping", "union_find"
+    ] = "label_propagation",
 ) -> ir.Table:
     """Compute the connected components of a graph.
 
-    This uses [an iterative algorithm](https://www.drmaciver.com/2008/11/computing-connected-graph-components-via-sql/)
+    By default, this uses [an iterative algorithm](https://www.drmaciver.com/2008/11/computing-connected-graph-components-via-sql/)
     that is linear in terms of the size of the largest component. This is usually
     acceptable for our use case, because we expect the components to be small.
+    For long, chain-like components, use `method="pointer_jumping"`
+    or `method="union_find"` instead.
 
     !!! note
 
@@ -111,6 +119,21 @@ def connected_components(
         appear in the edges.
     max_iter : int, optional
         The maximum number of iterations to run. If None, run until convergence.
+        Not used by the "union_find" method.
+    method : {"label_propagation", "pointer_jumping", "union_find"}, default "label_propagation"
+        The algorithm to use.
+
+        - "label_propagation": Iteratively propagate the minimum label across
+          edges, in SQL. This needs as many rounds as the diameter of the largest
+          component, but never pulls the edges out of the backend.
+        - "pointer_jumping": Label propagation, plus a "shortcut" step every
+          round that replaces each node's label with its label's label.
+          This roughly doubles how far a label can travel every round,
+          so it needs O(log(diameter)) rounds instead of O(diameter).
+          Each round costs one more join than "label_propagation".
+        - "union_find": Pull the (integer-encoded) edges into memory once, and
+          run a vectorized union-find in NumPy. This finishes in a few rounds
+          no matter the shape of the components, but the edges must fit in memory.
 
     Returns
     -------
@@ -146,8 +169,33 @@ def connected_components(
     │ g         │         3 │
     └───────────┴───────────┘
     """  # noqa: E501
+    with _profile.span("connected_components", method=method):
+        return _connected_components(
+            edges, nodes=nodes, max_iter=max_iter, method=method
+        )
+
+
+def _connected_components(
+    edges: ir.Table,
+    *,
+    nodes: ir.Table | ir.Column | None,
+    max_iter: int | None,
+    method: str,
+) -> ir.Table:
     int_edges, restore = _intify_edges(edges)
-    int_labels = _connected_components_ints(int_edges, max_iter=max_iter)
+    if method == "label_propagation":
+        int_labels = _connected_components_ints(int_edges, max_iter=max_iter)
+    elif method == "pointer_jumping":
+        int_labels = _connected_components_ints(
+            int_edges, max_iter=max_iter, shortcut=True
+        )
+    elif method == "union_find":
+        int_labels = _connected_components_union_find(int_edges)
+    else:
+        raise ValueError(
+            "method must be one of 'label_propagation', 'pointer_jumping',"
+            f" or 'union_find'. Got {method}"
+        )
     result = restore(int_labels)
     if nodes is not None:
         result = _add_labels_for_missing_nodes(result, nodes)
@@ -155,28 +203,95 @@ def connected_components(
 
 
 def _connected_components_ints(
-    edges: ir.Table, max_iter: int | None = None
+    edges: ir.Table, max_iter: int | None = None, shortcut: bool = False
 ) -> tuple[ir.Table, ir.Table]:
     """The core algorithm. Assumes you already translated the record ids to ints."""
-    labels = _get_initial_labels(edges).cache()
+    materializer = _materialize.active()
+    persisted = materializer.materialize(_get_initial_labels(edges))
+    labels = persisted
     for i in count(1):
-        new_labels = _updated_labels(labels, edges).cache()
-        assert labels.count().execute() == new_labels.count().execute()
-        n_updates = _n_updates(labels, new_labels)
-        if n_updates == 0:
+        with _profile.span("iteration", i=i):
+            new_labels = _updated_labels(labels, edges)
+            if shortcut:
+                new_labels = _shortcut(new_labels)
+            new_persisted = materializer.materialize(new_labels)
+            # new_labels remembers each node's previous label,
+            # so counting the updates is one cheap aggregate, with no join.
+            n_updates = _profile.execute(
+                (new_persisted.component != new_persisted.component_old).sum(),
+                name="count_updates",
+            )
+        if not n_updates:
+            materializer.release(new_persisted)
             return labels
         logger.info(f"Round {i}: Updated {n_updates} labels")
-        labels = new_labels
+        # Only the latest labels are needed from now on, so free the old ones.
+        materializer.release(persisted)
+        persisted = new_persisted
+        labels = new_persisted["record_id", "component"]
         if max_iter is not None and i >= max_iter:
             return labels
 
 
-def _n_updates(labels: ir.Table, new_labels: ir.Table) -> int:
-    """Count the number of updates between two labelings."""
-    condition = (labels.record_id == new_labels.record_id) & (
-        labels.component != new_labels.component
+def _shortcut(labels: ir.Table) -> ir.Table:
+    """Replace each node's label with the label of the node its label points to.
+
+    Labels are node ids, and a node's label is never bigger than the node,
+    so this is pointer jumping towards the smallest node in the component.
+    """
+    parents = labels.select(parent_id="record_id", parent_component="component")
+    j = labels.left_join(parents, labels.component == parents.parent_id)
+    return j.select(
+        "record_id",
+        "component_old",
+        component=ibis.coalesce(j.parent_component, j.component),
+    )
+
+
+def _connected_components_union_find(edges: ir.Table) -> ir.Table:
+    """Union-find in memory. Assumes you already translated the record ids to ints."""
+    id_type = edges.record_id_l.type()
+    arrow = _profile.to_pyarrow(
+        edges.select("record_id_l", "record_id_r"), name="fetch_edges"
+    )
+    ids_l = arrow["record_id_l"].to_numpy()
+    ids_r = arrow["record_id_r"].to_numpy()
+    # The ids can be sparse, so map them to 0..n-1
+    node_ids, dense = np.unique(np.concatenate([ids_l, ids_r]), return_inverse=True)
+    roots = _union_find(len(node_ids), dense[: len(ids_l)], dense[len(ids_l) :])
+    labels = pa.table(
+        {
+            "record_id": pa.array(node_ids, type=id_type.to_pyarrow()),
+            # The root is the smallest id in each component,
+            # the same as label propagation would give.
+            "component": pa.array(node_ids[roots], type=id_type.to_pyarrow()),
+        }
     )
-    return ibis.join(labels, new_labels, condition).count().execute()
+    return ibis.memtable(labels)
+
+
+def _union_find(n: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Return the root of every node 0..n-1, given the edges (u, v).
+
+    Every round, each edge hooks the bigger of its two roots onto the smaller,
+    and then pointer jumping compresses every path so each node points
+    straight at its root. Edges within a single component are then dropped.
+    """
+    parent = np.arange(n)
+    for i in count(1):
+        root_u, root_v = parent[u], parent[v]
+        different = root_u != root_v
+        if not different.any():
+            return parent
+        u, v = u[different], v[different]
+        root_u, root_v = root_u[different], root_v[different]
+        np.minimum.at(parent, np.maximum(root_u, root_v), np.minimum(root_u, root_v))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        logger.info(f"Round {i}: {len(u)} edges between different components")
 
 
 def _updated_labels(node_labels: ir.Table, edges: ir.Table) -> ir.Table:
@@ -184,7 +299,7 @@ def _updated_labels(node_labels: ir.Table, edges: ir.Table) -> ir.Table:
     component_mapping = _get_component_update_map(component_equivalences)
     return node_labels.rename(component_old="component").left_join(
         component_mapping, "component_old"
-    )["record_id", "component"]
+    )["record_id", "component", "component_old"]
 
 
 def _get_component_equivalences(edges: ir.Table, node_labels: ir.Table) -> ir.Table:
@@ -231,11 +346,13 @@ def _intify_edges(
     all_node_ids = raw_edges.union(swapped).select("record_id_l")
 
     f = Factorizer(all_node_ids, "record_id_l")
-    edges = f.encode(raw_edges, "record_id_l")
-    edges = f.encode(edges, "record_id_r")
+    # Every id is in the mapping by construction,
+    # so verifying would only force extra queries.
+    edges = f.encode(raw_edges, "record_id_l", verify=False)
+    edges = f.encode(edges, "record_id_r", verify=False)
 
     def restore(int_labels: ir.Table) -> ir.Table:
-        return f.decode(int_labels, "record_id")
+        return f.decode(int_labels, "record_id", verify=False)
 
     return edges, restore
 
@@ -261,8 +378,9 @@ def _get_additional_labels(labels: ir.Table, nodes: ir.Table | ir.Column) -> ir.
         nodes = nodes.name("record_id").as_table()
     nodes = nodes.select("record_id")
     is_missing_label = nodes.record_id.notin(labels.record_id)
-    max_existing_label = labels.component.max().execute()
+    # A scalar subquery, so this doesn't force executing the labels.
+    first_new_label = ibis.coalesce(labels.component.max().as_scalar() + 1, 0)
     additional_labels = nodes[is_missing_label].select(
-        "record_id", component=ibis.row_number() + (1 + max_existing_label)
+        "record_id", component=ibis.row_number() + first_new_label
     )
     return additional_labels
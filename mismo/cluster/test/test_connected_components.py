@@ -3,6 +3,7 @@ from __future__ import annotations
 from typing import Any
 
 from ibis.expr import types as ir
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -94,25 +95,31 @@ from mismo.cluster import connected_components
         ),
     ],
 )
+@pytest.mark.parametrize(
+    "method", ["label_propagation", "pointer_jumping", "union_find"]
+)
 def test_connected_components(
-    table_factory, edges_list, edges_dtype, expected_clusters
+    table_factory, edges_list, edges_dtype, expected_clusters, method
 ):
     edges_df = pd.DataFrame(edges_list, columns=["record_id_l", "record_id_r"])
     schema = {"record_id_l": edges_dtype, "record_id_r": edges_dtype}
     edges_table = table_factory(edges_df, schema=schema)
-    labels = connected_components(edges_table)
+    labels = connected_components(edges_table, method=method)
     clusters = _labels_to_clusters(labels)
     assert clusters == expected_clusters
 
 
-def test_connected_components_add_missing_nodes(table_factory, column_factory):
+@pytest.mark.parametrize(
+    "method", ["label_propagation", "pointer_jumping", "union_find"]
+)
+def test_connected_components_add_missing_nodes(table_factory, column_factory, method):
     """If a node is not present in the edges table, it would normally be
     missed by the connected components algorithm. But, if we pass it in
     explicitly, it should be included in the output."""
     edges_df = pd.DataFrame([(0, 1), (1, 2)], columns=["record_id_l", "record_id_r"])
     nodes = column_factory([0, 1, 2, 3])
     edges_table = table_factory(edges_df)
-    labels = connected_components(edges_table, nodes=nodes)
+    labels = connected_components(edges_table, nodes=nodes, method=method)
     clusters = _labels_to_clusters(labels)
     assert clusters == {frozenset({0, 1, 2}), frozenset({3})}
 
@@ -126,6 +133,37 @@ def test_connected_components_max_iterations(table_factory):
     assert clusters != {frozenset({0, 1, 2})}
 
 
+def test_connected_components_union_find_long_chains(table_factory):
+    # Shuffled chains, which label propagation needs many rounds for.
+    rng = np.random.default_rng(0)
+    nodes = rng.permutation(1000)
+    chains = nodes.reshape(4, 250)
+    edges = [(c[i], c[i + 1]) for c in chains for i in range(249)]
+    edges_df = pd.DataFrame(edges, columns=["record_id_l", "record_id_r"])
+    labels = connected_components(table_factory(edges_df), method="union_find")
+    assert _labels_to_clusters(labels) == {frozenset(c) for c in chains}
+    # Each component is labeled with its smallest id.
+    df = labels.to_pandas()
+    assert set(df.component) == {c.min() for c in chains}
+
+
+def test_connected_components_pointer_jumping_converges_fast(table_factory):
+    # A chain of 128 nodes needs 127 rounds of label propagation,
+    # but pointer jumping doubles the distance a label travels each round.
+    edges_df = pd.DataFrame({"record_id_l": range(127), "record_id_r": range(1, 128)})
+    edges = table_factory(edges_df)
+    labels = connected_components(edges, method="pointer_jumping", max_iter=8)
+    assert _labels_to_clusters(labels) == {frozenset(range(128))}
+    labels = connected_components(edges, method="label_propagation", max_iter=8)
+    assert _labels_to_clusters(labels) != {frozenset(range(128))}
+
+
+def test_connected_components_bad_method(table_factory):
+    edges_df = pd.DataFrame([(0, 1)], columns=["record_id_l", "record_id_r"])
+    with pytest.raises(ValueError):
+        connected_components(table_factory(edges_df), method="bogus")
+
+
 def _labels_to_clusters(labels: ir.Table) -> set[frozenset[Any]]:
     df = labels.to_pandas()
     component_ids = set(df.component)
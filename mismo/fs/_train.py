@@ -4,6 +4,7 @@ from typing import Iterable
 
 from ibis.expr import types as ir
 
+from mismo import _profile
 from mismo._util import sample_table
 from mismo.block import block_one, sample_all_pairs
 from mismo.compare import LevelComparer, compare
@@ -18,7 +19,7 @@ def level_proportions(
     Return the proportion of labels that fall into each Comparison level.
     """
     vc = labels.name("level").value_counts().rename(n="level_count")
-    vc_df = vc.to_pandas().set_index("level")
+    vc_df = _profile.to_pandas(vc, name="level_counts").set_index("level")
     # If we didn't see a level, that won't be present in the value_counts table.
     # Add it in, with a count of 1 to regularaize it.
     # If a level shows shows up 0 times among nonmatches, this would lead to an odds
@@ -104,7 +105,7 @@ def train_ms_from_labels(
     pairs = _true_pairs_from_labels(left, right)
     if max_pairs is None:
         max_pairs = 1_000_000_000
-    n_pairs = min(pairs.count().execute(), max_pairs)
+    n_pairs = min(_profile.execute(pairs.count(), name="count_true_pairs"), max_pairs)
     sample = sample_table(pairs, n_pairs, seed=seed)
     labels = compare(sample, comparer)[comparer.name]
     return level_proportions(comparer, labels)
@@ -3,13 +3,14 @@ from __future__ import annotations
 import logging
 from typing import Iterable
 
-from ibis import _
 from ibis.expr import types as ir
+import numpy as np
 
+from mismo import _profile
 from mismo.compare import LevelComparer, compare
 
 from . import _train
-from ._weights import ComparisonWeights, Weights
+from ._weights import Weights
 
 logger = logging.getLogger(__name__)
 
@@ -20,54 +21,184 @@ def train_using_em(
     right: ir.Table,
     *,
     max_pairs: int | None = None,
+    max_iter: int = 100,
+    tol: float = 1e-6,
 ) -> Weights:
-    """Train weights on unlabeled data using an expectation maximization algorithm."""
-    initial_blocking = _train.sample_all_pairs(left, right, max_pairs=max_pairs)
-    compared = compare(initial_blocking, *comparers)
-    compared = compared[[c.name for c in comparers]]
-    compared = compared.cache()
-    weights = _initial_weights(comparers, compared)
-    for i in range(5):
-        logger.info("EM iteration {i}, starting weights: {weights}", i, weights)
-        scored = weights.score_compared(compared)
-        is_match = _.odds >= 10
-        matches = scored.filter(is_match)
-        nonmatches = scored.filter(~is_match)
-        weights = _weights_from_matches_nonmatches(comparers, matches, nonmatches)
+    """Train weights on unlabeled data using an expectation maximization algorithm.
+
+    This samples record pairs from `left` and `right`, compares them,
+    and then runs
+    [expectation_maximization()][mismo.fs.expectation_maximization] on the
+    compared pairs. See that function for details.
+    """
+    comparers = list(comparers)
+    with _profile.span("train_using_em"):
+        initial_blocking = _train.sample_all_pairs(left, right, max_pairs=max_pairs)
+        compared = compare(initial_blocking, *comparers)
+        weights, _proportion_matches = expectation_maximization(
+            compared, comparers, max_iter=max_iter, tol=tol
+        )
     return weights
 
 
-def _initial_weights(comparisons: Iterable[LevelComparer], labels: ir.Table) -> Weights:
-    return Weights(_initial_comparison_weights(c, labels[c.name]) for c in comparisons)
+def expectation_maximization(
+    compared: ir.Table,
+    comparers: Iterable[LevelComparer],
+    *,
+    max_iter: int = 100,
+    tol: float = 1e-6,
+    estimate_u: bool = False,
+) -> tuple[Weights, float]:
+    """Estimate Weights from unlabeled, compared record pairs using EM.
 
+    Under the Fellegi-Sunter model, each record pair is either a match or
+    a non-match, and the levels of the different comparers are independent
+    given that. This fits that mixture model with soft assignments:
+    each pair is a match with some probability, instead of a hard threshold.
 
-def _initial_comparison_weights(
-    comparison: LevelComparer, labels: ir.IntegerColumn
-) -> ComparisonWeights:
-    n_levels = len(comparison)
-    ms = [1 / n_levels] * n_levels
-    us = _train.level_proportions(comparison, labels)
-    return _train.make_weights(comparison, ms, us)
+    The compared table is only touched once, to aggregate it into a table of
+    the distinct comparison vectors (one level for each comparer)
+    and how many pairs had each vector. There are at most a few hundred of these,
+    so the EM iterations themselves run in NumPy in microseconds.
 
+    By default, the u probabilities are not estimated by EM, but are fixed at the
+    overall proportion of pairs in each level. When `compared` is a random sample
+    of all pairs, as in [train_using_em()][mismo.fs.train_using_em], almost every
+    pair is a non-match, so this is an accurate estimate of u. With u fixed,
+    the likelihood has a single optimum, and the m probabilities and the
+    proportion of matches are estimated much more reliably,
+    especially when there are only a few comparers.
 
-def _weights_from_matches_nonmatches(
-    comparisons: Iterable[LevelComparer], matches: ir.Table, nonmatches: ir.Table
-) -> Weights:
-    return Weights(
-        [
-            _comparison_weights_from_matches_nonmatches(
-                comp, matches[comp.name], nonmatches[comp.name]
+    Parameters
+    ----------
+    compared
+        The record pairs, with one column of level labels for each comparer,
+        as produced by [compare()][mismo.compare.compare].
+    comparers
+        The LevelComparers that were used to label `compared`.
+    max_iter
+        The maximum number of EM iterations.
+    tol
+        Stop once no m, u, or match proportion changes by more than this.
+    estimate_u
+        If True, estimate the u probabilities with EM as well, instead of fixing
+        them at the overall level proportions. Use this when `compared`
+        contains a large proportion of matches, eg after blocking.
+
+    Returns
+    -------
+    weights
+        The estimated Weights.
+    proportion_matches
+        The estimated proportion of the record pairs that are matches,
+        often called lambda.
+    """
+    comparers = list(comparers)
+    with _profile.span("expectation_maximization"):
+        levels, counts = _comparison_vectors(compared, comparers)
+        n_levels = [len(c) for c in comparers]
+        ms, us, proportion_matches = _em(
+            levels, counts, n_levels, max_iter=max_iter, tol=tol, estimate_u=estimate_u
+        )
+    weights = Weights(
+        _train.make_weights(c, list(m), list(u)) for c, m, u in zip(comparers, ms, us)
+    )
+    return weights, proportion_matches
+
+
+def _comparison_vectors(
+    compared: ir.Table, comparers: list[LevelComparer]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Aggregate to the distinct comparison vectors, as level indices, and counts."""
+    names = [c.name for c in comparers]
+    vectors = _profile.to_pandas(
+        compared.group_by(names).agg(__n=compared.count()), name="comparison_vectors"
+    )
+    levels = np.empty((len(vectors), len(comparers)), dtype=np.int64)
+    for j, comparer in enumerate(comparers):
+        labels = vectors[comparer.name]
+        else_i = len(comparer) - 1
+        if compared[comparer.name].type().is_integer():
+            # A NULL label means that no level matched, like the "else" level.
+            indices = labels.fillna(else_i)
+            indices = indices.where(indices.between(0, else_i))
+        else:
+            name_to_i = {level.name: i for i, level in enumerate(comparer)}
+            indices = labels.fillna("else").map(name_to_i)
+        unknown = indices.isna()
+        if unknown.any():
+            raise ValueError(
+                f"Column {comparer.name} has labels that are not levels of the"
+                f" comparer: {sorted(labels[unknown].unique().tolist())}"
             )
-            for comp in comparisons
+        levels[:, j] = indices.to_numpy(dtype=np.int64)
+    return levels, vectors["__n"].to_numpy(dtype=np.float64)
+
+
+def _em(
+    levels: np.ndarray,
+    counts: np.ndarray,
+    n_levels: list[int],
+    *,
+    max_iter: int,
+    tol: float,
+    estimate_u: bool,
+) -> tuple[list[np.ndarray], list[np.ndarray], float]:
+    # Levels are ordered from most to least similar, so start by assuming
+    # matches are more likely to be in the earlier levels.
+    ms = [0.5 ** np.arange(k) / (0.5 ** np.arange(k)).sum() for k in n_levels]
+    # Most pairs are non-matches, so the overall level proportions are
+    # a good estimate of u, or at least a good starting guess.
+    us = [_proportions(levels[:, j], counts, k) for j, k in enumerate(n_levels)]
+    proportion_matches = 0.01
+    for i in range(1, max_iter + 1):
+        # E step: the probability that each comparison vector is a match.
+        log_m = np.log(proportion_matches) + sum(
+            np.log(m[levels[:, j]]) for j, m in enumerate(ms)
+        )
+        log_u = np.log(1 - proportion_matches) + sum(
+            np.log(u[levels[:, j]]) for j, u in enumerate(us)
+        )
+        p_match = np.exp(log_m - np.logaddexp(log_m, log_u))
+
+        # M step
+        match_counts = counts * p_match
+        nonmatch_counts = counts - match_counts
+        new_ms = [
+            _proportions(levels[:, j], match_counts, k) for j, k in enumerate(n_levels)
         ]
-    )
+        if estimate_u:
+            new_us = [
+                _proportions(levels[:, j], nonmatch_counts, k)
+                for j, k in enumerate(n_levels)
+            ]
+        else:
+            new_us = us
+        new_proportion_matches = _clip(match_counts.sum() / counts.sum())
+
+        change = max(
+            abs(new_proportion_matches - proportion_matches),
+            *(np.abs(a - b).max() for a, b in zip(new_ms + new_us, ms + us)),
+        )
+        ms, us, proportion_matches = new_ms, new_us, new_proportion_matches
+        logger.info(
+            f"EM iteration {i}: proportion_matches={proportion_matches:.6g},"
+            f" max change={change:.3g}"
+        )
+        if change < tol:
+            break
+    return ms, us, proportion_matches
+
+
+def _proportions(levels: np.ndarray, weights: np.ndarray, n_levels: int) -> np.ndarray:
+    totals = np.bincount(levels, weights=weights, minlength=n_levels)
+    # If a level never shows up among matches, this would lead to an odds of 0,
+    # and if it never shows up among non-matches, an odds of infinity.
+    # To avoid this, pretend we saw every level once, as level_proportions() does.
+    totals = totals + 1
+    return totals / totals.sum()
 
 
-def _comparison_weights_from_matches_nonmatches(
-    comparison: LevelComparer,
-    match_labels: ir.IntegerColumn | ir.StringColumn,
-    nonmatch_labels: ir.IntegerColumn | ir.StringColumn,
-) -> ComparisonWeights:
-    ms = _train.level_proportions(comparison, match_labels)
-    us = _train.level_proportions(comparison, nonmatch_labels)
-    return _train.make_weights(comparison, ms, us)
+def _clip(p: float) -> float:
+    eps = 1e-12
+    return float(min(max(p, eps), 1 - eps))
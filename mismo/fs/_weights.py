@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+import functools
 from json import dumps, loads
 import math
+import operator
 from pathlib import Path
-from typing import Iterable, Iterator, overload
+from typing import Iterable, Iterator, Literal, overload
 
 import altair as alt
+import ibis
 from ibis.expr import types as ir
 
-from mismo import _util
+from mismo import _profile
 from mismo.compare import LevelComparer
 
 from .._typing import Self
@@ -238,18 +241,6 @@ class ComparisonWeights:
         return plot_weights(self)
 
 
-def compare_one(
-    t: ir.Table, level_comparer: LevelComparer, comp_weights: ComparisonWeights
-) -> tuple[ir.StringValue, ir.FloatingValue]:
-    conditions = [level.is_match(t) for level in level_comparer]
-    labels = [level.name for level in level_comparer]
-    odds = [level_weights.odds for level_weights in comp_weights]
-    return (
-        _util.cases(zip(conditions, labels), "else").name(comp_weights.name),
-        _util.cases(zip(conditions, odds), 1).name(f"{comp_weights.name}_odds"),
-    )
-
-
 class Weights:
     """Weights for the Fellegi-Sunter model.
 
@@ -261,6 +252,9 @@ class Weights:
     def __init__(self, comparison_weights: Iterable[ComparisonWeights]):
         """Create a new Weights object."""
         self._lookup = {cw.name: cw for cw in comparison_weights}
+        # The weights are immutable, so the odds of each comparison vector
+        # never change and can be remembered across calls.
+        self._vector_odds: dict[tuple, tuple[float, ...]] = {}
 
     def __getitem__(self, name: str) -> ComparisonWeights:
         """Get a `ComparisonWeights` by name."""
@@ -274,7 +268,12 @@ class Weights:
         """The number of `ComparisonWeights`."""
         return len(self._lookup)
 
-    def score_compared(self, compared: ir.Table) -> ir.Table:
+    def score_compared(
+        self,
+        compared: ir.Table,
+        *,
+        method: Literal["cases", "vectors"] = "cases",
+    ) -> ir.Table:
         """Score already-compared record pairs.
 
         This assumes that there is already a column one for each LevelComparer
@@ -294,7 +293,34 @@ class Weights:
         called "odds" which is the overall odds for each record pair.
         We calculate this by starting with the odds of 1 and then multiplying
         by each LevelComparer's odds to get the overall odds.
+
+        Parameters
+        ----------
+        compared
+            The record pairs, with one column of labels for each LevelComparer.
+        method
+            How to compute the odds.
+
+            - "cases": Look up the odds of each label with a CASE expression,
+              and multiply them together, for every record pair.
+              This stays lazy, and works on any backend.
+            - "vectors": There are usually only a few hundred distinct
+              combinations of labels (comparison vectors), even among billions
+              of pairs. Find these (this executes a query), score each one once
+              in Python with [score_vectors()][mismo.fs.Weights.score_vectors],
+              and join the odds back onto the record pairs.
+              The odds of each vector are remembered by this Weights object,
+              so scoring more pairs later is even cheaper.
+
+        Returns
+        -------
+        The scored table. With method="vectors", the order of the rows
+        is not preserved.
         """
+        if method == "vectors":
+            return self._score_by_vectors(compared)
+        if method != "cases":
+            raise ValueError(f"method must be 'cases' or 'vectors', got {method!r}")
         results = []
         for comparison_weights in self:
             name = comparison_weights.name
@@ -303,19 +329,135 @@ class Weights:
             results.append((name, labels, odds))
         return self._score(compared, results)
 
+    def score_vectors(self, compared: ir.Table) -> ir.Table:
+        """Score each distinct comparison vector in already-compared record pairs.
+
+        A comparison vector is a combination of labels, one for each LevelComparer,
+        eg `("exact", "within 10 km")`. The odds of a record pair only depend on
+        its vector, so this is a compact explanation of how all the pairs
+        were scored.
+
+        Parameters
+        ----------
+        compared
+            The record pairs, with one column of labels for each LevelComparer.
+
+        Returns
+        -------
+        An in-memory table with one row per distinct comparison vector. It has
+        the columns `odds`, then for each LevelComparer the labels and
+        `{comparer.name}_odds`, as in
+        [score_compared()][mismo.fs.Weights.score_compared],
+        and `n_pairs`, the number of record pairs with that vector.
+        """
+        names = [cw.name for cw in self]
+        vectors = _profile.to_pyarrow(
+            compared.group_by(names).agg(n_pairs=compared.count()),
+            name="comparison_vectors",
+        )
+        labels = list(zip(*(vectors[name].to_pylist() for name in names)))
+        odds = [self._score_vector(vector) for vector in labels]
+        columns = {"odds": [math.prod(o) for o in odds]}
+        for i, name in enumerate(names):
+            columns[name] = vectors[name]
+            columns[f"{name}_odds"] = [o[i] for o in odds]
+        columns["n_pairs"] = vectors["n_pairs"]
+        schema = {
+            "odds": "float64",
+            **{n: compared[n].type() for n in names},
+            **{f"{n}_odds": "float64" for n in names},
+            "n_pairs": "int64",
+        }
+        return ibis.memtable(columns, schema=schema)
+
+    def _score_vector(self, vector: tuple) -> tuple[float, ...]:
+        try:
+            return self._vector_odds[vector]
+        except KeyError:
+            pass
+        # Unknown labels get NaN odds, like the CASE expressions in odds().
+        odds = tuple(
+            cw[label].odds if label in cw else float("nan")
+            for cw, label in zip(self, vector)
+        )
+        self._vector_odds[vector] = odds
+        return odds
+
+    def _score_by_vectors(self, compared: ir.Table) -> ir.Table:
+        names = [cw.name for cw in self]
+        vectors = self.score_vectors(compared).drop("n_pairs")
+        scored_cols = set(vectors.columns) - set(names)
+        compared = compared.drop(*(c for c in compared.columns if c in scored_cols))
+        # NULL labels form their own vector, so they must match NULL-safely,
+        # or those pairs would be dropped instead of getting NaN odds.
+        predicates = [compared[n].identical_to(vectors[n]) for n in names]
+        result = compared.left_join(vectors, predicates)
+        # Match the column order of the "cases" method.
+        order = []
+        for c in compared.columns:
+            if c == names[0]:
+                order.append("odds")
+            order += [c, f"{c}_odds"] if c in names else [c]
+        return result.select(*order)
+
     def compare_and_score(
-        self, t: ir.Table, level_comparers: Iterable[LevelComparer]
+        self,
+        t: ir.Table,
+        level_comparers: Iterable[LevelComparer],
+        *,
+        min_odds: float | None = None,
     ) -> ir.Table:
         """Compare and score record pairs.
 
         Use the given `level_comparers` to label the record pairs, and then
-        score the results using `self.score_compared`.
+        score the results as in `self.score_compared`.
+
+        The levels of each LevelComparer are evaluated as a single ordered CASE,
+        so each condition is evaluated only once, and backends that short-circuit
+        CASE, such as DuckDB, only evaluate a level's condition on the pairs
+        that no earlier level claimed. The odds are then looked up from the label.
+        So, put cheap and decisive levels, such as "exact" or "null",
+        before expensive ones, such as edit distances.
+
+        Parameters
+        ----------
+        t
+            The record pairs.
+        level_comparers
+            The LevelComparers, in the same order as the ComparisonWeights
+            in this Weights.
+        min_odds
+            If given, drop record pairs as soon as they can no longer reach
+            these odds. After each LevelComparer, the odds so far are multiplied
+            by the highest odds that the remaining LevelComparers could contribute.
+            If even that is below `min_odds`, the pair is dropped, so the remaining,
+            possibly expensive, LevelComparers are never evaluated for it.
+            This never drops a pair whose final odds would be at least `min_odds`.
+            Put the most decisive LevelComparers first to drop pairs earliest.
+
+        Returns
+        -------
+        The scored table.
         """
-        results = []
-        for cmp, weights in zip(level_comparers, self):
-            label, odds = compare_one(t, cmp, weights)
-            results.append((cmp.name, label, odds))
-        return self._score(t, results)
+        pairs = list(zip(level_comparers, self))
+        # max_rest[i] is the highest odds that comparers i+1, i+2, ...
+        # could contribute together.
+        max_rest = [1.0] * len(pairs)
+        for i in range(len(pairs) - 2, -1, -1):
+            max_rest[i] = max_rest[i + 1] * max(lw.odds for lw in pairs[i + 1][1])
+        names = []
+        for (cmp, weights), rest in zip(pairs, max_rest):
+            # Mutate in two steps, so the levels' conditions aren't
+            # repeated in the odds expression.
+            t = t.mutate(cmp(t))
+            t = t.mutate(weights.odds(t[cmp.name]).name(f"{cmp.name}_odds"))
+            names.append(cmp.name)
+            if min_odds is not None and math.isfinite(rest):
+                odds_so_far = functools.reduce(
+                    operator.mul, (t[f"{name}_odds"] for name in names)
+                )
+                t = t.filter(odds_so_far * rest >= min_odds)
+        return self._score(t, [(name, t[name], t[f"{name}_odds"]) for name in names])
 
     def _score(self, t: ir.Table, compare_results) -> ir.Table:
         total_odds = 1
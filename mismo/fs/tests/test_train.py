@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import ibis
 from ibis import _
+import numpy as np
 import pytest
 
 from mismo import datasets, fs
@@ -119,3 +121,52 @@ def test_train_comparions_using_em(backend, name_comparer, location_comparer):
 
     assert exact.odds > close.odds
     # assert close.odds > else_.odds
+
+
+def test_expectation_maximization_recovers_parameters(backend):
+    """Simulate pairs from a known Fellegi-Sunter model, and recover it.
+
+    There are many matches here, so u must be estimated too."""
+    rng = np.random.default_rng(0)
+    n, proportion_matches = 100_000, 0.05
+    ms = [[0.8, 0.15, 0.05], [0.7, 0.2, 0.1], [0.9, 0.05, 0.05]]
+    us = [[0.01, 0.09, 0.9], [0.05, 0.15, 0.8], [0.02, 0.08, 0.9]]
+    is_match = rng.random(n) < proportion_matches
+    comparers = []
+    columns = {}
+    for i, (m, u) in enumerate(zip(ms, us)):
+        name = f"c{i}"
+        comparers.append(LevelComparer(name, [("exact", False), ("close", False)]))
+        level_names = np.array(["exact", "close", "else"])
+        levels = np.where(
+            is_match, rng.choice(3, size=n, p=m), rng.choice(3, size=n, p=u)
+        )
+        columns[name] = level_names[levels]
+    compared = ibis.memtable(columns)
+
+    weights, lam = fs.expectation_maximization(compared, comparers, estimate_u=True)
+    assert lam == pytest.approx(proportion_matches, abs=0.01)
+    for comparer_weights, m, u in zip(weights, ms, us):
+        assert [lw.name for lw in comparer_weights] == ["exact", "close", "else"]
+        assert [lw.m for lw in comparer_weights] == pytest.approx(m, abs=0.03)
+        assert [lw.u for lw in comparer_weights] == pytest.approx(u, abs=0.01)
+
+
+def test_expectation_maximization_bad_labels(table_factory):
+    comparer = LevelComparer("c", [("exact", False), ("close", False)])
+    labels = ["exact", "close", "else", None] * 5
+    compared = table_factory({"c": labels}, schema={"c": "string"})
+    with_nulls, _lam = fs.expectation_maximization(compared, [comparer])
+    # NULL labels count as "else"
+    compared = table_factory(
+        {"c": [c or "else" for c in labels]}, schema={"c": "string"}
+    )
+    expected, _lam = fs.expectation_maximization(compared, [comparer])
+    assert with_nulls == expected
+
+    compared = table_factory({"c": ["exact", "typo"]})
+    with pytest.raises(ValueError, match="typo"):
+        fs.expectation_maximization(compared, [comparer])
+    compared = table_factory({"c": [0, 1, 3]})
+    with pytest.raises(ValueError, match=r"\[3\]"):
+        fs.expectation_maximization(compared, [comparer])
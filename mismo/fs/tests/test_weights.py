@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import ibis
+from ibis import _
 import numpy as np
 import pytest
 
+from mismo.compare import LevelComparer
 from mismo.fs import ComparisonWeights, LevelWeights, Weights
 
 
@@ -168,3 +170,117 @@ def test_weights_serde(tmp_path):
     weights3 = Weights.from_json(d)
     assert weights == weights2
     assert weights == weights3
+
+
+def test_score_compared_vectors():
+    weights = Weights(
+        [
+            ComparisonWeights(
+                name="name",
+                level_weights=[LevelWeights(name="exact", m=0.5, u=0.05)],
+            ),
+            ComparisonWeights(
+                name="address",
+                level_weights=[
+                    LevelWeights(name="exact", m=0.6, u=0.1),
+                    LevelWeights(name="close", m=0.2, u=0.2),
+                ],
+            ),
+        ]
+    )
+    compared = ibis.memtable(
+        {
+            "record_id_l": [0, 1, 2, 3],
+            "record_id_r": [4, 5, 6, 7],
+            "name": ["exact", "else", "exact", "exact"],
+            "address": ["exact", "close", "else", "exact"],
+        }
+    )
+    by_cases = weights.score_compared(compared).order_by("record_id_l").to_pandas()
+    by_vectors = weights.score_compared(compared, method="vectors")
+    assert by_vectors.columns == by_cases.columns.tolist()
+    by_vectors = by_vectors.order_by("record_id_l").to_pandas()
+    assert by_vectors.to_dict("list") == pytest.approx(by_cases.to_dict("list"))
+
+    vectors = weights.score_vectors(compared).order_by(ibis.desc("odds")).to_pandas()
+    assert vectors.name.tolist() == ["exact", "exact", "else"]
+    assert vectors.address.tolist() == ["exact", "else", "close"]
+    assert vectors.n_pairs.tolist() == [2, 1, 1]
+    assert vectors.odds.tolist() == pytest.approx([60, 10 * 0.2 / 0.7, 0.5 / 0.95])
+
+    with pytest.raises(ValueError):
+        weights.score_compared(compared, method="oops")
+
+
+def test_score_compared_vectors_null_labels():
+    weights = Weights(
+        [
+            ComparisonWeights(
+                name="name",
+                level_weights=[LevelWeights(name="exact", m=0.5, u=0.05)],
+            ),
+        ]
+    )
+    compared = ibis.memtable(
+        {
+            "record_id_l": [0, 1, 2],
+            "record_id_r": [3, 4, 5],
+            "name": ["exact", None, "else"],
+        }
+    )
+    by_cases = weights.score_compared(compared).order_by("record_id_l").to_pandas()
+    by_vectors = weights.score_compared(compared, method="vectors")
+    by_vectors = by_vectors.order_by("record_id_l").to_pandas()
+    assert len(by_vectors) == len(by_cases) == 3
+    assert by_vectors.name.isna().tolist() == [False, True, False]
+    assert by_vectors.odds.isna().tolist() == by_cases.odds.isna().tolist()
+    assert by_vectors.odds.tolist() == pytest.approx(
+        by_cases.odds.tolist(), nan_ok=True
+    )
+
+
+def test_compare_and_score_min_odds():
+    weights = Weights(
+        [
+            ComparisonWeights(
+                name="name",
+                level_weights=[
+                    LevelWeights(name="exact", m=0.5, u=0.01),
+                    LevelWeights(name="close", m=0.3, u=0.1),
+                ],
+            ),
+            ComparisonWeights(
+                name="zip",
+                level_weights=[LevelWeights(name="exact", m=0.9, u=0.1)],
+            ),
+        ]
+    )
+    comparers = [
+        LevelComparer(
+            "name",
+            [
+                ("exact", _.name_l == _.name_r),
+                ("close", _.name_l[0] == _.name_r[0]),
+            ],
+        ),
+        LevelComparer("zip", [("exact", _.zip_l == _.zip_r)]),
+    ]
+    t = ibis.memtable(
+        {
+            "record_id_l": [0, 1, 2, 3, 4],
+            "name_l": ["alice", "alice", "bob", "bob", "carl"],
+            "name_r": ["alice", "alice", "bill", "bill", "dave"],
+            "zip_l": [1, 1, 1, 1, 1],
+            "zip_r": [1, 2, 1, 2, 1],
+        }
+    )
+    full = weights.compare_and_score(t, comparers).to_pandas()
+    assert full.odds.tolist() == pytest.approx(
+        [50 * 9, 50 * 0.1 / 0.9, 3 * 9, 3 * 0.1 / 0.9, 0.2 / 0.89 * 9]
+    )
+    for min_odds in [0, 1, 10, 27, 100, 1000]:
+        pruned = weights.compare_and_score(t, comparers, min_odds=min_odds)
+        assert pruned.columns == full.columns.tolist()
+        pruned = pruned.order_by("record_id_l").to_pandas()
+        expected = full[full.odds >= min_odds].reset_index(drop=True)
+        assert pruned.record_id_l.tolist() == expected.record_id_l.tolist()
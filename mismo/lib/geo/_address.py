@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+from pathlib import Path
+
 import ibis
 from ibis.expr import types as ir
 
-from mismo import _array, _util
+from mismo import _array, _materialize, _prep_cache, _util
 from mismo.compare import LevelComparer, compare
 from mismo.lib.geo._latlon import distance_km
 from mismo.text import rare_terms
@@ -108,14 +110,48 @@ class AddressesDimension:
         column_normed: str = "{column}_normed",
         column_tokens: str = "{column}_tokens",
         column_keywords: str = "{column}_keywords",
+        cache_dir: str | Path | None = None,
     ):
+        """Create an AddressesDimension.
+
+        Parameters
+        ----------
+        column
+            The name of the `array<address>` column.
+        column_normed
+            The name of the column to put the normalized addresses in.
+        column_tokens
+            The name of the column to put the address tokens in.
+        column_keywords
+            The name of the column to put the rare tokens (keywords) in.
+        cache_dir
+            If given, [prep()][mismo.lib.geo.AddressesDimension.prep] stores its
+            result as a Parquet file in this directory, keyed by a fingerprint
+            of the input table and of this configuration. Later runs on the
+            same input reuse it instead of prepping again.
+        """
         self.column = column
         self.column_normed = column_normed.format(column=column)
         self.column_tokens = column_tokens.format(column=column)
         self.column_keywords = column_keywords.format(column=column)
+        self.cache_dir = cache_dir
 
     def prep(self, t: ir.Table) -> ir.Table:
         """Prepares the table for blocking, adding normalized and tokenized columns."""
+        if self.cache_dir is None:
+            return self._prep(t)
+        config = {
+            "dimension": type(self).__name__,
+            "column": self.column,
+            "column_normed": self.column_normed,
+            "column_tokens": self.column_tokens,
+            "column_keywords": self.column_keywords,
+        }
+        return _prep_cache.cached_prep(
+            t, self._prep, cache_dir=self.cache_dir, config=config
+        )
+
+    def _prep(self, t: ir.Table) -> ir.Table:
         addrs = t[self.column]
         t = t.mutate(addrs.map(normalize_address).name(self.column_normed))
         tokens_nonunique = (
@@ -126,7 +162,7 @@ class AddressesDimension:
         t = t.mutate(_tokens_nonunique=tokens_nonunique)
         # Array.unique() results in 4 duplications of the input, so .cache it so
         # we only execute it once. See https://github.com/ibis-project/ibis/issues/8770
-        t = t.cache()
+        t = _materialize.materialize(t)
         t = t.mutate(t._tokens_nonunique.unique().name(self.column_tokens)).drop(
             "_tokens_nonunique"
         )
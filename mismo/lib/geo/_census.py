@@ -11,7 +11,7 @@ from typing import TYPE_CHECKING, AsyncIterable, Iterable
 import ibis
 from ibis.expr import types as ir
 
-from mismo import _aio, _util
+from mismo import _aio, _materialize, _util
 
 if TYPE_CHECKING:
     import httpx
@@ -145,7 +145,7 @@ def _dedupe(t: ir.Table) -> tuple[ir.Table, callable]:
     # need to cache this, otherwise if you look at deduped[:100], deduped[100:200],
     # etc, it will recompute deduped each time, and since the order is not guaranteed,
     # you might get api_id 1 both times!
-    deduped = deduped.cache()
+    deduped = _materialize.materialize(deduped)
     restore_map = with_group_id.select("__row_number", "api_id")
 
     def restore(ded: ir.Table) -> ir.Table:
@@ -55,3 +55,47 @@ def test_address_tokens(address, expected):
         assert result is None
     else:
         assert set(result) == expected
+
+
+@pytest.fixture
+def addresses_table(table_factory):
+    # Enough records that each street number is a rare term, ie a keyword.
+    addresses = [
+        [
+            {
+                "street1": f"{i} Main St",
+                "street2": None,
+                "city": "Springfield",
+                "state": "IL",
+                "postal_code": "62701",
+                "country": "US",
+            }
+        ]
+        for i in range(200)
+    ]
+    return table_factory(
+        {"record_id": range(200), "addresses": addresses},
+        schema={
+            "record_id": "int64",
+            "addresses": "array<struct<street1: string, street2: string,"
+            " city: string, state: string, postal_code: string, country: string>>",
+        },
+    )
+
+
+def test_addresses_dimension_cache(addresses_table, tmp_path):
+    dim = _address.AddressesDimension("addresses", cache_dir=tmp_path)
+    first = dim.prep(addresses_table)
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+    second = dim.prep(addresses_table)
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+    expected = _address.AddressesDimension("addresses").prep(addresses_table)
+    assert set(first.columns) == set(expected.columns)
+    assert first.count().execute() == second.count().execute() == 200
+
+    dim.prep(addresses_table.filter(addresses_table.record_id != 1))
+    assert len(list(tmp_path.glob("*.parquet"))) == 2
+    _address.AddressesDimension(
+        "addresses", column_keywords="kw", cache_dir=tmp_path
+    ).prep(addresses_table)
+    assert len(list(tmp_path.glob("*.parquet"))) == 3
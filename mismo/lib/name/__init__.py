@@ -3,5 +3,7 @@ from __future__ import annotations
 from ._blocker import NameBlocker as NameBlocker
 from ._clean import normalize_name as normalize_name
 from ._dimension import NameDimension as NameDimension
+from ._nicknames import add_alias_ids as add_alias_ids
+from ._nicknames import alias_ids_match as alias_ids_match
 from ._nicknames import are_aliases as are_aliases
 from ._nicknames import is_nickname_for as is_nickname_for
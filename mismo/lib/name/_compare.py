@@ -3,18 +3,6 @@ from __future__ import annotations
 import ibis
 from ibis.expr import types as ir
 
-from mismo.lib.name._nicknames import are_aliases
-
-
-def are_match_with_nicknames(
-    left: ir.StructValue, right: ir.StructValue
-) -> ir.BooleanValue:
-    """The first names match via nickname or alias, and the last names match."""
-    return ibis.and_(
-        are_aliases(left["first"], right["first"]),
-        left["last"] == right["last"],
-    )
-
 
 def initials_equal(left: ir.StringValue, right: ir.StringValue) -> ir.BooleanValue:
     """The first letter matches, and at least one is a single letter."""
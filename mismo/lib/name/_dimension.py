@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+from pathlib import Path
+
 import ibis
 from ibis.expr import types as ir
 
-from mismo import _util
+from mismo import _materialize, _prep_cache, _util
 from mismo.compare import LevelComparer, compare
-from mismo.lib.name import _clean, _compare
+from mismo.lib.name import _clean, _compare, _nicknames
 
 
 class NameDimension:
@@ -28,13 +30,36 @@ class NameDimension:
         *,
         column_normed: str = "{column}_normed",
         column_tokens: str = "{column}_tokens",
+        column_alias_ids: str = "{column}_alias_ids",
+        cache_dir: str | Path | None = None,
     ) -> None:
+        """Create a NameDimension.
+
+        Parameters
+        ----------
+        column
+            The name of the column with the name structs.
+        column_normed
+            The name of the column to put the normalized names in.
+        column_tokens
+            The name of the column to put the name tokens in.
+        column_alias_ids
+            The name of the column to put the nickname ids of the first name in,
+            as from [add_alias_ids()][mismo.lib.name.add_alias_ids].
+        cache_dir
+            If given, [prep()][mismo.lib.name.NameDimension.prep] stores its
+            result as a Parquet file in this directory, keyed by a fingerprint
+            of the input table and of this configuration. Later runs on the
+            same input reuse it instead of prepping again.
+        """
         self.column = column
         self.column_normed = column_normed.format(column=column)
         self.column_tokens = column_tokens.format(column=column)
+        self.column_alias_ids = column_alias_ids.format(column=column)
+        self.cache_dir = cache_dir
 
     def prep(self, t: ir.Table) -> ir.Table:
-        """Add columns with the normalized name and name tokens.
+        """Add columns with the normalized name, name tokens, and nickname ids.
 
         Parameters
         ----------
@@ -46,10 +71,27 @@ class NameDimension:
         t : ir.Table
             The prepped table.
         """
+        if self.cache_dir is None:
+            return self._prep(t)
+        config = {
+            "dimension": type(self).__name__,
+            "column": self.column,
+            "column_normed": self.column_normed,
+            "column_tokens": self.column_tokens,
+            "column_alias_ids": self.column_alias_ids,
+        }
+        return _prep_cache.cached_prep(
+            t, self._prep, cache_dir=self.cache_dir, config=config
+        )
+
+    def _prep(self, t: ir.Table) -> ir.Table:
         t = t.mutate(_clean.normalize_name(t[self.column]).name(self.column_normed))
         # workaround for https://github.com/ibis-project/ibis/issues/8484
-        t = t.cache()
+        t = _materialize.materialize(t)
         t = t.mutate(_clean.name_tokens(t[self.column_normed]).name(self.column_tokens))
+        t = _nicknames.add_alias_ids(
+            t, t[self.column_normed]["first"], result_name=self.column_alias_ids
+        )
         return t
 
     def compare(self, t: ir.Table) -> ir.Table:
@@ -87,7 +129,16 @@ class NameDimension:
             ),
             (
                 "nicknames",
-                lambda t: _compare.are_match_with_nicknames(le(t), ri(t)),
+                lambda t: ibis.and_(
+                    ibis.or_(
+                        le(t)["first"] == ri(t)["first"],
+                        _nicknames.alias_ids_match(
+                            t[self.column_alias_ids + "_l"],
+                            t[self.column_alias_ids + "_r"],
+                        ),
+                    ),
+                    le(t)["last"] == ri(t)["last"],
+                ),
             ),
             (
                 "initials",
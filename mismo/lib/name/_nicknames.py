@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import csv
 import functools
+from pathlib import Path
 from typing import overload
 
 import ibis
 from ibis.expr import types as ir
+import pyarrow as pa
 
-from mismo._util import optional_import
+from mismo import _profile
+
+# The nicknames from https://github.com/carltonnorthern/nicknames (Apache 2.0),
+# one row per canonical name with its space-separated nicknames. Regenerate with
+# `NickNamer()._nickname_lookup` from the `nicknames` package.
+_NICKNAMES_PATH = Path(__file__).parents[2] / "_data/nicknames.csv"
 
 
 @overload
@@ -32,7 +40,7 @@ def are_aliases(name1, name2):
         name2 = ibis.literal(name2)
     result = _are_aliases(name1, name2)
     if is_string:
-        return bool(result.execute())
+        return bool(_profile.execute(result, name="are_aliases"))
     return result
 
 
@@ -61,65 +69,134 @@ def is_nickname_for(nickname, canonical):
         canonical = ibis.literal(canonical)
     result = _is_nickname_for(nickname, canonical)
     if is_string:
-        return bool(result.execute())
+        return bool(_profile.execute(result, name="is_nickname_for"))
     return result
 
 
 def _is_nickname_for(
     nickname: ir.StringValue, canonical: ir.StringValue
 ) -> ir.BooleanValue:
-    nickname = nickname.lower().strip()
-    canonical = canonical.lower().strip()
+    nickname = _key(nickname)
+    canonical = _key(canonical)
+    pairs = _pairs_column(nickname._find_backend(use_default=True))
     needle = ibis.struct({"canonical": canonical, "nickname": nickname})
-    result = needle.isin(_nicknames_column()) | (canonical == nickname)
-    return result
+    return needle.isin(pairs) | (canonical == nickname)
 
 
 def _are_aliases(name1: ir.StringValue, name2: ir.StringValue) -> ir.BooleanValue:
-    name1 = name1.lower().strip()
-    name2 = name2.lower().strip()
-    needle = ibis.struct({"name1": name1, "name2": name2})
-    result = needle.isin(_aliases_column()) | (name1 == name2)
-    return result
+    name1 = _key(name1)
+    name2 = _key(name2)
+    pairs = _pairs_column(name1._find_backend(use_default=True))
+    needle1 = ibis.struct({"canonical": name1, "nickname": name2})
+    needle2 = ibis.struct({"canonical": name2, "nickname": name1})
+    return needle1.isin(pairs) | needle2.isin(pairs) | (name1 == name2)
+
+
+def _pairs_column(con: ibis.BaseBackend) -> ir.StructColumn:
+    """Every (canonical, nickname) pair, derived from the alias ids lookup table."""
+    ids = _alias_ids_table(con)
+    # The ids after the first are the canonical names the name is a nickname for.
+    nicknames = ids.select(
+        nickname=ids.__alias_name, canonical_id=ids.__alias_ids[1:].unnest()
+    )
+    canonicals = ids.select(canonical=ids.__alias_name, canonical_id=ids.__alias_ids[0])
+    pairs = nicknames.join(canonicals, "canonical_id")
+    return pairs.select(
+        pair=ibis.struct({"canonical": pairs.canonical, "nickname": pairs.nickname})
+    ).pair
+
+
+def _key(name: ir.StringValue) -> ir.StringValue:
+    return name.lower().strip()
+
+
+def add_alias_ids(
+    t: ir.Table,
+    name: str | ir.StringValue,
+    *,
+    result_name: str = "{name}_alias_ids",
+) -> ir.Table:
+    """Add a column of integer ids that identify the nickname groups of a name.
+
+    This joins `t` once with a lookup table of all the known names, so that
+    later comparisons are plain integer lookups instead of searching the
+    nickname list for every record pair.
+
+    The result is an `array<int64>`. The first element is the id of the name
+    itself, and the rest are the ids of the canonical names that it is a
+    nickname for. Names that are not in the nickname list get NULL.
+    Two names are aliases, as in [are_aliases()][mismo.lib.name.are_aliases],
+    if either one's own id is in the other's array. This can be checked
+    with [alias_ids_match()][mismo.lib.name.alias_ids_match].
+
+    The arrays also overlap for two nicknames of the same canonical name,
+    such as "bob" and "rob", so blocking on `t[result_name].unnest()`
+    finds all the candidate alias pairs.
+
+    Parameters
+    ----------
+    t
+        The table to add the column to.
+    name
+        The name column, or the name of it. This is case-insensitive,
+        and whitespace is stripped from both ends.
+    result_name
+        The name of the new column. "{name}" is replaced with the name of
+        the `name` column.
+
+    Returns
+    -------
+    The table with the new column.
+    """
+    if isinstance(name, str):
+        name = t[name]
+    result_name = result_name.format(name=name.get_name())
+    ids = _alias_ids_table(t._find_backend(use_default=True)).rename(
+        **{result_name: "__alias_ids"}
+    )
+    t = t.mutate(__alias_key=_key(name))
+    t = t.left_join(ids, t.__alias_key == ids.__alias_name)
+    return t.drop("__alias_key", "__alias_name")
 
 
-def _nicknames_pairs() -> set[tuple[str, str]]:
-    with optional_import("nicknames"):
-        from nicknames import NickNamer
+def alias_ids_match(ids1: ir.ArrayValue, ids2: ir.ArrayValue) -> ir.BooleanValue:
+    """Are two names aliases, given their ids from add_alias_ids()?
 
-    nn = NickNamer()
-    pairs = set()
-    for canonical, nicknames in nn._nickname_lookup.items():
-        for nickname in nicknames:
-            pairs.add((canonical, nickname))
-    return pairs
+    This is NULL if either name is not in the nickname list.
+    """
+    return ids2.contains(ids1[0]) | ids1.contains(ids2[0])
 
 
-def _aliases_pairs() -> set[tuple[str, str]]:
+@functools.cache
+def _nicknames_pairs() -> frozenset[tuple[str, str]]:
     pairs = set()
-    for canonical, nickname in _nicknames_pairs():
-        pairs.add((canonical, nickname))
-        pairs.add((nickname, canonical))
-    return pairs
+    with open(_NICKNAMES_PATH, newline="") as f:
+        for row in csv.DictReader(f):
+            for nickname in row["nicknames"].split():
+                pairs.add((row["canonical"], nickname))
+    return frozenset(pairs)
 
 
-@functools.cache
-def _nicknames_column() -> ir.StructColumn:
-    pairs = _nicknames_pairs()
-    records = [{"canonical": c, "nickname": n} for c, n in pairs]
-    t = ibis.memtable(
-        {"pairs": records},
-        schema={"pairs": "struct<canonical: string, nickname: string>"},
-    )
-    return t.pairs
+def _alias_ids_table(con: ibis.BaseBackend) -> ir.Table:
+    """The lookup table of name -> alias ids, loaded into `con` once."""
+    name = "mismo_nickname_alias_ids"
+    if name not in con.list_tables():
+        con.create_table(name, _alias_ids_arrow(), temp=True)
+    return con.table(name)
 
 
 @functools.cache
-def _aliases_column() -> ir.StructColumn:
-    pairs = _aliases_pairs()
-    records = [{"name1": c, "name2": n} for c, n in pairs]
-    t = ibis.memtable(
-        {"pairs": records},
-        schema={"pairs": "struct<name1: string, name2: string>"},
+def _alias_ids_arrow() -> pa.Table:
+    pairs = _nicknames_pairs()
+    names = sorted({n for pair in pairs for n in pair})
+    name_to_id = {n: i for i, n in enumerate(names)}
+    canonicals = {n: [] for n in names}
+    for canonical, nickname in pairs:
+        canonicals[nickname].append(name_to_id[canonical])
+    alias_ids = [[name_to_id[n], *sorted(canonicals[n])] for n in names]
+    return pa.table(
+        {
+            "__alias_name": pa.array(names, pa.string()),
+            "__alias_ids": pa.array(alias_ids, pa.list_(pa.int64())),
+        }
     )
-    return t.pairs
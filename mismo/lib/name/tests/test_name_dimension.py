@@ -30,3 +30,20 @@ def test_name_dimension(name_table):
         "nicknames",
         "first_last",
     ]
+
+
+def test_name_dimension_cache(name_table, tmp_path):
+    dim = NameDimension("name", cache_dir=tmp_path)
+    first = dim.prep(name_table)
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+    second = dim.prep(name_table)
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+    expected = NameDimension("name").prep(name_table)
+    assert set(first.columns) == set(expected.columns)
+    n = expected.count().execute()
+    assert first.count().execute() == second.count().execute() == n
+
+    dim.prep(name_table.filter(name_table.record_id != 1))
+    assert len(list(tmp_path.glob("*.parquet"))) == 2
+    NameDimension("name", column_tokens="toks", cache_dir=tmp_path).prep(name_table)
+    assert len(list(tmp_path.glob("*.parquet"))) == 3
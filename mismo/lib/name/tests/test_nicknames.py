@@ -50,3 +50,46 @@ def test_are_aliases_column():
     print(id(res._find_backend(use_default=True)))
     result = t.mutate(aliases=res).execute()
     tm.assert_series_equal(result.expected, result.aliases, check_names=False)
+
+
+def test_alias_ids_match_are_aliases(table_factory):
+    pairs = [
+        ("alex", "al"),
+        (" ALEX ", "alexander"),
+        ("alexa", "alexander"),
+        ("robert", "bob"),
+        ("bob", "rob"),
+        ("robert", "roberta"),
+        ("zach", "zack"),
+        ("mary", "mary"),
+        ("betsy", "jon"),
+    ]
+    t = table_factory({"a": [a for a, _ in pairs], "b": [b for _, b in pairs]})
+    t = name.add_alias_ids(t, "a")
+    t = name.add_alias_ids(t, t.b, result_name="ids_b")
+    t = t.mutate(
+        by_id=name.alias_ids_match(t.a_alias_ids, t.ids_b).fillna(False),
+        by_name=name.are_aliases(t.a, t.b),
+    ).execute()
+    assert t.by_id.tolist() == t.by_name.tolist()
+    # nicknames of the same name share an id, so they can be blocked together
+    bob, rob = t[t.a == "bob"].iloc[0][["a_alias_ids", "ids_b"]]
+    assert set(bob) & set(rob)
+
+
+@pytest.mark.parametrize(
+    ("nickname", "canonical", "expected"),
+    [
+        ("bob", "robert", True),
+        (" BOB", "Robert ", True),
+        ("bob", "rob", False),
+        ("robert", "mary", False),
+        ("mary", "mary", True),
+        ("zzz", "robert", False),
+    ],
+)
+def test_is_nickname_for(table_factory, nickname, canonical, expected):
+    assert name.is_nickname_for(nickname, canonical) == expected
+    t = table_factory({"nickname": [nickname], "canonical": [canonical]})
+    result = t.select(r=name.is_nickname_for(t.nickname, t.canonical)).r.execute()
+    assert result.tolist() == [expected]
@@ -0,0 +1,5 @@
+"""Link records as they arrive, in small batches, instead of all at once."""
+
+from __future__ import annotations
+
+from mismo.stream._linker import StreamLinker as StreamLinker
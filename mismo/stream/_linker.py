@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Literal
+import uuid
+
+import ibis
+from ibis.backends.duckdb import Backend as DuckDBBackend
+from ibis.expr import types as ir
+import pandas as pd
+import pyarrow as pa
+
+from mismo import _profile
+from mismo.block import block_many
+from mismo.compare import LevelComparer
+from mismo.fs import Weights
+
+
+class StreamLinker:
+    """Resolve entities incrementally, as small batches of records arrive.
+
+    The batch APIs run [block_many()][mismo.block.block_many],
+    [Weights.compare_and_score()][mismo.fs.Weights.compare_and_score],
+    and [connected_components()][mismo.cluster.connected_components]
+    over entire tables. This instead keeps the records seen so far, and the
+    clusters they belong to, as state. Each new batch is:
+
+    1. blocked against itself and against all the records seen so far,
+    2. scored with the fixed `weights`,
+    3. and the pairs with odds of at least `min_odds` are merged into the
+       existing clusters with an in-memory union-find.
+
+    The cost of a batch is proportional to the size of the batch and the number
+    of pairs it generates, not to the total number of records seen.
+
+    The `record_id`s must be unique across all batches.
+
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> from ibis import _
+    >>> from mismo.compare import LevelComparer
+    >>> from mismo.fs import ComparisonWeights, LevelWeights, Weights
+    >>> from mismo.stream import StreamLinker
+    >>> name = LevelComparer("name", [("exact", _.name_l == _.name_r)])
+    >>> weights = Weights(
+    ...     [ComparisonWeights("name", [LevelWeights("exact", m=0.9, u=0.01)])]
+    ... )
+    >>> linker = StreamLinker(["zip"], [name], weights, min_odds=10)
+    >>> linker.process(
+    ...     pd.DataFrame(
+    ...         {
+    ...             "record_id": [0, 1],
+    ...             "name": ["alice", "bob"],
+    ...             "zip": ["11111", "11111"],
+    ...         }
+    ...     )
+    ... ).execute()
+       record_id  component
+    0          0          0
+    1          1          1
+    >>> linker.process(
+    ...     pd.DataFrame({"record_id": [2], "name": ["alice"], "zip": ["11111"]})
+    ... ).execute()
+       record_id  component
+    0          2          0
+    """
+
+    def __init__(
+        self,
+        blocking_rules: Iterable,
+        comparers: Iterable[LevelComparer],
+        weights: Weights,
+        *,
+        min_odds: float = 10.0,
+        on_slow: Literal["error", "warn", "ignore"] = "error",
+        backend: DuckDBBackend | None = None,
+        table_name: str | None = None,
+    ) -> None:
+        """Create a new StreamLinker with no records.
+
+        Parameters
+        ----------
+        blocking_rules
+            The conditions to block new records with,
+            as in [block_many()][mismo.block.block_many].
+        comparers
+            The LevelComparers to label the blocked pairs with.
+        weights
+            The Weights to score the labeled pairs with. There must be one
+            ComparisonWeights for each of `comparers`.
+        min_odds
+            Record pairs with odds of at least this are considered matches,
+            and are put in the same cluster.
+        on_slow
+            What to do if a blocking rule causes a slow O(n*m) join.
+            This is checked when the matching query is first built.
+        backend
+            The DuckDB backend to store the records in.
+            If None, a new in-memory DuckDB connection is used.
+        table_name
+            The name of the table to store the records in. It is a temporary
+            table, so it is dropped when the connection is closed, or by
+            [close()][mismo.stream.StreamLinker.close].
+            If None, a unique name is generated, so several linkers can share
+            a connection.
+        """
+        self._rules = tuple(blocking_rules)
+        if not self._rules:
+            raise ValueError("No blocking rules provided")
+        self._comparers = tuple(comparers)
+        self._weights = weights
+        self._min_odds = min_odds
+        self._on_slow = on_slow
+        self._con = backend if backend is not None else ibis.duckdb.connect()
+        if table_name is None:
+            table_name = f"mismo_stream_records_{uuid.uuid4().hex}"
+        self._table_name = table_name
+        self._batch_name = table_name + "_batch"
+        self._records: ir.Table | None = None
+        self._match_sql: str | None = None
+        self._clusters = _UnionFind()
+        self._closed = False
+
+    @property
+    def records(self) -> ir.Table:
+        """All the records that have been processed so far."""
+        if self._records is None:
+            raise ValueError("No records have been processed yet")
+        return self._records
+
+    def process(
+        self, batch: pa.RecordBatch | pa.Table | pd.DataFrame | ir.Table
+    ) -> ir.Table:
+        """Link a batch of new records, and update the clusters.
+
+        Parameters
+        ----------
+        batch
+            The new records. Must have a `record_id` column, and the columns
+            that the blocking rules and comparers use.
+
+        Returns
+        -------
+        A table with columns `record_id` and `component`, with one row for every
+        record whose cluster was created or changed by this batch.
+        This includes all the records in `batch`, and any older records
+        whose cluster was merged into another.
+        """
+        if self._closed:
+            raise ValueError("This StreamLinker has been closed")
+        batch = _to_arrow(batch)
+        new_ids = batch["record_id"].to_pylist()
+        self._clusters.check_new(new_ids)
+        # Expose the batch under the same name every time, so the compiled
+        # matching query can be reused.
+        raw = self._con.con
+        raw.unregister(self._batch_name)
+        raw.register(self._batch_name, batch)
+
+        # Match before storing the batch, so it isn't blocked against itself twice.
+        if self._records is None:
+            batch_t = self._con.table(self._batch_name)
+            matches = _profile.to_pyarrow(
+                self._match_pairs(self._block(batch_t, batch_t)), name="match"
+            )
+            self._records = self._con.create_table(self._table_name, batch, temp=True)
+        else:
+            if self._match_sql is None:
+                self._match_sql = self._compile_match_sql()
+            match_sql = self._match_sql
+            matches = _profile.run(
+                "execute",
+                match_sql,
+                lambda: raw.execute(match_sql).arrow(),
+                name="match",
+            )
+            insert_sql = (
+                f'INSERT INTO "{self._table_name}" BY NAME'
+                f' SELECT * FROM "{self._batch_name}"'
+            )
+
+            def insert() -> None:
+                raw.execute(insert_sql)
+
+            _profile.run("execute", insert_sql, insert, name="insert")
+
+        new_set = self._clusters.add(new_ids)
+        changed = set()
+        for id_l, id_r in zip(
+            matches["record_id_l"].to_pylist(), matches["record_id_r"].to_pylist()
+        ):
+            changed |= self._clusters.union(id_l, id_r)
+        ids = new_ids + [i for i in changed if i not in new_set]
+        return self._labels_table(ids, batch.schema.field("record_id").type)
+
+    def components(self) -> ir.Table:
+        """The current cluster of every record, as columns `record_id`, `component`.
+
+        Each component is labeled by the `record_id` of one of its records.
+        """
+        id_type = self.records.record_id.type().to_pyarrow()
+        return self._labels_table(list(self._clusters.ids()), id_type)
+
+    def close(self) -> None:
+        """Drop the stored records from the backend.
+
+        The linker can't be used after this. Using it as a context manager
+        calls this at the end of the block.
+        """
+        self._con.con.unregister(self._batch_name)
+        self._con.drop_table(self._table_name, force=True)
+        self._records = None
+        self._match_sql = None
+        self._closed = True
+
+    def __enter__(self) -> StreamLinker:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _labels_table(self, ids: list, id_type: pa.DataType) -> ir.Table:
+        labels = self._clusters.labels(ids)
+        return ibis.memtable(
+            pa.table(
+                {
+                    "record_id": pa.array(ids, type=id_type),
+                    "component": pa.array(labels, type=id_type),
+                }
+            )
+        )
+
+    def _compile_match_sql(self) -> str:
+        # Building and compiling ibis expressions takes much longer than running
+        # them on a small batch, so only do it once. The query always reads
+        # from the same two table names, so it stays valid for every batch.
+        batch_t = self._con.table(self._batch_name)
+        pairs = ibis.union(
+            self._block(batch_t, batch_t), self._block(batch_t, self._records)
+        )
+        return str(self._con.compile(self._match_pairs(pairs)))
+
+    def _block(self, left: ir.Table, right: ir.Table) -> ir.Table:
+        return block_many(left, right, self._rules, on_slow=self._on_slow)
+
+    def _match_pairs(self, pairs: ir.Table) -> ir.Table:
+        matches = self._weights.compare_and_score(
+            pairs, self._comparers, min_odds=self._min_odds
+        )
+        return matches.select("record_id_l", "record_id_r")
+
+    def __repr__(self) -> str:
+        n = len(self._clusters)
+        return f"{self.__class__.__name__}(n_records={n})"
+
+
+class _UnionFind:
+    """A union-find that keeps the member list of each set.
+
+    Merging moves the members of the smaller set into the bigger one,
+    so each record is relabeled O(log n) times in total, and we always know
+    exactly which records changed label.
+    """
+
+    def __init__(self) -> None:
+        self._label: dict[Any, Any] = {}
+        self._members: dict[Any, list] = {}
+        self._age: dict[Any, int] = {}
+        self._n_added = 0
+
+    def __len__(self) -> int:
+        return len(self._label)
+
+    def ids(self) -> Iterable:
+        return self._label.keys()
+
+    def labels(self, ids: Iterable) -> list:
+        return [self._label[i] for i in ids]
+
+    def check_new(self, ids: Iterable) -> None:
+        dupes = [i for i in ids if i in self._label]
+        if dupes:
+            raise ValueError(f"record_ids have already been processed: {dupes[:10]}")
+
+    def add(self, ids: Iterable) -> set:
+        ids = set(ids)
+        self.check_new(ids)
+        for i in ids:
+            self._age[i] = self._n_added
+            self._n_added += 1
+            self._label[i] = i
+            self._members[i] = [i]
+        return ids
+
+    def union(self, a, b) -> set:
+        """Merge the sets containing a and b, returning the relabeled records."""
+        la, lb = self._label[a], self._label[b]
+        if la == lb:
+            return set()
+        # Keep the label of the bigger set, or of the older set if they're equal,
+        # so existing clusters keep their labels when new records join them.
+        size_a, size_b = len(self._members[la]), len(self._members[lb])
+        if size_a < size_b or (size_a == size_b and self._age[la] > self._age[lb]):
+            la, lb = lb, la
+        moved = self._members.pop(lb)
+        del self._age[lb]
+        for i in moved:
+            self._label[i] = la
+        self._members[la].extend(moved)
+        return set(moved)
+
+
+def _to_arrow(batch) -> pa.Table:
+    if isinstance(batch, pa.Table):
+        return batch
+    if isinstance(batch, pa.RecordBatch):
+        return pa.Table.from_batches([batch])
+    if isinstance(batch, pd.DataFrame):
+        return pa.Table.from_pandas(batch, preserve_index=False)
+    if isinstance(batch, ir.Table):
+        return _profile.to_pyarrow(batch, name="fetch_batch")
+    raise TypeError(f"Unsupported batch type {type(batch)}")
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import ibis
+from ibis import _
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from mismo import Profiler
+from mismo.block import block_many
+from mismo.cluster import connected_components
+from mismo.compare import LevelComparer
+from mismo.fs import ComparisonWeights, LevelWeights, Weights
+from mismo.stream import StreamLinker
+
+NAME = LevelComparer("name", [("exact", _.name_l == _.name_r)])
+WEIGHTS = Weights([ComparisonWeights("name", [LevelWeights("exact", m=0.9, u=0.01)])])
+
+
+@pytest.fixture
+def records() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "record_id": list(range(12)),
+            "name": ["a", "b", "a", "c", "b", "a", "d", "c", "e", "a", "b", "f"],
+            "zip": ["1", "1", "1", "2", "2", "1", "3", "2", "3", "4", "1", "3"],
+        }
+    )
+
+
+def _partition(labels: pd.DataFrame) -> set[frozenset]:
+    groups = labels.groupby("component").record_id.apply(frozenset)
+    return set(groups)
+
+
+def test_matches_batch_pipeline(records, table_factory):
+    linker = StreamLinker(["zip"], [NAME], WEIGHTS, min_odds=10)
+    for start in range(0, len(records), 5):
+        linker.process(records.iloc[start : start + 5])
+    streamed = linker.components().execute()
+
+    t = table_factory(records)
+    blocked = block_many(t, t, ["zip"])
+    scored = WEIGHTS.compare_and_score(blocked, [NAME])
+    edges = scored.filter(_.odds >= 10)["record_id_l", "record_id_r"]
+    batch = connected_components(edges, nodes=t.record_id).execute()
+    assert _partition(streamed) == _partition(batch)
+    assert linker.records.count().execute() == len(records)
+
+
+def test_process_returns_changed(records):
+    linker = StreamLinker(["zip"], [NAME], WEIGHTS, min_odds=10)
+    first = linker.process(records.iloc[:2]).execute()
+    assert first.to_dict("list") == {"record_id": [0, 1], "component": [0, 1]}
+    # Record 2 joins 0's existing cluster, which keeps its label.
+    batch = pa.RecordBatch.from_pandas(records.iloc[2:4], preserve_index=False)
+    second = linker.process(batch).execute()
+    assert second.to_dict("list") == {"record_id": [2, 3], "component": [0, 3]}
+
+
+def test_duplicate_record_ids(records):
+    linker = StreamLinker(["zip"], [NAME], WEIGHTS)
+    linker.process(records.iloc[:2])
+    with pytest.raises(ValueError, match="already been processed"):
+        linker.process(records.iloc[1:3])
+    # The failed batch didn't change anything.
+    assert linker.records.count().execute() == 2
+    assert len(linker.process(records.iloc[2:3]).execute()) == 1
+
+
+def test_process_is_profiled(records):
+    linker = StreamLinker(["zip"], [NAME], WEIGHTS, min_odds=10)
+    with Profiler() as profiler:
+        linker.process(records.iloc[:5])
+        linker.process(records.iloc[5:])
+    names = [s.name for s in profiler.spans]
+    assert names.count("match") == 2
+    assert names.count("insert") == 1
+    insert = next(s for s in profiler.spans if s.name == "insert")
+    assert insert.attributes["sql"].startswith("INSERT INTO")
+
+
+def test_linkers_share_a_connection(records, tmp_path):
+    con = ibis.duckdb.connect(tmp_path / "records.duckdb")
+    first = StreamLinker(["zip"], [NAME], WEIGHTS, backend=con)
+    second = StreamLinker(["zip"], [NAME], WEIGHTS, backend=con)
+    first.process(records.iloc[:5])
+    second.process(records.iloc[:5])
+    # The records are kept in temp tables, which aren't written to the file.
+    assert not ibis.duckdb.connect(tmp_path / "records.duckdb").list_tables()
+    with second:
+        second.process(records.iloc[5:])
+    assert first.records.count().execute() == 5
+    assert second._table_name not in con.list_tables()
+    with pytest.raises(ValueError, match="closed"):
+        second.process(records.iloc[5:])
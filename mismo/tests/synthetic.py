@@ -0,0 +1,196 @@
+"""Synthetic record linkage datasets of any size, for benchmarks.
+
+Each dataset has a `record_id` and a `label_true` column. A fraction
+`duplicate_rate` of the records are noisy copies of another record with the
+same `label_true`. Everything is generated with vectorized NumPy and PyArrow,
+without looping over the records in Python.
+"""
+
+from __future__ import annotations
+
+import csv
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from mismo.lib.name._nicknames import _NICKNAMES_PATH
+
+_STATES = np.array(
+    "AL AK AZ AR CA CO CT DE FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO MT NE"
+    " NV NH NJ NM NY NC ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY".split()
+)
+_STREET_SUFFIXES = np.array(["ST", "AVE", "RD", "LN", "DR", "BLVD", "CT", "WAY"])
+_NAME_SUFFIXES = np.array(["JR", "SR", "II", "III", "PHD", "MD"])
+
+
+def people(n: int, *, duplicate_rate: float = 0.2, seed: int = 0) -> pa.Table:
+    """People with a name and a list of addresses, as for NameDimension etc.
+
+    - record_id: int64
+    - label_true: int64
+    - name: struct<prefix, first, middle, last, suffix, nickname: string>
+    - addresses: array<struct<street1, street2, city, state, postal_code,
+      country: string>>
+    """
+    rng = np.random.default_rng(seed)
+    labels, is_dup = _labels(rng, n, duplicate_rate)
+    n_entities = labels.max() + 1
+
+    canonicals, nicknames = _first_names(rng)
+    first_i = rng.integers(0, len(canonicals), n_entities)[labels]
+    first = np.where(
+        is_dup & (rng.random(n) < 0.3), nicknames[first_i], canonicals[first_i]
+    )
+    lasts = _words(rng, 20_000)
+    last = pa.array(lasts[_zipf(rng, n_entities, len(lasts))[labels]])
+    # Typos in the last name of some duplicates
+    last = pc.if_else(is_dup & (rng.random(n) < 0.2), _drop_last_char(last), last)
+    middle = np.where(rng.random(n) < 0.5, None, rng.choice(list("ABCDEFGHJKLMR"), n))
+    suffix = np.where(rng.random(n) < 0.95, None, rng.choice(_NAME_SUFFIXES, n))
+    name = pa.StructArray.from_arrays(
+        [
+            pa.nulls(n, pa.string()),
+            pa.array(np.char.title(first)),
+            pa.array(middle, pa.string()),
+            pc.utf8_title(last),
+            pa.array(suffix, pa.string()),
+            pa.nulls(n, pa.string()),
+        ],
+        names=["prefix", "first", "middle", "last", "suffix", "nickname"],
+    )
+
+    streets = _words(rng, 5_000)
+    street_i = _zipf(rng, n_entities, len(streets))[labels]
+    number = rng.integers(1, 10_000, n_entities)[labels]
+    # Some duplicates have moved down the street
+    number = np.where(is_dup & (rng.random(n) < 0.3), number + 2, number)
+    suffix_i = street_i % len(_STREET_SUFFIXES)
+    street1 = pc.binary_join_element_wise(
+        pa.array(number.astype(str)),
+        pa.array(streets[street_i]),
+        pa.array(_STREET_SUFFIXES[suffix_i]),
+        " ",
+    )
+    cities = _words(rng, 2_000)
+    city_i = _zipf(rng, n_entities, len(cities))[labels]
+    address = pa.StructArray.from_arrays(
+        [
+            street1,
+            pa.nulls(n, pa.string()),
+            pa.array(cities[city_i]),
+            pa.array(_STATES[city_i % len(_STATES)]),
+            pa.array(np.char.zfill((city_i * 7 % 100_000).astype(str), 5)),
+            pa.array(np.full(n, "US")),
+        ],
+        names=["street1", "street2", "city", "state", "postal_code", "country"],
+    )
+    addresses = pa.ListArray.from_arrays(pa.array(np.arange(n + 1)), address)
+    return pa.table(
+        {
+            "record_id": pa.array(np.arange(n)),
+            "label_true": pa.array(labels),
+            "name": name,
+            "addresses": addresses,
+        }
+    )
+
+
+def patents(n: int, *, duplicate_rate: float = 0.2, seed: int = 0) -> pa.Table:
+    """Patents, shaped like [load_patents()][mismo.datasets.load_patents].
+
+    - record_id: int64
+    - label_true: int64
+    - name: string
+    - latitude: float64
+    - longitude: float64
+    - classes: string, 4-character IPC codes separated by "**"
+    """
+    rng = np.random.default_rng(seed)
+    labels, is_dup = _labels(rng, n, duplicate_rate)
+    n_entities = labels.max() + 1
+
+    canonicals, _nicknames = _first_names(rng)
+    lasts = _words(rng, 20_000)
+    name = pc.binary_join_element_wise(
+        pa.array(canonicals[rng.integers(0, len(canonicals), n_entities)][labels]),
+        pa.array(lasts[_zipf(rng, n_entities, len(lasts))][labels]),
+        " ",
+    )
+    name = pc.utf8_upper(name)
+    name = pc.if_else(is_dup & (rng.random(n) < 0.2), _drop_last_char(name), name)
+
+    latitude = rng.uniform(25, 49, n_entities)[labels] + rng.normal(0, 0.01, n)
+    longitude = rng.uniform(-124, -67, n_entities)[labels] + rng.normal(0, 0.01, n)
+
+    codes = np.array(
+        [f"{a}{b:02d}{c}" for a in "ABCDEFGH" for b in range(1, 20) for c in "ABCD"]
+    )
+    n_classes = rng.integers(1, 4, n)
+    entity_codes = _zipf(rng, n_entities * 3, len(codes)).reshape(-1, 3)
+    classes = codes[entity_codes[labels]]
+    classes = pc.binary_join(
+        pa.ListArray.from_arrays(
+            pa.array(np.concatenate([[0], np.cumsum(n_classes)]), pa.int32()),
+            pa.array(classes[np.arange(3) < n_classes[:, None]]),
+        ),
+        "**",
+    )
+    return pa.table(
+        {
+            "record_id": pa.array(np.arange(n)),
+            "label_true": pa.array(labels),
+            "name": name,
+            "latitude": pa.array(latitude),
+            "longitude": pa.array(longitude),
+            "classes": classes,
+        }
+    )
+
+
+def _labels(
+    rng: np.random.Generator, n: int, duplicate_rate: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """The true label of each record, and whether it is a duplicate of another."""
+    if not 0 <= duplicate_rate < 1:
+        raise ValueError(f"duplicate_rate must be in [0, 1), got {duplicate_rate}")
+    n_entities = max(1, round(n * (1 - duplicate_rate)))
+    labels = np.concatenate(
+        [np.arange(n_entities), rng.integers(0, n_entities, n - n_entities)]
+    )
+    is_dup = np.arange(n) >= n_entities
+    order = rng.permutation(n)
+    return labels[order], is_dup[order]
+
+
+def _zipf(rng: np.random.Generator, size: int, n_values: int) -> np.ndarray:
+    """Indices into n_values, where a few values are very common, like real names."""
+    weights = 1 / (np.arange(n_values) + 10)
+    return rng.choice(n_values, size, p=weights / weights.sum())
+
+
+def _words(rng: np.random.Generator, n: int) -> np.ndarray:
+    """n distinct, pronounceable, uppercase words."""
+    syllables = np.array(
+        [c + v for c in "BCDFGHKLMNPRSTVWZ" for v in ["A", "E", "I", "O", "U", "AN"]]
+    )
+    n_syllables = rng.integers(2, 4, 4 * n)
+    idx = rng.integers(0, len(syllables), (4 * n, 3))
+    words = np.char.add(syllables[idx[:, 0]], syllables[idx[:, 1]])
+    words = np.where(n_syllables == 3, np.char.add(words, syllables[idx[:, 2]]), words)
+    return rng.permutation(np.unique(words))[:n]
+
+
+def _first_names(rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Real first names, and a random nickname for each one."""
+    canonicals, nicknames = [], []
+    with open(_NICKNAMES_PATH, newline="") as f:
+        for row in csv.DictReader(f):
+            options = row["nicknames"].split()
+            canonicals.append(row["canonical"])
+            nicknames.append(options[rng.integers(0, len(options))])
+    return np.array(canonicals), np.array(nicknames)
+
+
+def _drop_last_char(s: pa.Array) -> pa.Array:
+    return pc.utf8_slice_codeunits(s, 0, -1)
@@ -0,0 +1,223 @@
+"""Benchmarks of every stage of a linkage pipeline, on synthetic data.
+
+Run them with `just bench`, which records the wall time of each stage,
+and the peak resident memory of the process during it in `extra_info`.
+To only run one scale, select it by its id, eg `just bench -k 1e+06`.
+When benchmarks are disabled, as they are by default, only a small smoke test
+of each stage runs, to check that the benchmarks still work.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+from typing import Callable
+
+import ibis
+from ibis import _
+from ibis.expr import types as ir
+import pytest
+
+from mismo.block import block_many
+from mismo.cluster import connected_components
+from mismo.compare import LevelComparer, compare
+from mismo.fs import train_using_em
+from mismo.lib.geo import AddressesDimension
+from mismo.lib.name import NameDimension
+from mismo.tests import synthetic
+from mismo.text import add_tfidf
+
+SCALES = [10**5, 10**6, 10**7]
+_SMOKE_TEST_SIZE = 1_000
+DUPLICATE_RATE = 0.2
+ROUNDS = 3
+
+BLOCKING_RULES = [
+    (
+        _.name_normed["first"],
+        _.name_normed["last"],
+        _.addresses_normed[0]["postal_code"],
+    ),
+    (_.name_normed["last"], _.addresses_normed[0]["street1"]),
+]
+COMPARERS = [
+    LevelComparer(
+        "name",
+        [
+            ("exact", _.name_normed_l == _.name_normed_r),
+            ("last", _.name_normed_l["last"] == _.name_normed_r["last"]),
+        ],
+    ),
+    LevelComparer(
+        "address",
+        [
+            (
+                "street",
+                _.addresses_normed_l[0]["street1"]
+                == _.addresses_normed_r[0]["street1"],
+            ),
+            (
+                "zip",
+                _.addresses_normed_l[0]["postal_code"]
+                == _.addresses_normed_r[0]["postal_code"],
+            ),
+        ],
+    ),
+]
+
+
+def _benchmarking(config: pytest.Config) -> bool:
+    return config.getoption("benchmark_enable") or not config.getoption(
+        "benchmark_disable"
+    )
+
+
+@pytest.fixture(scope="module", params=SCALES, ids=lambda n: f"{n:.0e}")
+def n_records(request) -> int:
+    if _benchmarking(request.config):
+        return request.param
+    if request.param != SCALES[0]:
+        pytest.skip("Benchmarks are disabled, only smoke testing one scale")
+    return _SMOKE_TEST_SIZE
+
+
+@pytest.fixture(scope="module")
+def con() -> ibis.BaseBackend:
+    return ibis.duckdb.connect()
+
+
+@pytest.fixture(scope="module")
+def people(con, n_records) -> ir.Table:
+    data = synthetic.people(n_records, duplicate_rate=DUPLICATE_RATE)
+    return con.create_table("people", data, overwrite=True)
+
+
+@pytest.fixture(scope="module")
+def patents(con, n_records) -> ir.Table:
+    data = synthetic.patents(n_records, duplicate_rate=DUPLICATE_RATE)
+    return con.create_table("patents", data, overwrite=True)
+
+
+@pytest.fixture(scope="module")
+def prepped(con, people) -> ir.Table:
+    t = NameDimension("name").prep(people)
+    t = AddressesDimension("addresses").prep(t)
+    return con.create_table("prepped", t, overwrite=True)
+
+
+@pytest.fixture(scope="module")
+def blocked(con, prepped) -> ir.Table:
+    t = block_many(prepped, prepped, BLOCKING_RULES)
+    return con.create_table("blocked", t, overwrite=True)
+
+
+@pytest.fixture(scope="module")
+def compared(con, blocked) -> ir.Table:
+    return con.create_table("compared", compare(blocked, *COMPARERS), overwrite=True)
+
+
+@pytest.fixture(scope="module")
+def weights(prepped):
+    return train_using_em(COMPARERS, prepped, prepped, max_pairs=100_000)
+
+
+def _bench(benchmark, con: ibis.BaseBackend, make: Callable[[], ir.Table | object]):
+    """Benchmark `make()`, executing its result if it is a table.
+
+    Each round writes to the same table, so every round does the full work.
+    """
+
+    def run():
+        result = make()
+        if isinstance(result, ir.Table):
+            result = con.create_table("bench_result", result, overwrite=True)
+        return result
+
+    _reset_peak_rss()
+    result = benchmark.pedantic(run, rounds=ROUNDS, iterations=1)
+    benchmark.extra_info["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def test_benchmark_name_prep(benchmark, con, people):
+    result = _bench(benchmark, con, lambda: NameDimension("name").prep(people))
+    assert result.count().execute() == people.count().execute()
+
+
+def test_benchmark_address_prep(benchmark, con, people):
+    result = _bench(
+        benchmark, con, lambda: AddressesDimension("addresses").prep(people)
+    )
+    assert result.count().execute() == people.count().execute()
+
+
+def test_benchmark_block_many(benchmark, con, prepped):
+    result = _bench(
+        benchmark, con, lambda: block_many(prepped, prepped, BLOCKING_RULES)
+    )
+    assert result.count().execute() > 0
+
+
+def test_benchmark_compare(benchmark, con, blocked):
+    result = _bench(benchmark, con, lambda: compare(blocked, *COMPARERS))
+    assert set(c.name for c in COMPARERS) <= set(result.columns)
+
+
+def test_benchmark_train_using_em(benchmark, con, prepped):
+    weights = _bench(
+        benchmark,
+        con,
+        lambda: train_using_em(COMPARERS, prepped, prepped, max_pairs=100_000),
+    )
+    assert len(weights) == len(COMPARERS)
+
+
+def test_benchmark_score_compared(benchmark, con, compared, weights):
+    result = _bench(benchmark, con, lambda: weights.score_compared(compared))
+    assert "odds" in result.columns
+
+
+def test_benchmark_connected_components(benchmark, con, compared, weights):
+    scored = weights.score_compared(compared)
+    edges = scored.filter(_.odds > 10)["record_id_l", "record_id_r"]
+    edges = con.create_table("edges", edges, overwrite=True)
+    result = _bench(benchmark, con, lambda: connected_components(edges))
+    assert "component" in result.columns
+
+
+def test_benchmark_add_tfidf(benchmark, con, patents):
+    tokens = patents.mutate(tokens=_.name.re_split(r"\s+"))
+    tokens = con.create_table("patent_tokens", tokens, overwrite=True)
+    result = _bench(benchmark, con, lambda: add_tfidf(tokens, "tokens"))
+    assert "tokens_tfidf" in result.columns
+
+
+def _reset_peak_rss() -> None:
+    # On Linux, this resets the peak RSS of the process to its current RSS,
+    # so we can measure the peak of each benchmark separately. DuckDB allocates
+    # outside of Python, so tracemalloc wouldn't see most of the memory.
+    clear_refs = Path("/proc/self/clear_refs")
+    if clear_refs.exists():
+        try:
+            clear_refs.write_text("5")
+        except OSError:
+            pass
+
+
+def _peak_rss_mb() -> float:
+    """The peak RSS since the last reset on Linux, or since the process started.
+
+    NaN on Windows, where the `resource` module doesn't exist.
+    """
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    if sys.platform == "win32":
+        return float("nan")
+    import resource
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return maxrss / 1024**2 if sys.platform == "darwin" else maxrss / 1024
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from ibis import _
+import pytest
+
+from mismo import CompactIds
+from mismo.block import block_many
+from mismo.cluster import connected_components
+
+
+@pytest.fixture
+def records(table_factory):
+    return table_factory(
+        {
+            "record_id": ["rec-9", "rec-10", "rec-2", "rec-33", "rec-4"],
+            "letter": ["a", "a", "b", "b", "c"],
+            "num": [1, 2, 2, 3, 4],
+        }
+    )
+
+
+def test_compact_ids_pipeline(records):
+    ids = CompactIds(records)
+    compact = ids.encode(records)
+    assert compact.record_id.type().is_unsigned_integer()
+    assert compact.count().execute() == 5
+
+    def run(t):
+        pairs = block_many(t, t, ["letter", "num"])
+        return pairs, connected_components(pairs, nodes=t.record_id)
+
+    expected_pairs, expected_clusters = run(records)
+    pairs, clusters = run(compact)
+    pairs = ids.decode(pairs)
+    clusters = ids.decode(clusters)
+
+    def pair_set(p):
+        return set(p["record_id_l", "record_id_r"].to_pandas().itertuples(index=False))
+
+    # Codes keep the order of the ids, so deduping keeps the same pairs.
+    assert pair_set(pairs) == pair_set(expected_pairs)
+
+    def cluster_set(c):
+        df = c.to_pandas()
+        return {frozenset(g) for _key, g in df.groupby("component").record_id}
+
+    assert cluster_set(clusters) == cluster_set(expected_clusters)
+
+
+def test_compact_ids_dtype(records):
+    ids = CompactIds(records, records.filter(_.num > 2), dtype="uint32")
+    assert ids.encode(records).record_id.type().is_uint32()
+    assert ids.mapping.count().execute() == 5
+    with pytest.raises(ValueError, match="integer"):
+        CompactIds(records, dtype="string")
+    with pytest.raises(ValueError, match="record_id"):
+        ids.encode(records.drop("record_id"))
+
+
+def test_compact_ids_integers(table_factory):
+    t = table_factory({"record_id": [10, 20]})
+    ids = CompactIds(t)
+    assert ids.encode(t) is t
+    assert ids.decode(t) is t
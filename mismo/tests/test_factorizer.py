@@ -3,6 +3,7 @@ from __future__ import annotations
 import pandas._testing as tm
 import pytest
 
+from mismo import Profiler
 from mismo._factorizer import Factorizer
 
 
@@ -91,3 +92,44 @@ def assert_equal(x, y):
     x = x.to_pandas()
     y = y.to_pandas()
     tm.assert_series_equal(x, y, check_names=False, check_dtype=False)
+
+
+def test_factorizer_verify(table_factory):
+    t = table_factory({"values": ["a", "b", None]})
+    f = Factorizer(t, "values")
+    other = table_factory({"values": ["a", "c", None]})
+    with pytest.raises(ValueError, match="not in the original column"):
+        f.encode(other)
+    e = f.encode(other, verify=False)
+    assert e.values.to_pandas().isna().sum() == 2
+    assert f.unknown_values(other).original.to_pandas().tolist() == ["c"]
+
+    codes = table_factory({"codes": [0, 7]})
+    with pytest.raises(ValueError, match="not from the original column"):
+        f.decode(codes, "codes")
+    assert f.unknown_codes(codes, "codes").code.to_pandas().tolist() == [7]
+
+
+def test_factorizer_from_mapping(table_factory):
+    t = table_factory({"values": ["b", "a"]})
+    f = Factorizer(t, "values")
+    saved = f.mapping.cache()
+    with pytest.raises(ValueError, match="exactly the columns"):
+        Factorizer.from_mapping(saved.rename(value="original"))
+
+    new = table_factory({"values": ["c", "a", "b"]})
+    f2 = Factorizer.from_mapping(saved).extend(new, "values")
+    e = f2.encode(new, dst="codes").order_by("values")
+    assert e.codes.to_pandas().tolist() == [0, 1, 2]
+    restored = f2.decode(e, "codes")
+    assert_equal(restored.codes, restored.values)
+
+
+def test_factorizer_encode_own_column_is_lazy(table_factory):
+    t = table_factory({"values": ["a", "b", "a"]})
+    f = Factorizer(t, "values")
+    with Profiler() as profiler:
+        e = f.encode()
+        e = f.encode(dst="codes")
+    assert profiler.spans == []
+    assert e.codes.to_pandas().tolist() == [0, 1, 0]
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import ibis
+import pytest
+
+from mismo import Materializer, _materialize
+from mismo.cluster import connected_components
+
+
+@pytest.fixture
+def computed(table_factory):
+    t = table_factory({"x": [1, 2, 3]})
+    return t.mutate(y=t.x * 2)
+
+
+@pytest.mark.parametrize("store", ["temp", "parquet"])
+def test_materialize_release(computed, store, tmp_path):
+    m = Materializer(store, directory=tmp_path)
+    a = m.materialize(computed)
+    b = m.materialize(computed)
+    assert len(m) == 1
+    assert a.y.sum().execute() == 12
+    if store == "parquet":
+        assert len(list(tmp_path.iterdir())) == 1
+    m.release(a)
+    assert len(m) == 1
+    assert b.y.sum().execute() == 12
+    m.release(b)
+    assert len(m) == 0
+    assert not list(tmp_path.iterdir())
+    with pytest.raises(ValueError):
+        m.release(computed)
+
+
+def test_materialize_skips(computed):
+    m = Materializer()
+    assert m.materialize(computed, uses=1) is computed
+    physical = m.materialize(computed)
+    assert m.materialize(physical) is physical
+    assert len(m) == 1
+    m.release_all()
+    assert len(m) == 0
+
+
+def test_materializer_context(backend, table_factory):
+    edges = table_factory({"record_id_l": [0, 1, 5], "record_id_r": [1, 2, 6]})
+    n_tables = len(backend.list_tables())
+    with Materializer() as m:
+        assert _materialize.active() is m
+        labels = connected_components(edges).execute()
+        # Only the final labels are still persisted.
+        assert len(m) == 1
+    assert _materialize.active() is not m
+    assert len(m) == 0
+    assert len(backend.list_tables()) == n_tables
+    assert labels.groupby("component").record_id.apply(set).tolist() == [
+        {0, 1, 2},
+        {5, 6},
+    ]
+
+
+def test_bad_store():
+    with pytest.raises(ValueError):
+        Materializer("oops")
+
+
+def test_parquet_default_directory(computed):
+    m = Materializer("parquet")
+    t = m.materialize(computed)
+    assert isinstance(t, ibis.Table)
+    assert t.count().execute() == 3
+    m.release_all()
+
+
+def test_materialize_without_block(backend, computed):
+    assert _materialize.active() is not _materialize.active()
+    n_tables = len(backend.list_tables())
+    t = _materialize.materialize(computed)
+    assert len(backend.list_tables()) == n_tables + 1
+    # Like Table.cache(), the caller frees the result.
+    t.release()
+    assert len(backend.list_tables()) == n_tables
+    # Nothing still holds on to the freed table.
+    t = _materialize.materialize(computed)
+    assert t.y.sum().execute() == 12
+    t.release()
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import ibis
+from ibis import _
+import pytest
+
+from mismo import Profiler, _profile
+from mismo.cluster import connected_components
+from mismo.compare import LevelComparer
+from mismo.fs import train_using_em
+
+
+@pytest.fixture
+def edges(table_factory):
+    return table_factory({"record_id_l": [0, 1, 5], "record_id_r": [1, 2, 6]})
+
+
+def test_profile_connected_components(edges):
+    with Profiler() as profiler:
+        connected_components(edges).execute()
+    spans = profiler.spans
+    root = spans[0]
+    assert root.name == "connected_components"
+    assert root.parent_id is None
+    assert all(s.duration is not None for s in spans)
+
+    iterations = [s for s in spans if s.name == "iteration"]
+    assert iterations
+    assert all(s.parent_id == root.span_id for s in iterations)
+    counts = [s for s in spans if s.name == "count_updates"]
+    assert {s.parent_id for s in counts} <= {s.span_id for s in iterations}
+    assert all(s.kind == "execute" for s in counts)
+    assert all("SELECT" in s.attributes["sql"] for s in counts)
+    assert all(s.attributes["rows"] == 1 for s in counts)
+
+    df = profiler.to_pandas()
+    assert len(df) == len(spans)
+    assert profiler.to_table().count().execute() == len(spans)
+    assert "connected_components [stage]" in repr(profiler)
+
+
+def test_profile_train_using_em(table_factory):
+    t = table_factory({"record_id": [0, 1, 2, 3], "x": [1, 1, 2, 3]})
+    comparer = LevelComparer("x", [("exact", _.x_l == _.x_r)])
+    with Profiler() as profiler:
+        train_using_em([comparer], t, t, max_pairs=100)
+    names = [s.name for s in profiler.spans]
+    assert names[0] == "train_using_em"
+    assert "expectation_maximization" in names
+    assert "comparison_vectors" in names
+
+
+def test_profile_inactive(edges):
+    assert _profile.active() is None
+    with _profile.span("stage") as s:
+        assert s is None
+    assert _profile.execute(ibis.literal(1), name="one") == 1
+    with Profiler() as profiler:
+        assert _profile.active() is profiler
+        with Profiler() as inner:
+            assert _profile.active() is inner
+        assert _profile.active() is profiler
+    assert _profile.active() is None
+    assert profiler.spans == []
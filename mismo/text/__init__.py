@@ -7,3 +7,4 @@ from mismo.text._tfidf import add_tfidf as add_tfidf
 from mismo.text._tfidf import document_counts as document_counts
 from mismo.text._tfidf import rare_terms as rare_terms
 from mismo.text._tfidf import term_idf as term_idf
+from mismo.text._tfidf import tfidf_topk_join as tfidf_topk_join
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+from typing import Literal
+
 import ibis
 from ibis import _
 from ibis.expr import datatypes as dt
 from ibis.expr import types as ir
 
-from mismo import _util, vector
+from mismo import _materialize, _util, vector
 
 
 def document_counts(terms: ir.ArrayColumn) -> ir.Table:
@@ -251,7 +253,7 @@ def add_tfidf(
     idf = term_idf(t[column])
     idf_m = ibis.map(idf.term.collect(), idf.idf.collect()).name("__idf_map")
     idf_table = idf_m.as_table()
-    idf_table = idf_table.cache()
+    idf_table = _materialize.materialize(idf_table)
     cj = with_counts.cross_join(idf_table)
     r = result_name.format(name=column)
     cj = cj.mutate(vector.mul(cj.__term_counts, cj.__idf_map).name(r))
@@ -259,6 +261,180 @@ def add_tfidf(
     return result
 
 
+def tfidf_topk_join(
+    left: ir.Table,
+    right: ir.Table,
+    column: str,
+    *,
+    k: int = 10,
+    min_score: float = 0.0,
+    task: Literal["dedupe", "link"] | None = None,
+) -> ir.Table:
+    r"""Find each left record's `k` most similar right records by cosine similarity.
+
+    This avoids computing the similarity of all N*M pairs of records.
+    Each vector is exploded into an inverted index of (term, record, weight) rows,
+    so only records that share at least one term are ever paired up.
+
+    When `min_score` is positive, this also uses prefix filtering:
+    the terms of every record are sorted from rarest to most common,
+    and the trailing common terms, whose combined L2 norm is less than
+    `min_score`, are left out of the index. A pair of records that only
+    shares those trailing terms can't reach a cosine similarity of
+    `min_score`, so no qualifying pairs are lost.
+    This removes the most common terms, eg "st" or "ave" in addresses,
+    which would otherwise pair up almost every record.
+
+    Parameters
+    ----------
+    left
+        The left table. Must have a `record_id` column.
+    right
+        The right table. Must have a `record_id` column.
+    column
+        The name of the `map<term, numeric>` vector column in both tables,
+        such as the result of [add_tfidf()][mismo.text.add_tfidf].
+        The vectors are normalized to unit length before being compared.
+    k
+        The number of most similar right records to keep for each left record.
+    min_score
+        Only keep pairs with a cosine similarity of at least this.
+    task
+        If "dedupe", then `left` and `right` are the same records,
+        so records are not paired with themselves, and each pair is returned once,
+        with `record_id_l < record_id_r`.
+        If None, then "dedupe" is used if `left` and `right` are the same object,
+        otherwise "link".
+
+    Returns
+    -------
+    A table with columns `record_id_l`, `record_id_r`, and `score`, which is the
+    cosine similarity of the two vectors.
+
+    Examples
+    --------
+    >>> import ibis
+    >>> from mismo.text import add_tfidf, tfidf_topk_join
+    >>> ibis.options.interactive = True
+    >>> addresses = [
+    ...     "12 main st",
+    ...     "12 main street",
+    ...     "99 main ave",
+    ...     "21 glacier st",
+    ... ]
+    >>> t = ibis.memtable({"record_id": [0, 1, 2, 3], "address": addresses})
+    >>> t = t.mutate(terms=t.address.re_split(r"\s+"))
+    >>> t = add_tfidf(t, "terms")
+    >>> tfidf_topk_join(t, t, "terms_tfidf", k=1, min_score=0.3)
+    ┏━━━━━━━━━━━━━┳━━━━━━━━━━━━━┳━━━━━━━━━━┓
+    ┃ record_id_l ┃ record_id_r ┃ score    ┃
+    ┡━━━━━━━━━━━━━╇━━━━━━━━━━━━━╇━━━━━━━━━━┩
+    │ int64       │ int64       │ float64  │
+    ├─────────────┼─────────────┼──────────┤
+    │           0 │           1 │ 0.349725 │
+    └─────────────┴─────────────┴──────────┘
+    """
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+    if task is None:
+        task = "dedupe" if id(left) == id(right) else "link"
+    terms_l = _explode_unit_vectors(left, column)
+    if task == "dedupe":
+        terms_r = terms_l.view()
+    else:
+        terms_r = _explode_unit_vectors(right, column)
+
+    if min_score > 0:
+        candidates = _prefix_filter_candidates(terms_l, terms_r, min_score)
+    else:
+        candidates = terms_l.inner_join(terms_r, "term").select(
+            record_id_l=terms_l.record_id, record_id_r=terms_r.record_id
+        )
+    if task == "dedupe":
+        # Score each pair only once.
+        candidates = candidates.filter(_.record_id_l < _.record_id_r)
+    candidates = candidates.distinct()
+
+    # Score the candidate pairs using all their shared terms.
+    tl = terms_l.rename(record_id_l="record_id", weight_l="weight")
+    tr = terms_r.rename(record_id_r="record_id", weight_r="weight")
+    scored = (
+        candidates.inner_join(tl, "record_id_l")
+        .inner_join(tr, ["record_id_r", "term"])
+        .group_by("record_id_l", "record_id_r")
+        .agg(score=(_.weight_l * _.weight_r).sum())
+    )
+    # Guard against floating point errors for identical vectors.
+    scored = scored.mutate(score=ibis.least(_.score, 1.0))
+    if min_score > 0:
+        scored = scored.filter(_.score >= min_score)
+
+    if task != "dedupe":
+        return _top_k(scored, k)
+    # Each record gets its own top k, no matter which side of the pair it is on.
+    flipped = scored.select(
+        record_id_l=_.record_id_r, record_id_r=_.record_id_l, score=_.score
+    )
+    top = _top_k(ibis.union(scored, flipped), k)
+    top = top.select(
+        record_id_l=ibis.least(_.record_id_l, _.record_id_r),
+        record_id_r=ibis.greatest(_.record_id_l, _.record_id_r),
+    )
+    return scored.semi_join(top, ["record_id_l", "record_id_r"])
+
+
+def _top_k(scored: ir.Table, k: int) -> ir.Table:
+    w = ibis.window(
+        group_by="record_id_l", order_by=[ibis.desc("score"), "record_id_r"]
+    )
+    top = scored.mutate(__rank=ibis.row_number().over(w))
+    return top.filter(_.__rank < k).drop("__rank")
+
+
+def _explode_unit_vectors(t: ir.Table, column: str) -> ir.Table:
+    """One row of (record_id, term, weight) per term, with unit-length vectors."""
+    t = t.select("record_id", __vec=_util.get_column(t, column))
+    t = t.filter(_.__vec.notnull())
+    t = t.mutate(term=_.__vec.keys().unnest())
+    t = t.select("record_id", "term", weight=_.__vec[_.term].cast("float64"))
+    t = t.filter(_.weight.notnull() & (_.weight != 0))
+    norm = (_.weight**2).sum().over(group_by="record_id").sqrt()
+    return t.mutate(weight=_.weight / norm)
+
+
+def _prefix_filter_candidates(
+    terms_l: ir.Table, terms_r: ir.Table, min_score: float
+) -> ir.Table:
+    # The rarest terms come first, so the prefixes are made of rare terms.
+    dfs = (
+        ibis.union(
+            terms_l.select("record_id", "term"), terms_r.select("record_id", "term")
+        )
+        .group_by("term")
+        .agg(__df=_.count())
+    )
+    # Allow a little slack for floating point errors, since dropping a term
+    # that should have been kept would lose pairs.
+    threshold = min_score - 1e-9
+
+    def prefix(terms: ir.Table) -> ir.Table:
+        terms = terms.inner_join(dfs, "term")
+        # The norm of this term and all the more common terms after it.
+        w = ibis.cumulative_window(
+            group_by="record_id", order_by=[ibis.desc("__df"), ibis.desc("term")]
+        )
+        terms = terms.mutate(__suffix_norm=(_.weight**2).sum().over(w).sqrt())
+        return terms.filter(_.__suffix_norm >= threshold).select("record_id", "term")
+
+    # If two vectors have a cosine similarity >= min_score, then the rarest term
+    # they share is in both of their prefixes.
+    prefix_l = prefix(terms_l)
+    prefix_r = prefix(terms_r)
+    return prefix_l.inner_join(prefix_r, "term").select(
+        record_id_l=prefix_l.record_id, record_id_r=prefix_r.record_id
+    )
+
+
 def rare_terms(
     terms: ir.ArrayColumn,
     *,
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import random
+
 import ibis
 import pytest
 
@@ -141,3 +143,64 @@ def test_add_tfidf(table_factory):
         },
     )
     assert_tables_equal(result, expected)
+
+
+def _brute_force_topk(vecs_l, vecs_r, k, min_score, dedupe):
+    def cos(a, b):
+        dot = sum(a[t] * b[t] for t in a.keys() & b.keys())
+        norm_a = sum(v**2 for v in a.values()) ** 0.5
+        norm_b = sum(v**2 for v in b.values()) ** 0.5
+        return dot / (norm_a * norm_b)
+
+    scores = {}
+    for i, a in vecs_l.items():
+        for j, b in vecs_r.items():
+            if dedupe and i == j:
+                continue
+            s = cos(a, b)
+            if s > 0 and s >= min_score:
+                scores[i, j] = s
+    top = set()
+    for i in vecs_l:
+        mine = sorted((-s, j) for (ii, j), s in scores.items() if ii == i)
+        top |= {(i, j) for _s, j in mine[:k]}
+    if dedupe:
+        top = {(min(i, j), max(i, j)) for i, j in top}
+    return {p: scores[p] for p in top}
+
+
+@pytest.mark.parametrize("task", ["link", "dedupe"])
+@pytest.mark.parametrize("min_score", [0.0, 0.3, 0.6])
+def test_tfidf_topk_join(table_factory, task, min_score):
+    rng = random.Random(0)
+    vocab = [f"t{i}" for i in range(12)]
+
+    def make(ids):
+        return {
+            i: {t: rng.random() for t in rng.sample(vocab, rng.randint(2, 5))}
+            for i in ids
+        }
+
+    vecs_l = make(range(30))
+    vecs_r = vecs_l if task == "dedupe" else make(range(100, 140))
+
+    def to_table(vecs):
+        t = table_factory(
+            {
+                "record_id": list(vecs.keys()),
+                "terms": [list(v.keys()) for v in vecs.values()],
+                "weights": [list(v.values()) for v in vecs.values()],
+            }
+        )
+        return t.select("record_id", vec=ibis.map(t.terms, t.weights))
+
+    left = to_table(vecs_l)
+    right = left if task == "dedupe" else to_table(vecs_r)
+    result = text.tfidf_topk_join(left, right, "vec", k=3, min_score=min_score)
+    assert result.columns == ["record_id_l", "record_id_r", "score"]
+    df = result.execute()
+    actual = {(r.record_id_l, r.record_id_r): r.score for r in df.itertuples()}
+    expected = _brute_force_topk(vecs_l, vecs_r, 3, min_score, task == "dedupe")
+    assert actual.keys() == expected.keys()
+    for pair, score in expected.items():
+        assert actual[pair] == pytest.approx(score)